@@ -1,5 +1,6 @@
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from time import time
 import ast
 
@@ -20,16 +21,24 @@ class BaselineFeatureExtractor():
         y_predict = clf_LinearSVC.predict( y_true )
 
         j_score = jaccard_similarity_score(y_true, y_predict)
+
+    Passing sparse=True returns scipy.sparse CSR matrices instead of dense numpy arrays,
+    which scikit-learn classifiers such as OneVsRestClassifier(LinearSVC()) accept as is.
     """
-    def __init__(self, top_keywords):
+    def __init__(self, top_keywords, sparse=False):
         """
         @params
             - top_tags: pandas DataFrame of sorted keywords
+            - sparse: if True, x_y_train and y_true return scipy.sparse CSR matrices
         """
         self.top_keywords = top_keywords
+        self.sparse = sparse
         self.num_keywords = top_keywords.shape[0]
-        keywords = top_keywords['keyword'].values.tolist()
-        self.keywords = { k:keywords.index(k) for k in keywords}
+        
+        # A keyword listed twice keeps the index of its first occurrence
+        self.keywords = {}
+        for i, k in enumerate(top_keywords['keyword'].values.tolist()):
+            self.keywords.setdefault(k, i)
     
     def label_features(self, keywords):
         """
@@ -58,6 +67,57 @@ class BaselineFeatureExtractor():
 
         return binarized
     
+    def binarize_sparse(self, list_of_indices):
+        """
+        Given a list of lists of keyword indices, returns a scipy.sparse CSR matrix
+        where binarized[j, i] == 1 if i in list_of_indices[j]. The matrix is built
+        directly from the indices, without materializing the dense rows.
+        """
+        lengths = np.fromiter((len(indices) for indices in list_of_indices), dtype=np.intp, count=len(list_of_indices))
+        
+        indptr = np.zeros(len(list_of_indices) + 1, dtype=np.intp)
+        np.cumsum(lengths, out=indptr[1:])
+        
+        indices = np.fromiter((i for row in list_of_indices for i in row), dtype=np.intp, count=indptr[-1])
+        data = np.ones(indptr[-1], dtype=np.int_)
+        
+        binarized = sp.csr_matrix((data, indices, indptr), shape=(len(list_of_indices), self.num_keywords))
+        
+        # A keyword listed twice must still map to a single 1
+        binarized.sum_duplicates()
+        binarized.data[:] = 1
+        
+        return binarized
+    
+    def encode(self, keyword_lists):
+        """
+        Given a list of lists of keyword strings, returns a scipy.sparse CSR matrix where
+        encoded[j, i] == 1 if the keyword with index i is in keyword_lists[j]. This is the same
+        as binarize_sparse of label_features for every sample, but the whole batch is looked
+        up in a single pass into preallocated numpy arrays.
+        """
+        num_samples = len(keyword_lists)
+        lengths = np.fromiter((len(keywords) for keywords in keyword_lists), dtype=np.intp, count=num_samples)
+        total = lengths.sum()
+        
+        # Index of every keyword of every sample, -1 for keywords outside the vocabulary
+        lookup = self.keywords.get
+        indices = np.fromiter((lookup(k, -1) for keywords in keyword_lists for k in keywords), dtype=np.intp, count=total)
+        rows = np.repeat(np.arange(num_samples, dtype=np.intp), lengths)
+        
+        known = indices >= 0
+        indices = indices[known]
+        
+        indptr = np.zeros(num_samples + 1, dtype=np.intp)
+        np.cumsum(np.bincount(rows[known], minlength=num_samples), out=indptr[1:])
+        
+        encoded = sp.csr_matrix((np.ones(len(indices), dtype=np.int_), indices, indptr), shape=(num_samples, self.num_keywords))
+        
+        encoded.sum_duplicates()
+        encoded.data[:] = 1
+        
+        return encoded
+    
     def x_y_train( self, x_data, y_data):
         """
         Given list of input and output tags, return binary feature
@@ -72,22 +132,19 @@ class BaselineFeatureExtractor():
         t0 = time()
         print 'Extracting baseline features for %d training samples and %d keywords\n' % (len(x_data), self.num_keywords)
         
-        x_train = []
-        y_train = []
-        zero_count = 0
+        x_train = self.encode(x_data)
+        y_train = self.encode(y_data)
         
-        for i in range(len(x_data)):
-            x_feats = self.label_features( x_data[i] )
-            y_feats = self.label_features( y_data[i] )
-
-            if x_feats and y_feats:
-                x_train.append( self.binarize(x_feats) )
-                y_train.append( self.binarize(y_feats) )
-            else:
-                zero_count += 1
-
-        x_train = np.array(x_train)
-        y_train = np.array(y_train)
+        # Keep the samples with at least one keyword in both input and output
+        keep = np.flatnonzero( (np.diff(x_train.indptr) > 0) & (np.diff(y_train.indptr) > 0) )
+        zero_count = len(x_data) - len(keep)
+        
+        x_train = x_train[keep]
+        y_train = y_train[keep]
+        
+        if not self.sparse:
+            x_train = x_train.toarray()
+            y_train = y_train.toarray()
         
         t1 = time()
         
@@ -100,19 +157,46 @@ class BaselineFeatureExtractor():
         """
         t0 = time()
 
-        y_true = []
-        zero_count = 0
+        y_true = self.encode(y_data)
         
-        for i in range(len(y_data)):
-            y_feats = self.label_features(y_data[i])
-
-            if y_feats:
-                y_true.append( self.binarize(y_feats) )
-            else:
-                zero_count += 1
-
-        y_true = np.array(y_true)
+        keep = np.flatnonzero( np.diff(y_true.indptr) > 0 )
+        zero_count = len(y_data) - len(keep)
+        
+        y_true = y_true[keep]
+        
+        if not self.sparse:
+            y_true = y_true.toarray()
         
         t1 = time()
         
-        return (y_true, zero_count, t1-t0)
\ No newline at end of file
+        return (y_true, zero_count, t1-t0)
+    
+    def iter_blocks(self, chunks, x_column='keywords_in_text', y_column='keywords'):
+        """
+        Given an iterable of pandas DataFrame chunks, such as table_store.iter_table_chunks,
+        yields the features of each chunk as the tuple (x_block, y_block, zero_count, time),
+        the same as x_y_train of the chunk. Only one chunk is held in memory at a time.
+        @params
+            - chunks: iterable of pandas DataFrames with the x_column and y_column columns
+            - x_column: column of the lists of input keywords
+            - y_column: column of the lists of output keywords
+        """
+        for chunk in chunks:
+            t0 = time()
+            
+            x_block = self.encode(chunk[x_column].values)
+            y_block = self.encode(chunk[y_column].values)
+            
+            keep = np.flatnonzero( (np.diff(x_block.indptr) > 0) & (np.diff(y_block.indptr) > 0) )
+            zero_count = chunk.shape[0] - len(keep)
+            
+            x_block = x_block[keep]
+            y_block = y_block[keep]
+            
+            if not self.sparse:
+                x_block = x_block.toarray()
+                y_block = y_block.toarray()
+            
+            t1 = time()
+            
+            yield (x_block, y_block, zero_count, t1-t0)
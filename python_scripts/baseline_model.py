@@ -6,103 +6,246 @@ classifiers for prediction.
 @date 16 April 2015
 """
 from __future__ import division
+import argparse
+import os
 import numpy as np
 import pandas as pd
+from multiprocessing import Pool
 from time import time
-import ast
 from sklearn.cross_validation import train_test_split
 from sklearn.multiclass import OneVsRestClassifier
 from sklearn.svm import LinearSVC
-from sklearn.metrics import jaccard_similarity_score
-from sklearn.metrics import hamming_loss
 from sklearn.metrics import classification_report
-from sklearn.metrics import precision_score
-from sklearn.metrics import recall_score
-from sklearn.metrics import f1_score
 
 from baseline_feature_extractor import BaselineFeatureExtractor
+from evaluation import evaluate_many, save_predictions
+from feature_cache import FeatureCache
+from instrumentation import instrumentation
+from label_scorer import LabelScorer
+from table_store import TAG_INFO_LITERALS, read_table
 
 
-def main():
+def featurize(bfe, question_info_data, cache=None):
+    """
+    Binarizes the keywords found in the text and the keyword labels of every question of the
+    table question_info_data once over the whole vocabulary of bfe, keeping the questions without
+    any features so that the training and test set and smaller vocabularies can be sliced from it.
+    With a FeatureCache the matrices of an unchanged table and vocabulary are loaded from it
+    instead, without reading the table.
+    Returns the tuple (x, y, time) of sparse CSR matrices.
+    """
+    t0 = time()
     
-    # Read in the extracted information
-    question_info = pd.read_csv('../data/question_info_data_2.csv', index_col=0 )
-    tag_info = pd.read_csv('../data/tag_info_data_2.csv', index_col=0 )
+    def encode_table():
+        question_info = read_table(question_info_data)
+        with instrumentation.section('featurize', items=question_info.shape[0]):
+            return {'x' : bfe.encode(question_info['keywords_in_text'].values), \
+                    'y' : bfe.encode(question_info['keywords'].values)}
+    
+    if cache is None:
+        matrices = encode_table()
+    else:
+        key = cache.key('baseline_feature_extractor', cache.table_fingerprint(question_info_data), \
+                        bfe.top_keywords['keyword'].values.tolist(), ['keywords_in_text', 'keywords'])
+        with instrumentation.section('feature_cache'):
+            matrices = cache.get_or_compute(key, encode_table)
     
-    # Split data into training and test set
-    train, test = train_test_split(question_info, test_size = 0.2)
+    t1 = time()
     
-    # Convert string representation to list of string keywords
-    x_train_raw = []
-    y_train_raw = []
-    y_test_raw = []
+    return (matrices['x'], matrices['y'], t1-t0)
 
-    for i in range( train.shape[0] ):
-        x_train_raw.append( ast.literal_eval(train[i][4]) )
-        y_train_raw.append( ast.literal_eval(train[i][0]) )
 
-    for i in range( test.shape[0]):
-        y_test_raw.append( ast.literal_eval(test[i][0]) )
-        
-    # Train clasifier and predict keywords
-    num_feats = [50, 100, 200, 500, 1000]
-    #num_feats = [50, 100, 200, 500, 1000, tag_info.shape[0]]
+def slice_features(matrices, n):
+    """
+    Restricts the featurized data to the first n keywords. Since the keywords are sorted by count
+    this is the same as featurizing with the top n keywords, including dropping the samples left
+    without any features as x_y_train and y_true do. The test features keep the rows of the
+    test labels.
+    Returns the tuple (x_train, y_train, x_test, y_true, train_zero_count, test_zero_count, time).
+    """
+    x_train, y_train, x_test, y_true = matrices
+    
+    t0 = time()
+    
+    x_train = x_train[:, :n]
+    y_train = y_train[:, :n]
+    x_test = x_test[:, :n]
+    y_true = y_true[:, :n]
+    
+    train_keep = np.flatnonzero( (np.diff(x_train.indptr) > 0) & (np.diff(y_train.indptr) > 0) )
+    test_keep = np.flatnonzero( np.diff(y_true.indptr) > 0 )
+    
+    train_zero_count = x_train.shape[0] - len(train_keep)
+    test_zero_count = y_true.shape[0] - len(test_keep)
+    
+    x_train = x_train[train_keep]
+    y_train = y_train[train_keep]
+    x_test = x_test[test_keep]
+    y_true = y_true[test_keep]
+    
+    t1 = time()
+    
+    return (x_train, y_train, x_test, y_true, train_zero_count, test_zero_count, t1-t0)
 
-    num_train = []
-    num_test = []
-    train_feature_time = []
-    test_feature_time = []
-    model_train_time = []
-    jaccard = []
-    hamming = []
-    precision = []
-    recall = []
-    f1 = []
 
-    for n in num_feats:
+def train_predict(args):
+    """
+    Trains a OneVsRestClassifier(LinearSVC()) for one vocabulary size and predicts the test set
+    from its features. Takes a single tuple (n, x_train, y_train, x_test, label_jobs) so it can be
+    mapped over a process pool, where label_jobs is the number of jobs training the per-label SVMs.
+    Returns the tuple (stats, y_predict) of the python dict of basic stats and the sparse predictions.
+    """
+    n, x_train, y_train, x_test, label_jobs = args
+    
+    t0 = time()
+    with instrumentation.section('fit', items=x_train.shape[0]):
+        clf_LinearSVC = OneVsRestClassifier(LinearSVC(), n_jobs=label_jobs).fit(x_train, y_train)
+    t1 = time()
+
+    # All labels scored with one sparse-dense product instead of one predict per label
+    with instrumentation.section('predict', items=x_test.shape[0]):
+        y_predict = LabelScorer.from_classifier(clf_LinearSVC).predict( x_test )
+    
+    stats = {'num_feats': n, \
+             'num_train': x_train.shape[0], \
+             'num_test': x_test.shape[0], \
+             'model_time': t1-t0}
     
-        top_n_tags = tag_info.sort('count', ascending=False).head(n)
-        bfe = BaselineFeatureExtractor(top_n_tags)
+    return (stats, y_predict)
+
+
+def sweep_num_feats(num_feats, matrices, workers=1, label_jobs=1, predictions=None):
+    """
+    Trains and evaluates a model for each vocabulary size in num_feats.
+    The data is featurized once with the largest vocabulary and each smaller vocabulary is
+    sliced from it. With workers > 1 the models are trained in a pool of processes, otherwise
+    one after the other with label_jobs jobs each for the per-label SVMs.
+    Each vocabulary size is evaluated on the test questions tagged with any of its keywords,
+    against their keywords within its vocabulary, as when featurizing with that vocabulary.
+    @params
+        - num_feats: python list of vocabulary sizes
+        - matrices: tuple (x_train, y_train, x_test, y_true) of sparse CSR matrices featurized with the
+                    largest vocabulary, whose keywords are sorted by count
+        - predictions: optional python dict, filled with the predictions of each vocabulary size
+    @return
+        - tuple (results, test_rows) of the pandas DataFrame with one row of stats and evaluation
+          metrics per vocabulary size and the python dict of the numpy array of the rows of y_true
+          evaluated by each vocabulary size, keyed like predictions
+    """
+    x_train, y_train, x_test, y_true = matrices
     
-        x_train, y_train, train_zero_count, train_feat_extract_time = bfe.x_y_train(x_train_raw, y_train_raw)
-        y_true, test_zero_count, test_feat_extract_time = bfe.y_true(y_test_raw)
+    tasks = []
+    slice_times = []
+    true_labels = []
+    test_rows = {}
     
-        t0 = time()
-        clf_LinearSVC = OneVsRestClassifier(LinearSVC()).fit(x_train, y_train)
-        t1 = time()
+    for n in num_feats:
+        x_n, y_n, x_test_n, y_true_n, train_zero_count, test_zero_count, slice_time = \
+            slice_features((x_train, y_train, x_test, y_true), n)
+        tasks.append( (n, x_n, y_n, x_test_n, label_jobs if workers == 1 else 1) )
+        true_labels.append(y_true_n)
+        slice_times.append(slice_time)
+        test_rows['LinearSVC_%d' % n] = np.flatnonzero( np.diff(y_true[:, :n].indptr) > 0 )
     
-        y_predict = clf_LinearSVC.predict( y_true )
+    if workers > 1:
+        pool = Pool(workers)
+        trained = pool.map(train_predict, tasks, 1)
+        pool.close()
+        pool.join()
+    else:
+        trained = map(train_predict, tasks)
     
-        # Basic stats
-        num_train.append(len(x_train))
-        num_test.append(len(y_true))
-        train_feature_time.append( train_feat_extract_time )
-        test_feature_time.append( test_feat_extract_time )
-        model_train_time.append( t1-t0 )
+    results = []
+    
+    for (stats, y_predict), n, y_true_n, slice_time in zip(trained, num_feats, true_labels, slice_times):
+        
+        # Every vocabulary size has its own test rows and labels, so it is evaluated on its own
+        with instrumentation.section('evaluate', items=y_true_n.shape[0]):
+            stats.update( evaluate_many(y_true_n, [(n, y_predict)])[n].metrics() )
         
-        # Evaluation metrics
-        jaccard.append( jaccard_similarity_score(y_true, y_predict) )
-        hamming.append( hamming_loss(y_true, y_predict) )
-        precision.append( precision_score(y_true, y_predict, average='micro') )
-        recall.append( recall_score(y_true, y_predict, average='micro') )
-        f1.append( f1_score(y_true, y_predict, average='micro')  )
+        # The one featurization pass is shared by every vocabulary size, which is only sliced from it
+        stats['slice_time'] = slice_time
         
+        results.append(stats)
+        
+        if predictions is not None:
+            predictions['LinearSVC_%d' % n] = y_predict
+    
+    return pd.DataFrame(results), test_rows
+
+
+def main(workers=1, label_jobs=1, data_directory='../data', report_file=None, profile=False, predictions_file=None, \
+         cache_directory=None, cache_size_mb=1024, seed=0):
+    
+    if profile:
+        instrumentation.enable_profiling()
+    
+    # Read in the extracted information
+    question_info_data = os.path.join(data_directory, 'question_info_data_2')
+    tag_info = read_table(os.path.join(data_directory, 'tag_info_data_2'), TAG_INFO_LITERALS)
+    
+    num_feats = [50, 100, 200, 500, 1000, tag_info.shape[0]]
+
+    ordered_keywords = tag_info.sort_values('count', ascending=False)
+    
+    bfe = BaselineFeatureExtractor(ordered_keywords.head(max(num_feats)), sparse=True)
     
+    cache = None
+    if cache_directory is not None:
+        cache = FeatureCache(cache_directory, cache_size_mb << 20)
     
-    info_df = pd.DataFrame({ 'num_feats': num_feats, \
-                            'num_train': num_train, \
-                            'num_test' : num_test, \
-                            'train_feat_time': train_feature_time, \
-                            'test_feat_time': test_feature_time, \
-                            'model_time': model_train_time, \
-                            'jaccard': jaccard, \
-                            'hamming_loss': hamming, \
-                            'precision': precision, \
-                            'recall': recall, \
-                            'f1': f1})
+    print 'Extracting baseline features for %d keywords\n' % bfe.num_keywords
+    
+    x, y, feat_extract_time = featurize(bfe, question_info_data, cache)
+    
+    if cache is not None:
+        print 'Feature cache %s: %s' % (cache_directory, 'hit' if cache.hits else 'miss')
+    print 'Featurized %d questions in %f sec for every vocabulary size\n' % (x.shape[0], feat_extract_time)
+    
+    # Split the keywords found in the text and keyword labels into training and test set
+    train_index, test_index = train_test_split(np.arange(x.shape[0]), test_size = 0.2, random_state = seed)
+    
+    # Train clasifier and predict keywords
+    predictions = {}
+
+    t0 = time()
+    info_df, test_rows = sweep_num_feats(num_feats, (x[train_index], y[train_index], x[test_index], y[test_index]), \
+                                         workers, label_jobs, predictions)
+    t1 = time()
      
     print(info_df)
+    print 'Total sweep time: %f' % (t1-t0)
+    
+    if predictions_file is not None:
+        # The columns of every vocabulary size are a prefix of the largest vocabulary, and
+        # its rows are saved as their row indices in question_info_data_2
+        save_predictions(predictions_file, predictions, ordered_keywords['keyword'].values[:max(num_feats)].tolist(), \
+                         dict( (name, test_index[rows]) for name, rows in test_rows.iteritems() ))
+        print 'Predictions saved to file %s' % predictions_file
+    
+    if report_file is not None:
+        instrumentation.save(report_file)
+        print 'Instrumentation report saved to file %s' % report_file
         
     
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Train and evaluate baseline models for several vocabulary sizes.')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes training models in parallel')
+    parser.add_argument('--label-jobs', type=int, default=1, help='number of jobs training the per-label SVMs when workers is 1')
+    parser.add_argument('--data-dir', dest='data_directory', default='../data')
+    parser.add_argument('--report', dest='report_file', default=None, help='JSON file to write the instrumentation report to')
+    parser.add_argument('--profile', action='store_true', help='profile the run with cProfile and report the hot paths')
+    parser.add_argument('--predictions', dest='predictions_file', default=None, help='.npz file to save the predictions of each vocabulary size to')
+    parser.add_argument('--feature-cache', dest='cache_directory', default=None, \
+                        help='directory of the feature cache, by default feature_cache in the data directory')
+    parser.add_argument('--no-feature-cache', action='store_true', help='featurize from scratch without a feature cache')
+    parser.add_argument('--cache-size-mb', type=int, default=1024, help='size above which the least recently used features are evicted')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the train and test split')
+    args = parser.parse_args()
+    
+    cache_directory = None
+    if not args.no_feature_cache:
+        cache_directory = args.cache_directory or os.path.join(args.data_directory, 'feature_cache')
+    
+    main(args.workers, args.label_jobs, args.data_directory, args.report_file, args.profile, args.predictions_file, \
+         cache_directory, args.cache_size_mb, args.seed)
@@ -0,0 +1,78 @@
+"""
+This script benchmarks the batch encoding of BaselineFeatureExtractor against the original
+per-sample label_features and binarize loops, for vocabularies from the top 50 keywords up
+to the full keyword list, and checks that both give the same features.
+"""
+from __future__ import division
+import argparse
+import numpy as np
+import pandas as pd
+from time import time
+
+from baseline_feature_extractor import BaselineFeatureExtractor
+from table_store import TAG_INFO_LITERALS, read_table
+
+
+def quadratic_vocabulary(keywords):
+    """
+    The original vocabulary construction of BaselineFeatureExtractor
+    """
+    return { k:keywords.index(k) for k in keywords}
+
+
+def loop_features(bfe, keyword_lists):
+    """
+    The original per-sample feature extraction
+    """
+    return np.array([ bfe.binarize( bfe.label_features(keywords) ) for keywords in keyword_lists ])
+
+
+def main(question_info_data, tag_info_data, sizes):
+
+    question_info = read_table(question_info_data)
+    tag_info = read_table(tag_info_data, TAG_INFO_LITERALS)
+
+    order = np.argsort(-tag_info['count'].values, kind='mergesort')
+    ordered_keywords = pd.DataFrame({'keyword' : tag_info['keyword'].values[order]})
+
+    samples = question_info['keywords_in_text'].values.tolist()
+    sizes = [ n for n in sizes if n < ordered_keywords.shape[0] ] + [ordered_keywords.shape[0]]
+
+    print 'Benchmarking feature extraction over %d samples...\n' % len(samples)
+
+    results = []
+
+    for n in sizes:
+        top_keywords = ordered_keywords.head(n)
+        keywords = top_keywords['keyword'].values.tolist()
+
+        t0 = time()
+        quadratic_vocabulary(keywords)
+        t1 = time()
+        bfe = BaselineFeatureExtractor(top_keywords)
+        t2 = time()
+
+        loop_x = loop_features(bfe, samples)
+        t3 = time()
+        encoded_x = bfe.encode(samples)
+        t4 = time()
+
+        results.append({'num_feats' : n, \
+                        'old_vocab_time' : t1-t0, \
+                        'new_vocab_time' : t2-t1, \
+                        'loop_samples_per_sec' : len(samples) / (t3-t2), \
+                        'encode_samples_per_sec' : len(samples) / (t4-t3), \
+                        'speedup' : (t3-t2) / (t4-t3), \
+                        'identical' : np.array_equal(loop_x, encoded_x.toarray())})
+
+    print pd.DataFrame(results, columns=['num_feats', 'old_vocab_time', 'new_vocab_time', 'loop_samples_per_sec', \
+                                         'encode_samples_per_sec', 'speedup', 'identical']).to_string()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--question-info', dest='question_info_data', default='../data/question_info_data_2')
+    parser.add_argument('--tag-info', dest='tag_info_data', default='../data/tag_info_data')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 100, 200, 500, 1000])
+    args = parser.parse_args()
+    main(args.question_info_data, args.tag_info_data, args.sizes)
@@ -0,0 +1,48 @@
+"""
+This script benchmarks the KeywordMatcher against the original brute force keyword search
+of find_keywords_in_text on the extracted question data, and checks that both searches
+find exactly the same keywords for every question.
+"""
+from __future__ import division
+import argparse
+from time import time
+
+from find_keywords_in_text import find_keywords
+from keyword_matcher import KeywordMatcher
+from table_store import TAG_INFO_LITERALS, read_table
+
+
+def main(question_info_data, tag_info_data):
+
+    question_info = read_table(question_info_data)
+    tag_info = read_table(tag_info_data, TAG_INFO_LITERALS)
+
+    questions = question_info['question_text'].values
+    keywords = tag_info['keyword'].values.tolist()
+
+    print 'Benchmarking keyword search over %d questions and %d keywords...\n' % (len(questions), len(keywords))
+
+    t0 = time()
+    brute_force_found = [ find_keywords(question, keywords) for question in questions ]
+    t1 = time()
+
+    matcher = KeywordMatcher(keywords)
+    t2 = time()
+    matcher_found = [ matcher.match(question) for question in questions ]
+    t3 = time()
+
+    mismatches = sum(1 for a, b in zip(brute_force_found, matcher_found) if a != b)
+
+    print 'Brute force search: %f sec   %f questions/sec' % (t1-t0, len(questions) / (t1-t0))
+    print 'KeywordMatcher compile: %f sec' % (t2-t1)
+    print 'KeywordMatcher search: %f sec   %f questions/sec' % (t3-t2, len(questions) / (t3-t2))
+    print 'Speedup: %fx' % ((t1-t0) / (t3-t1))
+    print 'Questions with different results: %d' % mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--question-info', dest='question_info_data', default='../data/question_info_data')
+    parser.add_argument('--tag-info', dest='tag_info_data', default='../data/tag_info_data')
+    args = parser.parse_args()
+    main(args.question_info_data, args.tag_info_data)
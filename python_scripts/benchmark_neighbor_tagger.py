@@ -0,0 +1,116 @@
+"""
+This script benchmarks the NeighborTagger against the LinearSVC TaggingModel on the train and test
+split of split_train_test_data: the time to build the index versus training the classifier, the
+latency of tagging one question and the throughput of tagging the whole test set, and the
+accuracy of both on the test questions tagged with any of the keywords.
+
+The recall of the signature index, the share of the exact num_neighbors nearest neighbors it
+finds, is measured on the questions of the latency sample.
+"""
+from __future__ import division
+import argparse
+import os
+import numpy as np
+from time import time
+
+from evaluation import evaluate_many, evaluation_table
+from neighbor_tagger import NeighborTagger
+from table_store import TAG_INFO_LITERALS, read_table
+from tagging_model import select_vocabularies, train_tagging_model
+
+
+def latencies(tagger, question_texts, latex_expressions):
+    """
+    Returns the numpy array of the time in seconds tagger takes to predict each question on its own
+    """
+    times = []
+    for question_text, latex in zip(question_texts, latex_expressions):
+        t0 = time()
+        tagger.predict([question_text], [latex])
+        times.append(time() - t0)
+
+    return np.array(times)
+
+
+def index_recall(tagger, question_texts, latex_expressions):
+    """
+    Returns the share of the exact num_neighbors nearest neighbors of the questions found by the index.
+    Neighbors tied with the last exact one count as found, as questions often share the same features.
+    """
+    x = tagger.features(question_texts, latex_expressions)
+
+    approximate = tagger.index.neighbor_matrix(x, tagger.num_neighbors)
+
+    found = 0
+    total = 0
+    for i, similarities in enumerate( x.dot(tagger.index.x.T).toarray() ):
+        exact = np.sort(similarities[similarities > 0])[::-1][:tagger.num_neighbors]
+        if len(exact) == 0:
+            continue
+
+        found += np.sum( approximate.data[approximate.indptr[i]:approximate.indptr[i+1]] >= exact[-1] - 1e-9 )
+        total += len(exact)
+
+    return found / total if total else 1.0
+
+
+def main(data_directory, num_keywords, num_latex_tokens, num_neighbors, vote_threshold, num_tables, bits_per_table, latency_sample):
+
+    train = read_table(os.path.join(data_directory, 'train_data'))
+    test = read_table(os.path.join(data_directory, 'test_data'))
+    tag_info = read_table(os.path.join(data_directory, 'tag_info_data_2'), TAG_INFO_LITERALS)
+
+    print 'Benchmarking taggers with %d keywords and %d LaTeX tokens on %d training and %d test questions...\n' % \
+          (num_keywords, num_latex_tokens, train.shape[0], test.shape[0])
+
+    t0 = time()
+    svc = train_tagging_model(train, tag_info, num_keywords, num_latex_tokens)
+    t1 = time()
+    keywords, latex_tokens = select_vocabularies(train, tag_info, num_keywords, num_latex_tokens)
+    neighbors = NeighborTagger(keywords, latex_tokens, num_neighbors, vote_threshold, num_tables, bits_per_table)
+    neighbors.fit(train['question_text'].values, train['latex_expressions'].values, train['keywords'].values)
+    t2 = time()
+
+    # Test questions tagged with any of the keywords, as in baseline_model
+    y_true = svc.feature_extractor.encode(test['keywords'].values)
+    tagged = np.flatnonzero( np.diff(y_true.indptr) )
+    y_true = y_true[tagged]
+    question_texts = test['question_text'].values[tagged].tolist()
+    latex_expressions = test['latex_expressions'].values[tagged].tolist()
+
+    t3 = time()
+    y_svc = svc.predict(question_texts, latex_expressions)
+    t4 = time()
+    y_neighbors = neighbors.predict(question_texts, latex_expressions)
+    t5 = time()
+
+    svc_latencies = latencies(svc, question_texts[:latency_sample], latex_expressions[:latency_sample])
+    neighbor_latencies = latencies(neighbors, question_texts[:latency_sample], latex_expressions[:latency_sample])
+
+    print '%-12s %12s %16s %12s %12s' % ('tagger', 'build sec', 'questions/sec', 'p50 ms', 'p99 ms')
+    for name, build_time, tag_time, question_latencies in [('LinearSVC', t1-t0, t4-t3, svc_latencies), \
+                                                           ('Neighbors', t2-t1, t5-t4, neighbor_latencies)]:
+        p50, p99 = np.percentile(question_latencies, [50, 99]) * 1000 if len(question_latencies) else (0, 0)
+        print '%-12s %12.3f %16.1f %12.3f %12.3f' % (name, build_time, len(question_texts) / tag_time if tag_time > 0 else 0, p50, p99)
+
+    print '\nIndexed questions: %d   tables: %d   bits per table: %d' % (neighbors.index.x.shape[0], num_tables, bits_per_table)
+    print 'Index recall of the %d nearest neighbors: %f\n' % \
+          (num_neighbors, index_recall(neighbors, question_texts[:latency_sample], latex_expressions[:latency_sample]))
+
+    results = evaluate_many(y_true, [('LinearSVC', y_svc), ('Neighbors_%d' % num_neighbors, y_neighbors)])
+    print(evaluation_table(results))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--data-dir', dest='data_directory', default='../data')
+    parser.add_argument('--num-keywords', type=int, default=200)
+    parser.add_argument('--num-latex-tokens', type=int, default=500)
+    parser.add_argument('--neighbors', dest='num_neighbors', type=int, default=10)
+    parser.add_argument('--vote-threshold', type=float, default=0.5, help='share of the neighbor votes a keyword needs')
+    parser.add_argument('--tables', dest='num_tables', type=int, default=16)
+    parser.add_argument('--bits', dest='bits_per_table', type=int, default=10)
+    parser.add_argument('--latency-sample', type=int, default=200, help='number of test questions tagged one at a time')
+    args = parser.parse_args()
+    main(args.data_directory, args.num_keywords, args.num_latex_tokens, args.num_neighbors, args.vote_threshold, args.num_tables, \
+         args.bits_per_table, args.latency_sample)
@@ -0,0 +1,72 @@
+"""
+This script benchmarks the per-file throughput of the single pass PGParser against the
+original get_keywords, get_question_text and get_latex functions of extract_question_tag_info
+on a synthetic WebWorK library, and counts the questions on which they disagree.
+"""
+from __future__ import division
+import argparse
+import shutil
+import tempfile
+from time import time
+
+from extract_question_tag_info import get_keywords, get_question_text, get_latex
+from pg_parser import PGParser
+from separate_tagged_untagged_content import get_tagged_untagged_files
+from synthetic_corpus import generate_corpus
+
+
+def parse_original(path):
+    """
+    Parses a question file with the original functions
+    """
+    question_file_handle = open(path, mode='r')
+    question_file_lines = question_file_handle.readlines()
+    question_file_handle.close()
+
+    keywords = get_keywords(question_file_lines)
+    question_text = get_question_text(question_file_lines)
+    latex = get_latex(question_text)
+
+    return keywords, question_text, latex
+
+
+def main(num_files, base_directory=None):
+
+    remove_directory = base_directory is None
+
+    if base_directory is None:
+        base_directory = tempfile.mkdtemp(prefix='synthetic_opl_')
+        print 'Generating synthetic library with %d files in %s...\n' % (num_files, base_directory)
+        generate_corpus(base_directory, num_files)
+
+    try:
+        tagged_paths, untagged_paths = get_tagged_untagged_files(base_directory, [], [])
+
+        parser = PGParser()
+
+        t0 = time()
+        original = [ parse_original(path) for path in tagged_paths ]
+        t1 = time()
+        parsed = [ parser.parse_file(path) for path in tagged_paths ]
+        t2 = time()
+    finally:
+        if remove_directory:
+            shutil.rmtree(base_directory)
+
+    keyword_diffs = sum(1 for o, p in zip(original, parsed) if sorted(o[0]) != sorted(p['keywords']))
+    text_diffs = sum(1 for o, p in zip(original, parsed) if o[1] != p['question_text'])
+    latex_diffs = sum(1 for o, p in zip(original, parsed) if o[2] != p['latex_expressions'])
+
+    print 'Tagged questions parsed: %d\n' % len(tagged_paths)
+    print 'Original functions: %f sec   %f files/sec' % (t1-t0, len(tagged_paths) / (t1-t0))
+    print 'PGParser: %f sec   %f files/sec   speedup %fx' % (t2-t1, len(tagged_paths) / (t2-t1), (t1-t0) / (t2-t1))
+    print 'Questions with different keywords: %d   text: %d   LaTeX: %d' % (keyword_diffs, text_diffs, latex_diffs)
+    print '(LaTeX differs where \\( and \\[ are mixed, which the original functions pair up by position)'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num-files', type=int, default=20000)
+    parser.add_argument('--directory', dest='base_directory', default=None, help='existing library to parse instead of a synthetic one')
+    args = parser.parse_args()
+    main(args.num_files, args.base_directory)
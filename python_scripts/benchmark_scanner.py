@@ -0,0 +1,93 @@
+"""
+This script benchmarks the os.scandir based question scanner of separate_tagged_untagged_content
+against the original recursive glob walk on a synthetic WebWorK library, and checks that both
+produce the same tagged/untagged split.
+"""
+from __future__ import division
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+from time import time
+
+from separate_tagged_untagged_content import get_tagged_untagged_files
+from synthetic_corpus import generate_corpus
+
+
+def glob_tagged_untagged_files(base_directory, tagged_problems, untagged_problems):
+    """
+    The original recursive glob walk, which reads every .pg file completely
+    """
+    NO_QUESTION = '# This file is just a pointer to the file'
+    FILE_POSTFIX = '.pg'
+    KEYWORD = 'KEYWORD'
+
+    subfiles = glob.glob(base_directory + '/*')
+
+    for file_path in subfiles:
+
+        if FILE_POSTFIX not in file_path:
+            if os.path.isdir(file_path):
+                tagged_problems, untagged_problems = glob_tagged_untagged_files(file_path, tagged_problems, untagged_problems)
+        else:
+            pointer_to_file = False
+            tagged_question = False
+
+            problem_file_handle = open(file_path, mode='r')
+            contents = problem_file_handle.readlines()
+            problem_file_handle.close()
+
+            for line in contents:
+                if NO_QUESTION in line:
+                    pointer_to_file = True
+                    break;
+                if KEYWORD in line:
+                    tagged_question = True
+                    break;
+
+            if tagged_question:
+                tagged_problems.append(file_path)
+            elif not pointer_to_file:
+                untagged_problems.append(file_path)
+
+    return tagged_problems, untagged_problems
+
+
+def main(num_files, base_directory=None, workers=4):
+
+    remove_directory = base_directory is None
+
+    if base_directory is None:
+        base_directory = tempfile.mkdtemp(prefix='synthetic_opl_')
+        print 'Generating synthetic library with %d files in %s...\n' % (num_files, base_directory)
+        generate_corpus(base_directory, num_files)
+
+    try:
+        t0 = time()
+        glob_tagged, glob_untagged = glob_tagged_untagged_files(base_directory, [], [])
+        t1 = time()
+        scan_tagged, scan_untagged = get_tagged_untagged_files(base_directory, [], [])
+        t2 = time()
+        pool_tagged, pool_untagged = get_tagged_untagged_files(base_directory, [], [], workers=workers)
+        t3 = time()
+    finally:
+        if remove_directory:
+            shutil.rmtree(base_directory)
+
+    num_total = len(glob_tagged) + len(glob_untagged)
+
+    print 'Questions: %d   tagged: %d   untagged: %d\n' % (num_total, len(glob_tagged), len(glob_untagged))
+    print 'Recursive glob walk: %f sec   %f files/sec' % (t1-t0, num_total / (t1-t0))
+    print 'scandir scanner: %f sec   %f files/sec   speedup %fx' % (t2-t1, num_total / (t2-t1), (t1-t0) / (t2-t1))
+    print 'scandir scanner, %d threads: %f sec   %f files/sec   speedup %fx' % (workers, t3-t2, num_total / (t3-t2), (t1-t0) / (t3-t2))
+    print 'Same split: %s' % ((glob_tagged, glob_untagged) == (scan_tagged, scan_untagged) == (pool_tagged, pool_untagged))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--num-files', type=int, default=100000)
+    parser.add_argument('--directory', dest='base_directory', default=None, help='existing library to scan instead of a synthetic one')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    main(args.num_files, args.base_directory, args.workers)
@@ -0,0 +1,129 @@
+"""
+This script benchmarks every stage of the pipeline on synthetic corpora of increasing size,
+so that performance work can be measured without a checkout of the OpenProblemLibrary.
+
+For each corpus size a synthetic library is generated once with synthetic_corpus (and reused
+by later runs with the same parameters), then all stages of pipeline.py are run on it one at
+a time and their wall time, peak memory and throughput in files per second are reported.
+
+    python benchmark_suite.py --sizes 10000 100000 1000000 --work-dir /tmp/webwork_benchmark \
+                              --report benchmark.json
+"""
+from __future__ import division
+import argparse
+import json
+import os
+import platform
+import sys
+from time import time
+
+import pipeline
+from synthetic_corpus import generate_corpus
+
+
+def prepare_corpus(corpus_directory, num_files, num_keywords, seed):
+    """
+    Generates the synthetic corpus in corpus_directory unless it was already generated
+    with the same parameters. Returns the time it took to generate, 0 if it was reused.
+    """
+    parameters = {'num_files' : num_files, 'num_keywords' : num_keywords, 'seed' : seed}
+    parameters_file = os.path.join(corpus_directory, '.corpus.json')
+
+    if os.path.exists(parameters_file):
+        parameters_file_handle = open(parameters_file, mode='r')
+        existing = json.load(parameters_file_handle)
+        parameters_file_handle.close()
+
+        if existing == parameters:
+            print 'Reusing corpus of %d files in %s\n' % (num_files, corpus_directory)
+            return 0.0
+
+        raise ValueError('%s holds a corpus generated with %s, not %s' % (corpus_directory, existing, parameters))
+
+    print 'Generating corpus of %d files in %s...\n' % (num_files, corpus_directory)
+
+    t0 = time()
+    tagged, untagged, pointers = generate_corpus(corpus_directory, num_files, seed=seed, num_keywords=num_keywords)
+    t1 = time()
+
+    print 'Wrote %d tagged, %d untagged and %d pointer files in %f sec\n' % (tagged, untagged, pointers, t1-t0)
+
+    # Hidden, so the scan does not see it
+    parameters_file_handle = open(parameters_file, mode='w')
+    json.dump(parameters, parameters_file_handle)
+    parameters_file_handle.close()
+
+    return t1-t0
+
+
+def benchmark_size(work_directory, num_files, num_keywords, seed, workers, stages):
+    """
+    Runs the selected stages of the pipeline on the corpus of num_files files
+    @return
+        - python dict of the corpus size and generation time, and a list of the report of each stage
+    """
+    corpus_directory = os.path.join(work_directory, 'corpus_%d' % num_files)
+    data_directory = os.path.join(work_directory, 'data_%d' % num_files)
+
+    for directory in [corpus_directory, data_directory]:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    generation_time = prepare_corpus(corpus_directory, num_files, num_keywords, seed)
+
+    pipeline_stages = pipeline.pipeline_stages(corpus_directory, data_directory, workers)
+    if stages:
+        pipeline_stages = [ stage for stage in pipeline_stages if stage.name in stages ]
+        for stage in pipeline_stages:
+            stage.after = [ name for name in stage.after if name in stages ]
+
+    # One stage at a time, so the stages do not compete for the CPUs
+    report = pipeline.run_pipeline(pipeline_stages, data_directory, jobs=1, force=[ stage.name for stage in pipeline_stages ], \
+                                   instrument=True)
+
+    for row in report:
+        row['files_per_sec'] = num_files / row['wall_time'] if row['wall_time'] > 0 else None
+
+    return {'num_files' : num_files, 'generation_time' : generation_time, 'stages' : report}
+
+
+def main(sizes, work_directory, num_keywords, seed, workers, stages, report_file):
+
+    results = []
+
+    for num_files in sizes:
+        results.append( benchmark_size(work_directory, num_files, num_keywords, seed, workers, stages) )
+
+    print '\n%10s %-10s %-8s %12s %14s %16s' % ('files', 'stage', 'status', 'wall time', 'files/sec', 'peak memory MB')
+    for result in results:
+        for row in result['stages']:
+            print '%10d %-10s %-8s %12.3f %14.1f %16.1f' % (result['num_files'], row['stage'], row['status'], row['wall_time'], \
+                                                          row['files_per_sec'] or 0, row['peak_memory_mb'])
+
+    if report_file is not None:
+        report_file_handle = open(report_file, mode='w')
+        json.dump({'command' : ' '.join(sys.argv), \
+                   'python' : platform.python_version(), \
+                   'machine' : platform.platform(), \
+                   'cpus' : os.sysconf('SC_NPROCESSORS_ONLN'), \
+                   'workers' : workers, \
+                   'sizes' : results}, report_file_handle, indent=2)
+        report_file_handle.close()
+        print '\nBenchmark report saved to file %s' % report_file
+
+    if any( row['status'] != 'run' for result in results for row in result['stages'] ):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on synthetic corpora.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--work-dir', dest='work_directory', default='/tmp/webwork_benchmark', \
+                        help='directory the corpora and the tables are written to')
+    parser.add_argument('--num-keywords', type=int, default=2000, help='size of the keyword vocabulary of the corpora')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1, help='number of workers of the separate, extract and tag stages')
+    parser.add_argument('--stages', nargs='*', default=[], help='only run these stages, e.g. separate extract')
+    parser.add_argument('--report', dest='report_file', default=None, help='JSON file to write the benchmark report to')
+    args = parser.parse_args()
+    main(args.sizes, args.work_directory, args.num_keywords, args.seed, args.workers, args.stages, args.report_file)
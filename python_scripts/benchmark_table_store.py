@@ -0,0 +1,53 @@
+"""
+This script compares loading the pipeline's tables from CSV, parsing the list and dict
+columns with ast.literal_eval as the scripts used to, against loading them from the
+.npz files written by table_store. It reports load times and file sizes.
+"""
+from __future__ import division
+import argparse
+import os
+import shutil
+import tempfile
+from time import time
+
+from table_store import QUESTION_INFO_LITERALS, TAG_INFO_LITERALS, read_table, save_table, load_table
+
+
+def main(csv_files):
+
+    temp_directory = tempfile.mkdtemp()
+
+    print 'File \t CSV size \t npz size \t CSV load \t npz load \t speedup'
+    print '-'*90
+
+    for csv_file in csv_files:
+        name = os.path.splitext(os.path.basename(csv_file))[0]
+        literal_columns = TAG_INFO_LITERALS if name.startswith('tag_info') else QUESTION_INFO_LITERALS
+
+        # Copy the CSV on its own so that read_table cannot pick up an existing .npz
+        base_path = os.path.join(temp_directory, name)
+        shutil.copyfile(csv_file, base_path + '.csv')
+
+        t0 = time()
+        df = read_table(base_path, literal_columns)
+        t1 = time()
+
+        save_table(df, base_path + '.npz')
+
+        t2 = time()
+        loaded = load_table(base_path + '.npz')
+        t3 = time()
+
+        assert loaded.columns.tolist() == df.columns.tolist()
+
+        print '%s \t %d \t %d \t %f \t %f \t %fx' % (name, os.path.getsize(csv_file), os.path.getsize(base_path + '.npz'), \
+                                                      t1-t0, t3-t2, (t1-t0) / (t3-t2))
+
+    shutil.rmtree(temp_directory)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('csv_files', nargs='*', default=['../data/test_data.csv', '../data/latex_text_50_results.csv'])
+    args = parser.parse_args()
+    main(args.csv_files)
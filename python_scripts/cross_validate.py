@@ -0,0 +1,262 @@
+"""
+This script cross-validates the baseline model of baseline_model for several vocabulary sizes.
+
+A single random train and test split gives noisy accuracy and timing numbers. Here every
+question is assigned to one of --folds folds by a seeded permutation, and a model is trained
+on all the other folds and evaluated on each fold, for every vocabulary size. The questions
+are featurized once, as in baseline_model, and the arrays of the sparse feature and label
+matrices are written as .npy files to a scratch directory together with the fold of every
+question. The workers of the process pool memory-map these files when they start, so the
+matrices are shared through the page cache instead of being pickled to every worker, and each
+task is only the (fold, vocabulary size) pair it trains and evaluates.
+
+With --group-clusters whole near-duplicate clusters of near_duplicates.py are assigned to the
+folds, so that no question is evaluated on a model trained on a near copy of it, and with
+--canonical-only only the canonical question of every cluster is used.
+
+The metrics and timings of every fold are printed, followed by their mean and standard
+deviation per vocabulary size.
+
+    python cross_validate.py --folds 5 --workers 4
+"""
+from __future__ import division
+import argparse
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from multiprocessing import Pool
+from time import time
+
+from baseline_feature_extractor import BaselineFeatureExtractor
+from baseline_model import featurize, slice_features, train_predict
+from evaluation import evaluate_many
+from feature_cache import FeatureCache
+from instrumentation import instrumentation
+from split_train_test_data import read_clusters
+from table_store import TAG_INFO_LITERALS, read_table, write_table
+
+# Columns of the per-fold results that are averaged over the folds
+METRIC_COLUMNS = ['jaccard', 'hamming_loss', 'precision', 'recall', 'f1', 'macro_f1', 'model_time', 'predict_time']
+
+# Memory-mapped matrices of the worker process, loaded once by load_worker_matrices
+worker_matrices = None
+
+
+def assign_folds(num_samples, num_folds, seed=0, groups=None):
+    """
+    Returns the numpy array of the fold of every sample. The folds are the remainders of a
+    seeded random permutation, so their sizes differ by at most one.
+    @params
+        - groups: optional numpy array of the group of every sample, e.g. its near-duplicate
+                  cluster. The groups are then permuted instead of the samples, and all samples
+                  of a group are in the same fold.
+    """
+    if groups is not None:
+        unique_groups, inverse = np.unique(groups, return_inverse=True)
+        return assign_folds(len(unique_groups), num_folds, seed)[inverse]
+
+    folds = np.empty(num_samples, dtype=np.int32)
+    folds[np.random.RandomState(seed).permutation(num_samples)] = np.arange(num_samples) % num_folds
+    return folds
+
+
+def share_matrices(directory, matrices):
+    """
+    Writes the python dict of named sparse CSR matrices and numpy arrays to directory as .npy
+    files, which load_shared_matrices memory-maps
+    """
+    for name, matrix in matrices.iteritems():
+        if sp.issparse(matrix):
+            matrix = sp.csr_matrix(matrix)
+            np.save(os.path.join(directory, name + '.data.npy'), matrix.data)
+            np.save(os.path.join(directory, name + '.indices.npy'), matrix.indices)
+            np.save(os.path.join(directory, name + '.indptr.npy'), matrix.indptr)
+            np.save(os.path.join(directory, name + '.shape.npy'), np.array(matrix.shape))
+        else:
+            np.save(os.path.join(directory, name + '.npy'), np.asarray(matrix))
+
+
+def load_shared_matrices(directory, sparse_names, dense_names):
+    """
+    Returns the python dict of the matrices written by share_matrices. Their arrays are read-only
+    memory maps of the files, which every process loading them shares.
+    """
+    matrices = {}
+
+    for name in sparse_names:
+        arrays = [ np.load(os.path.join(directory, '%s.%s.npy' % (name, part)), mmap_mode='r') \
+                   for part in ['data', 'indices', 'indptr'] ]
+        shape = tuple(np.load(os.path.join(directory, name + '.shape.npy')))
+        matrices[name] = sp.csr_matrix(tuple(arrays), shape=shape, copy=False)
+
+    for name in dense_names:
+        matrices[name] = np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+
+    return matrices
+
+
+def load_worker_matrices(directory):
+    """
+    Initializer of the worker processes, memory-mapping the features, labels and folds
+    """
+    global worker_matrices
+    worker_matrices = load_shared_matrices(directory, ['x', 'y'], ['folds'])
+
+
+def evaluate_fold(task):
+    """
+    Trains a model for one vocabulary size on all but one fold and evaluates it on that fold.
+    Takes a single tuple (fold, n, label_jobs) so it can be mapped over a process pool.
+    Returns python dict of the stats, timings and evaluation metrics of the fold.
+    """
+    fold, n, label_jobs = task
+
+    x = worker_matrices['x']
+    y = worker_matrices['y']
+    test = np.asarray(worker_matrices['folds']) == fold
+    train = np.flatnonzero(~test)
+    test = np.flatnonzero(test)
+
+    t0 = time()
+    x_train, y_train, x_test, y_true, train_zero_count, test_zero_count, slice_time = \
+        slice_features((x[train], y[train], x[test], y[test]), n)
+    t1 = time()
+
+    stats, y_predict = train_predict( (n, x_train, y_train, x_test, label_jobs) )
+    t2 = time()
+
+    stats.update( evaluate_many(y_true, [(n, y_predict)])[n].metrics() )
+
+    stats['fold'] = fold
+    stats['slice_time'] = t1-t0
+    stats['predict_time'] = t2-t1 - stats['model_time']
+
+    return stats
+
+
+def aggregate_folds(results):
+    """
+    Returns pandas DataFrame with one row per vocabulary size of the mean and standard deviation
+    over the folds of each metric and timing
+    @params
+        - results: pandas DataFrame with one row per fold and vocabulary size
+    """
+    grouped = results.groupby('num_feats')
+
+    summary = pd.DataFrame({'num_folds' : grouped['fold'].count()})
+    for column in METRIC_COLUMNS:
+        summary[column + '_mean'] = grouped[column].mean()
+        summary[column + '_std'] = grouped[column].std()
+
+    return summary.reset_index()
+
+
+def main(num_folds=5, workers=1, label_jobs=1, data_directory='../data', num_feats=None, seed=0, \
+         cache_directory=None, cache_size_mb=1024, results_file=None, report_file=None, group_clusters=False, canonical_only=False):
+
+    question_info_data = os.path.join(data_directory, 'question_info_data_2')
+    tag_info = read_table(os.path.join(data_directory, 'tag_info_data_2'), TAG_INFO_LITERALS)
+
+    if num_feats is None:
+        num_feats = [50, 100, 200, 500, 1000, tag_info.shape[0]]
+
+    ordered_keywords = tag_info.sort_values('count', ascending=False)
+
+    bfe = BaselineFeatureExtractor(ordered_keywords.head(max(num_feats)), sparse=True)
+
+    cache = None
+    if cache_directory is not None:
+        cache = FeatureCache(cache_directory, cache_size_mb << 20)
+
+    print 'Extracting baseline features for %d keywords\n' % bfe.num_keywords
+
+    x, y, feat_extract_time = featurize(bfe, question_info_data, cache)
+    
+    groups = None
+    if group_clusters or canonical_only:
+        # The features may come from the cache, so the questions are read for their paths
+        clusters = read_clusters(data_directory, read_table(question_info_data))
+        
+        groups = clusters['cluster_id'].values if group_clusters else None
+        if canonical_only:
+            keep = np.flatnonzero( clusters['canonical'].values.astype(bool) )
+            x, y = x[keep], y[keep]
+            groups = groups[keep] if groups is not None else None
+    
+    folds = assign_folds(x.shape[0], num_folds, seed, groups)
+
+    print 'Featurized %d questions in %f sec\n' % (x.shape[0], feat_extract_time)
+
+    # The largest vocabularies take longest, so they are started first
+    tasks = [ (fold, n, label_jobs if workers == 1 else 1) \
+              for n in sorted(num_feats, reverse=True) for fold in range(num_folds) ]
+
+    print 'Cross-validating %d vocabulary sizes over %d folds with %d worker(s)...\n' % (len(num_feats), num_folds, workers)
+
+    scratch_directory = tempfile.mkdtemp(prefix='cross_validate_')
+    try:
+        share_matrices(scratch_directory, {'x' : x, 'y' : y, 'folds' : folds})
+        del x, y
+
+        t0 = time()
+        with instrumentation.section('cross_validate', items=len(tasks)):
+            if workers > 1:
+                pool = Pool(workers, initializer=load_worker_matrices, initargs=(scratch_directory,))
+                results = pool.map(evaluate_fold, tasks, 1)
+                pool.close()
+                pool.join()
+            else:
+                load_worker_matrices(scratch_directory)
+                results = map(evaluate_fold, tasks)
+        t1 = time()
+    finally:
+        shutil.rmtree(scratch_directory, ignore_errors=True)
+
+    results = pd.DataFrame(results).sort_values(['num_feats', 'fold']).reset_index(drop=True)
+    results['feat_extract_time'] = feat_extract_time
+
+    pd.set_option('display.width', 200)
+    pd.set_option('display.max_columns', 30)
+
+    print(results[['num_feats', 'fold', 'num_train', 'num_test'] + METRIC_COLUMNS])
+    print ''
+    print(aggregate_folds(results))
+    print 'Total cross-validation time: %f' % (t1-t0)
+
+    if results_file is not None:
+        write_table(results, results_file)
+        print 'Per-fold results saved to file %s.npz' % results_file
+
+    if report_file is not None:
+        instrumentation.save(report_file)
+        print 'Instrumentation report saved to file %s' % report_file
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cross-validate baseline models for several vocabulary sizes.')
+    parser.add_argument('--folds', dest='num_folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=1, help='number of processes training folds in parallel')
+    parser.add_argument('--label-jobs', type=int, default=1, help='number of jobs training the per-label SVMs when workers is 1')
+    parser.add_argument('--data-dir', dest='data_directory', default='../data')
+    parser.add_argument('--num-feats', type=int, nargs='+', default=None, \
+                        help='vocabulary sizes, by default 50 100 200 500 1000 and all keywords')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the assignment of questions to folds')
+    parser.add_argument('--feature-cache', dest='cache_directory', default=None, \
+                        help='directory of the feature cache, by default feature_cache in the data directory')
+    parser.add_argument('--no-feature-cache', action='store_true', help='featurize from scratch without a feature cache')
+    parser.add_argument('--cache-size-mb', type=int, default=1024, help='size above which the least recently used features are evicted')
+    parser.add_argument('--results', dest='results_file', default=None, help='base path of the table of the per-fold results')
+    parser.add_argument('--report', dest='report_file', default=None, help='JSON file to write the instrumentation report to')
+    parser.add_argument('--group-clusters', action='store_true', help='keep the near-duplicate clusters of near_duplicates.py in one fold')
+    parser.add_argument('--canonical-only', action='store_true', help='only use the canonical question of every near-duplicate cluster')
+    args = parser.parse_args()
+
+    cache_directory = None
+    if not args.no_feature_cache:
+        cache_directory = args.cache_directory or os.path.join(args.data_directory, 'feature_cache')
+
+    main(args.num_folds, args.workers, args.label_jobs, args.data_directory, args.num_feats, args.seed, \
+         cache_directory, args.cache_size_mb, args.results_file, args.report_file, args.group_clusters, args.canonical_only)
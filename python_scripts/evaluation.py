@@ -0,0 +1,250 @@
+"""
+This module evaluates multi-label keyword predictions held as sparse label indicator matrices.
+
+All the metrics of baseline_model (jaccard similarity, hamming loss and micro averaged
+precision, recall and f1) follow from one confusion tally per label, the true positives,
+false positives and false negatives, plus the jaccard similarity of each sample. These
+are computed for many predictions of the same test set at once, by stacking them into one
+sparse matrix, so comparing dozens of (model, vocabulary size) configurations costs one
+sparse product instead of five scikit-learn metric calls each on dense matrices.
+
+Sample usage:
+
+    results = evaluate_many(y_true, [('LinearSVC_50', y_pred_50), ('SGD_50', y_pred_sgd)])
+
+    evaluation_table(results)                  # one row of metrics per configuration
+    results['LinearSVC_50'].per_label(keywords) # precision, recall, f1 and support per keyword
+
+    save_predictions('../data/predictions.npz', predictions, keywords, test_rows)
+"""
+from __future__ import division
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+def binary_csr(y):
+    """
+    Returns the label indicator matrix y as a scipy.sparse CSR matrix of ones
+    """
+    y = sp.csr_matrix(y)
+    y.sum_duplicates()
+    y.eliminate_zeros()
+    y.data = np.ones(len(y.data), dtype=np.int8)
+    return y
+
+
+def _tallies(y_true, predictions):
+    """
+    Returns the tuple (true_positives, predicted, actual, jaccard) for a list of predictions of
+    the same test set, where the first three are numpy arrays of shape (len(predictions), num_labels)
+    and jaccard is of shape (len(predictions), num_samples)
+    """
+    y_true = binary_csr(y_true)
+    num_samples, num_labels = y_true.shape
+    k = len(predictions)
+
+    stacked_predictions = sp.vstack([ binary_csr(y_pred) for y_pred in predictions ]).tocsr()
+    stacked_true = sp.vstack([y_true] * k).tocsr()
+
+    if stacked_predictions.shape != stacked_true.shape:
+        raise ValueError('predictions must have the shape %s of y_true' % (y_true.shape,))
+
+    intersection = stacked_true.multiply(stacked_predictions).tocoo()
+    prediction_entries = stacked_predictions.tocoo()
+
+    # Row r of the stacked matrices is sample r % num_samples of prediction r // num_samples
+    true_positives = np.bincount((intersection.row // num_samples) * num_labels + intersection.col, \
+                                 minlength=k * num_labels).reshape(k, num_labels)
+    predicted = np.bincount((prediction_entries.row // num_samples) * num_labels + prediction_entries.col, \
+                            minlength=k * num_labels).reshape(k, num_labels)
+    actual = np.tile(np.bincount(y_true.indices, minlength=num_labels), (k, 1))
+
+    sample_intersection = np.bincount(intersection.row, minlength=k * num_samples)
+    union = np.diff(stacked_true.indptr) + np.diff(stacked_predictions.indptr) - sample_intersection
+
+    # Samples with no true and no predicted labels score 1, as in jaccard_similarity_score
+    jaccard = np.ones(k * num_samples)
+    np.true_divide(sample_intersection, union, out=jaccard, where=union > 0)
+
+    return true_positives, predicted, actual, jaccard.reshape(k, num_samples)
+
+
+def _ratio(numerator, denominator):
+    """
+    Returns numerator / denominator elementwise, 0 where the denominator is 0
+    """
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    result = np.zeros(np.broadcast(numerator, denominator).shape)
+    np.true_divide(numerator, denominator, out=result, where=denominator > 0)
+    return result
+
+
+class LabelTallies():
+    """
+    This class holds the per-label confusion tallies and the summed per-sample jaccard
+    similarity of the predictions of a test set, which can be accumulated over blocks.
+
+    Sample usage:
+
+        tallies = LabelTallies(num_labels)
+        for y_true_block, y_pred_block in blocks:
+            tallies.update(y_true_block, y_pred_block)
+
+        tallies.metrics()      # {'jaccard': ..., 'hamming_loss': ..., 'precision': ..., ...}
+    """
+    def __init__(self, num_labels):
+        self.num_labels = num_labels
+        self.num_samples = 0
+        self.true_positives = np.zeros(num_labels, dtype=np.int64)
+        self.false_positives = np.zeros(num_labels, dtype=np.int64)
+        self.false_negatives = np.zeros(num_labels, dtype=np.int64)
+        self.jaccard_sum = 0.0
+
+    def update(self, y_true, y_pred):
+        """
+        Adds the tallies of one block of label indicator matrices
+        """
+        true_positives, predicted, actual, jaccard = _tallies(y_true, [y_pred])
+        self.add(true_positives[0], predicted[0], actual[0], jaccard[0])
+
+    def add(self, true_positives, predicted, actual, jaccard):
+        """
+        Adds per-label counts of true positives, predicted and actual labels, and the
+        numpy array of the jaccard similarity of each sample
+        """
+        self.num_samples += len(jaccard)
+        self.true_positives += true_positives
+        self.false_positives += predicted - true_positives
+        self.false_negatives += actual - true_positives
+        self.jaccard_sum += jaccard.sum()
+
+    def metrics(self):
+        """
+        Returns python dict of the jaccard similarity, hamming loss, the micro averaged precision,
+        recall and f1, and the macro averaged f1, matching the scikit-learn metrics
+        """
+        tp = self.true_positives.sum()
+        fp = self.false_positives.sum()
+        fn = self.false_negatives.sum()
+
+        precision = float(_ratio(tp, tp + fp))
+        recall = float(_ratio(tp, tp + fn))
+
+        return {'jaccard' : float(_ratio(self.jaccard_sum, self.num_samples)), \
+                'hamming_loss' : float(_ratio(fp + fn, self.num_samples * self.num_labels)), \
+                'precision' : precision, \
+                'recall' : recall, \
+                'f1' : float(_ratio(2 * precision * recall, precision + recall)), \
+                'macro_f1' : self.per_label()['f1'].mean() if self.num_labels else 0.0}
+
+    def per_label(self, labels=None):
+        """
+        Returns pandas DataFrame of the tallies, precision, recall, f1 and support of each label
+        @params
+            - labels: optional python list of the label names, e.g. the keywords
+        """
+        tp, fp, fn = self.true_positives, self.false_positives, self.false_negatives
+
+        precision = _ratio(tp, tp + fp)
+        recall = _ratio(tp, tp + fn)
+
+        return pd.DataFrame({'label' : labels if labels is not None else np.arange(self.num_labels), \
+                             'support' : tp + fn, \
+                             'true_positives' : tp, \
+                             'false_positives' : fp, \
+                             'false_negatives' : fn, \
+                             'precision' : precision, \
+                             'recall' : recall, \
+                             'f1' : _ratio(2 * precision * recall, precision + recall)}, \
+                            columns=['label', 'support', 'true_positives', 'false_positives', 'false_negatives', \
+                                     'precision', 'recall', 'f1'])
+
+
+def evaluate_many(y_true, predictions):
+    """
+    Evaluates several predictions of the same test set in one pass
+    @params
+        - y_true: label indicator matrix of the test set, dense or scipy.sparse
+        - predictions: python list of (name, y_pred) tuples, y_pred of the shape of y_true
+    @return
+        - python dict of name to the LabelTallies of its predictions
+    """
+    if not predictions:
+        return {}
+
+    true_positives, predicted, actual, jaccard = _tallies(y_true, [ y_pred for name, y_pred in predictions ])
+
+    results = {}
+    for i, (name, y_pred) in enumerate(predictions):
+        tallies = LabelTallies(true_positives.shape[1])
+        tallies.add(true_positives[i], predicted[i], actual[i], jaccard[i])
+        results[name] = tallies
+
+    return results
+
+
+def evaluation_table(results):
+    """
+    Returns pandas DataFrame with one row of metrics per evaluated configuration
+    @params
+        - results: python dict of name to LabelTallies, as returned by evaluate_many
+    """
+    rows = []
+    for name in sorted(results):
+        row = results[name].metrics()
+        row['name'] = name
+        row['num_test'] = results[name].num_samples
+        rows.append(row)
+
+    return pd.DataFrame(rows, columns=['name', 'num_test', 'jaccard', 'hamming_loss', 'precision', 'recall', 'f1', 'macro_f1'])
+
+
+def save_predictions(path, predictions, labels, rows=None):
+    """
+    Persists predictions as sparse label indices in an .npz file, instead of a CSV of
+    python list reprs
+    @params
+        - predictions: python dict of name to label indicator matrix
+        - labels: python list of the label names of the columns, e.g. the keywords
+        - rows: optional python dict of name to the numpy array of the question of every row
+                of its predictions, e.g. its row index in question_info_data_2
+    """
+    arrays = {'names' : np.array(sorted(predictions)), 'labels' : np.array(labels)}
+
+    for i, name in enumerate(sorted(predictions)):
+        y_pred = binary_csr(predictions[name])
+        arrays['indices_%d' % i] = y_pred.indices.astype(np.int32)
+        arrays['indptr_%d' % i] = y_pred.indptr.astype(np.int64)
+        arrays['shape_%d' % i] = np.array(y_pred.shape)
+        if rows is not None:
+            arrays['rows_%d' % i] = np.asarray(rows[name])
+
+    np.savez_compressed(path, **arrays)
+
+
+def load_predictions(path):
+    """
+    Loads predictions persisted with save_predictions
+    @return
+        - tuple (predictions, labels, rows) of the python dict of name to scipy.sparse CSR
+          indicator matrix, the python list of label names and the python dict of name to the
+          numpy array of the question of every row, None if they were not saved
+    """
+    arrays = np.load(path)
+
+    predictions = {}
+    for i, name in enumerate(arrays['names'].tolist()):
+        indices = arrays['indices_%d' % i]
+        predictions[name] = sp.csr_matrix( (np.ones(len(indices), dtype=np.int8), indices, arrays['indptr_%d' % i]), \
+                                           shape=tuple(arrays['shape_%d' % i]) )
+
+    rows = None
+    if 'rows_0' in arrays.files:
+        rows = dict( (name, arrays['rows_%d' % i]) for i, name in enumerate(arrays['names'].tolist()) )
+
+    labels = arrays['labels'].tolist()
+    arrays.close()
+
+    return predictions, labels, rows
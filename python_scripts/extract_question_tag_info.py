@@ -1,16 +1,26 @@
 """
 This script scans through each of the tagged questions, extracts the question data, such as the 
 question text and embedded LaTeX expressions, extracts keyword usage data such as the number
-of times a keyword appears for a question as well as the paths to the questions in which
-a keyword appears, and persists this information as pandas DataFrames for future analysis.
+of times a keyword appears, and persists this information as pandas DataFrames for future
+analysis. The questions in which each keyword appears are persisted as a KeywordIndex in
+keyword_index.npz, which stores integer question ids instead of lists of paths.
 
 @author Luigi Patruno
 @date April 14 2015
 """
+import argparse
+import os
 import re
+from multiprocessing import Pool
 from time import time
 import pandas as pd
 
+from extraction_manifest import ExtractionManifest
+from instrumentation import instrumentation
+from keyword_index import KeywordIndex
+from pg_parser import PGParser
+from table_store import write_table
+
 def get_keywords(question_file_lines):
     """
     This function accepts file contents of a tagged question file, extracts the keywords,
@@ -120,9 +130,104 @@ def get_latex(question_text):
 
 
 
-def main():
+# Shared by the worker processes of the pool
+question_parser = PGParser()
+
+
+def extract_question_info(path):
+    """
+    This function opens and parses a single tagged question file.
+    Questions that turn out to be corrupted, e.g. without a keywords line, are detected by
+    the parser and reported in the 'corrupted' entry. Questions formatted differently, whose
+    text is delimited by TEXT/ANS lines, are detected by the parser as well.
+    @params
+        - path: file path of the question
+    @return
+        - python dict of the question's file path, text, LaTeX expressions and keywords,
+          plus the parser's 'format' and 'corrupted' entries
+    """
+    with instrumentation.section('parse_file', items=1):
+        question_dict = question_parser.parse_file(path)
+    question_dict['question_file_path'] = path
+
+    return question_dict
+
+
+def extract_all_question_info(tagged_paths, workers=1, manifest=None):
+    """
+    This function parses every tagged question file and collects the question and keyword information.
+    Corrupted questions are left out.
+    With workers > 1 the files are parsed in a pool of processes. The parsed questions come back
+    in the order of tagged_paths and are merged in that order, so the result does not depend
+    on the number of workers.
+    If an ExtractionManifest is given, files unchanged since the manifest was saved are not
+    parsed again; their cached question information is used instead.
+    @params
+        - tagged_paths: python list of file paths to tagged questions
+        - workers: number of processes used to parse the files
+        - manifest: optional ExtractionManifest caching the parsed question information
+    @return
+        - tuple (question_info, keyword_info) of the question and keyword data structures
+    """
+    questions = [None] * len(tagged_paths)
+    entries = [None] * len(tagged_paths)
+    to_parse = []
+
+    for j, path in enumerate(tagged_paths):
+        if manifest is not None:
+            entries[j] = manifest.lookup(path)
+            if 'question' in entries[j]:
+                questions[j] = entries[j]['question']
+                continue
+        to_parse.append(j)
+
+    parse_paths = [ tagged_paths[j] for j in to_parse ]
+
+    if workers > 1 and len(parse_paths) > 1:
+        pool = Pool(workers)
+        chunksize = max(1, len(parse_paths) // (workers * 16))
+        parsed = pool.map(extract_question_info, parse_paths, chunksize)
+        pool.close()
+        pool.join()
+    else:
+        parsed = map(extract_question_info, parse_paths)
+
+    for j, question_dict in zip(to_parse, parsed):
+        questions[j] = question_dict
+
+        if manifest is not None:
+            entries[j]['question'] = question_dict
+
+    corrupted = [ question_dict for question_dict in questions if question_dict['corrupted'] is not None ]
+    if corrupted:
+        print 'Leaving out %d corrupted questions' % len(corrupted)
+
+    keyword_info = {}
+    question_info = {'questions' : []}
+
+    for question_dict in questions:
+
+        # These files contain corrupted questions. Do not include them
+        if question_dict['corrupted'] is not None:
+            continue
+
+        # Update the question_info data structure
+        question_info['questions'].append( question_dict )
+
+        # Update the keyword_info data structure. The questions of each keyword are
+        # kept in the KeywordIndex instead of a list of paths per keyword
+        for keyword in question_dict['keywords']:
+            if keyword in keyword_info:
+                keyword_info[keyword]['count'] += 1
+            else:
+                keyword_info[keyword] = {'count' : 1}
+
+    return question_info, keyword_info
+
+
+def main(workers=1, manifest_file=None, data_directory='../data'):
     
-    tagged_content = '../data/tagged_paths.txt'
+    tagged_content = os.path.join(data_directory, 'tagged_paths.txt')
 
     tagged_paths = []
 
@@ -133,60 +238,21 @@ def main():
     
     t0 = time()
 
-    keyword_info = {}
-    question_info = {'questions' : []}
+    print 'Scanning all tagged questions and extracting relevant infomation with %d worker(s)...\n' % workers
 
-    print 'Scanning all tagged questions and extracting relevant infomation...\n'
+    manifest = None
+    if manifest_file is not None:
+        manifest = ExtractionManifest(manifest_file)
 
-    for i, path in enumerate(tagged_paths):
-        
-        # These files contain corrupted questions. Do not include them
-        # Noticed after inspection
-        if i not in [1849, 1850, 3330, 7950, 15251, 15252, 15253, 15453, 15454, 15455, \
-                    15456, 15457, 15458, 15459, 15460, 15461, 15462, 15463, 15464, 15465,\
-                    15466, 15467, 15468, 15469, 15470, 15471, 15472, 15473, 15474, 15475, \
-                    15476, 15477, 15478, 15479, 18634, 18635, 18636]:
-        
-            question_file_handle = open(path, mode='r')
-            question_file_lines = question_file_handle.readlines()
-            question_file_handle.close()
-    
-            # Extract question information
-            keywords =  get_keywords(question_file_lines)
-        
-            # After running this script I noticed there were several questions whose text were blank
-            # Some of these were misformatted questions
-            # These below were just formatted differently.
-            # Hence, changed the get_question_text file to incorporate the different format
-        
-            if i in [5269, 5792, 8479, 8519, 8758, 8769, 8784, 8984, 8989, 8990, 8991, 8992, 9552, 9733, 10372, 15834]: 
-                question_text = get_question_text(question_file_lines, i)
-            else:
-                question_text = get_question_text(question_file_lines)
-        
-            latex = get_latex(question_text)
-    
-            # Update the question_info data structure
-            question_dict = {'question_file_path' : path, \
-                         'question_text' : question_text, \
-                         'latex_expressions' : latex, \
-                          'keywords' : keywords }
-                                         
-            question_info['questions'].append( question_dict )
-    
-    
-            # Update the keyword_info data structure
-            # Include file path to act as a foreign key between the keyword_info 
-            # and question_info structs
-            for keyword in keywords:
-                if keyword in keyword_info:
-                    keyword_info[keyword]['count'] += 1
-                    keyword_info[keyword]['question_file_path'].append( path )
-                else:
-                    keyword_info[keyword] = {'count' : 1, 'question_file_path' : [path]}
+    with instrumentation.section('extract', items=len(tagged_paths)):
+        question_info, keyword_info = extract_all_question_info(tagged_paths, workers, manifest)
             
     t1 = time()
 
+    if manifest is not None:
+        manifest.save()
+        print 'Manifest %s: %d unchanged, %d added or changed questions' % (manifest_file, manifest.hits, manifest.misses)
+
     print 'Extraction complete'
     print 'Total time: %d sec' % (t1-t0)
     print 'Total number of keywords found: %d \n' % len(keyword_info.keys())
@@ -196,15 +262,12 @@ def main():
     # extract the info as lists
     keywords = keyword_info.keys()
     counts = []
-    k_paths = []
 
     for keyword in keywords:
         counts.append( keyword_info[keyword]['count'] )
-        k_paths.append( keyword_info[keyword]['question_file_path'] )
     
     keyword_df = pd.DataFrame({'keyword': keywords, \
-                       'count': counts, \
-                       'question_file_path': k_paths})
+                       'count': counts})
                        
     # Let's do the same for the question data    
     q_paths = []
@@ -224,15 +287,25 @@ def main():
                                'keywords' : q_keywords })
                                
     # Yay let's persist these structures
-    tag_info_data = '../data/tag_info_data.csv'
-    question_info_data = '../data/question_info_data.csv'
+    tag_info_data = os.path.join(data_directory, 'tag_info_data')
+    question_info_data = os.path.join(data_directory, 'question_info_data')
+    
+    write_table(question_df, question_info_data)
+    write_table(keyword_df, tag_info_data)
     
-    question_df.to_csv(question_info_data)
-    keyword_df.to_csv(tag_info_data)
+    # The questions of each keyword, with the keyword ids of the rows of tag_info
+    keyword_index_file = os.path.join(data_directory, 'keyword_index.npz')
+    KeywordIndex.from_questions(q_paths, q_keywords, keywords).save(keyword_index_file)
     
-    print 'Tag data persisted to file: %s' % tag_info_data
-    print 'Question data persisted to file: %s' % question_info_data
+    print 'Tag data persisted to file: %s.npz' % tag_info_data
+    print 'Question data persisted to file: %s.npz' % question_info_data
+    print 'Keyword index persisted to file: %s' % keyword_index_file
         
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Extract question and keyword information from the tagged questions.')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes used to parse the question files')
+    parser.add_argument('--manifest', dest='manifest_file', default=None, help='manifest file used to only re-parse added or changed files')
+    parser.add_argument('--data-dir', dest='data_directory', default='../data')
+    args = parser.parse_args()
+    main(args.workers, args.manifest_file, args.data_directory)
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+This module keeps a persistent manifest of the WebWorK question files that have already been
+scanned. For each path it records the file's size, modification time and content hash along
+with the cached results of scanning it, so that re-runs after a library update only need to
+re-read the files that were added or changed.
+"""
+import cPickle as pickle
+import hashlib
+import os
+
+# Bump whenever the classification or extraction functions change so that stale
+# cached results are not reused
+MANIFEST_VERSION = 2
+
+
+def file_hash(path):
+    """
+    Returns the hex SHA-1 digest of the contents of the file at path
+    """
+    sha1 = hashlib.sha1()
+
+    handle = open(path, mode='rb')
+    for block in iter(lambda: handle.read(1 << 16), ''):
+        sha1.update(block)
+    handle.close()
+
+    return sha1.hexdigest()
+
+
+class ExtractionManifest():
+    """
+    This class maps question file paths to their size, mtime, content hash and cached results.
+
+    Sample usage:
+
+        manifest = ExtractionManifest('../data/extraction_manifest.pkl')
+
+        entry = manifest.lookup(path)
+        if 'question' not in entry:
+            entry['question'] = extract_question_info(path)
+
+        manifest.prune()
+        manifest.save()
+
+    Each entry is a dict with keys 'size', 'mtime' and 'sha1'. Cached results are stored in
+    the same dict by the caller and are dropped whenever the file's contents change.
+    """
+    def __init__(self, manifest_file):
+        """
+        @params
+            - manifest_file: path to the pickled manifest. It is created on save if it does not exist
+        """
+        self.manifest_file = manifest_file
+        self.entries = {}
+        self.seen = set()
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.exists(manifest_file):
+            manifest_handle = open(manifest_file, mode='rb')
+            manifest = pickle.load(manifest_handle)
+            manifest_handle.close()
+
+            if manifest['version'] == MANIFEST_VERSION:
+                self.entries = manifest['entries']
+
+    def lookup(self, path):
+        """
+        Returns the manifest entry for path, with its cached results if the file is unchanged.
+        A file whose size and mtime match the manifest is assumed unchanged. Otherwise its
+        contents are hashed, and cached results are only kept if the hash still matches.
+        @params
+            - path: python string of question file path
+        """
+        self.seen.add(path)
+
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            self.hits += 1
+            return entry
+
+        sha1 = file_hash(path)
+
+        if entry is not None and entry['sha1'] == sha1:
+            # Touched but not modified
+            self.hits += 1
+            entry['size'] = stat.st_size
+            entry['mtime'] = stat.st_mtime
+            return entry
+
+        self.misses += 1
+        entry = {'size' : stat.st_size, 'mtime' : stat.st_mtime, 'sha1' : sha1}
+        self.entries[path] = entry
+
+        return entry
+
+    def prune(self):
+        """
+        Removes the entries of all files that have not been looked up since the manifest was
+        loaded, i.e. files deleted from the library. Only call this after a full scan of the
+        library. Returns the number of entries removed.
+        """
+        deleted = [ path for path in self.entries if path not in self.seen ]
+
+        for path in deleted:
+            del self.entries[path]
+
+        return len(deleted)
+
+    def save(self):
+        """
+        Persists the manifest to self.manifest_file
+        """
+        manifest_handle = open(self.manifest_file, mode='wb')
+        pickle.dump({'version' : MANIFEST_VERSION, 'entries' : self.entries}, manifest_handle, pickle.HIGHEST_PROTOCOL)
+        manifest_handle.close()
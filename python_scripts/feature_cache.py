@@ -0,0 +1,216 @@
+"""
+This module is a persistent on-disk cache of featurized matrices.
+
+Featurizing a table means reading it, parsing its list columns and binarizing them against a
+vocabulary, which every experiment repeats although its inputs rarely change. A FeatureCache
+stores the resulting matrices in one uncompressed .npz file per entry, named after a key that
+hashes everything the matrices depend on: the contents of the input table, the vocabulary and
+the settings of the extractor. Loading an entry takes milliseconds, and a changed table or
+vocabulary simply gives a new key.
+
+The cache is bounded in size: every hit marks its entry as used by updating its modification
+time, and after every insertion the least recently used entries are deleted until the cache
+fits in max_bytes again.
+
+Sample usage:
+
+    cache = FeatureCache('../data/feature_cache', max_bytes=1 << 30)
+
+    key = cache.key('baseline', cache.table_fingerprint('../data/question_info_data_2'), keywords)
+    matrices = cache.get_or_compute(key, lambda: {'x' : bfe.encode(x_raw), 'y' : bfe.encode(y_raw)})
+"""
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+import scipy.sparse as sp
+
+from extraction_manifest import file_hash
+from table_store import table_file
+
+# Default size bound of a cache
+DEFAULT_MAX_BYTES = 1 << 30
+
+
+class FeatureCache():
+    """
+    This class stores python dicts of named numpy arrays and scipy.sparse matrices under
+    content keys in a directory, evicting the least recently used entries beyond max_bytes.
+    Entries are written to a temporary file and renamed into place, so processes sharing a
+    cache never read a partially written entry.
+    """
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        @params
+            - directory: directory of the cache entries, created if missing
+            - max_bytes: total size of the entries above which the least recently used are deleted
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.fingerprints_file = os.path.join(directory, 'fingerprints.json')
+
+    def key(self, *parts):
+        """
+        Returns the hex SHA-1 digest of parts, which must be serializable as JSON: strings,
+        numbers, lists and dicts such as fingerprints, vocabularies and settings
+        """
+        return hashlib.sha1( json.dumps(parts, sort_keys=True) ).hexdigest()
+
+    def table_fingerprint(self, base_path):
+        """
+        Returns the hash of the contents of the table at base_path, as written by write_table.
+        The .csv export is hashed when there is one: write_table writes it with the same
+        contents just before the .npz, and read_table reads it instead when it is newer, so it
+        identifies the contents loaded, while the .npz zip members carry the time they were
+        written and would change the key of a table rewritten unchanged. Hashes are
+        remembered by path, size and modification time, so an unchanged table is not read again.
+        """
+        path = base_path + '.csv'
+        if not os.path.exists(path):
+            path = table_file(base_path)
+        stat = os.stat(path)
+        signature = '%d:%r' % (stat.st_size, stat.st_mtime)
+
+        fingerprints = {}
+        if os.path.exists(self.fingerprints_file):
+            fingerprints_file_handle = open(self.fingerprints_file, mode='r')
+            fingerprints = json.load(fingerprints_file_handle)
+            fingerprints_file_handle.close()
+
+        entry = fingerprints.get(os.path.abspath(path))
+        if entry is not None and entry['signature'] == signature:
+            return entry['hash']
+
+        fingerprints[os.path.abspath(path)] = {'signature' : signature, 'hash' : file_hash(path)}
+        self._write_atomically(self.fingerprints_file, lambda handle: json.dump(fingerprints, handle))
+
+        return fingerprints[os.path.abspath(path)]['hash']
+
+    def path(self, key):
+        """
+        Returns the path of the entry of key
+        """
+        return os.path.join(self.directory, key + '.npz')
+
+    def get(self, key):
+        """
+        Returns the python dict of matrices stored under key, None if there is no such entry
+        """
+        path = self.path(key)
+
+        try:
+            arrays = np.load(path)
+        except IOError:
+            self.misses += 1
+            return None
+
+        matrices = {}
+        for name in arrays['names'].tolist():
+            if arrays[name + '.format'].item() == 'csr':
+                matrices[name] = sp.csr_matrix( (arrays[name + '.data'], arrays[name + '.indices'], arrays[name + '.indptr']), \
+                                                shape=tuple(arrays[name + '.shape']) )
+            else:
+                matrices[name] = arrays[name + '.data']
+        arrays.close()
+
+        # Mark the entry as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        self.hits += 1
+
+        return matrices
+
+    def put(self, key, matrices):
+        """
+        Stores the python dict of named numpy arrays and scipy.sparse matrices under key and
+        evicts the least recently used entries if the cache grew beyond max_bytes
+        """
+        arrays = {'names' : np.array(sorted(matrices))}
+
+        for name, matrix in matrices.iteritems():
+            if sp.issparse(matrix):
+                matrix = sp.csr_matrix(matrix)
+                arrays[name + '.format'] = np.array('csr')
+                arrays[name + '.data'] = matrix.data
+                arrays[name + '.indices'] = matrix.indices
+                arrays[name + '.indptr'] = matrix.indptr
+                arrays[name + '.shape'] = np.array(matrix.shape)
+            else:
+                arrays[name + '.format'] = np.array('dense')
+                arrays[name + '.data'] = np.asarray(matrix)
+
+        self._write_atomically(self.path(key), lambda handle: np.savez(handle, **arrays))
+        self.evict(keep=key)
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the matrices stored under key, calling compute() to create and store them if needed
+        """
+        matrices = self.get(key)
+        if matrices is None:
+            matrices = compute()
+            self.put(key, matrices)
+
+        return matrices
+
+    def entries(self):
+        """
+        Returns python list of the (last used time, size, path) of the entries, least recently used first
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'):
+                continue
+
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append( (stat.st_mtime, stat.st_size, path) )
+
+        entries.sort()
+
+        return entries
+
+    def evict(self, keep=None):
+        """
+        Deletes the least recently used entries until the cache fits in max_bytes, except the
+        entry of key keep
+        """
+        entries = self.entries()
+        total = sum( size for last_used, size, path in entries )
+
+        for last_used, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if keep is not None and path == self.path(keep):
+                continue
+
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def _write_atomically(self, path, write):
+        """
+        Calls write with a handle of a temporary file in the cache directory, then renames it to path
+        """
+        handle, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        temporary_file_handle = os.fdopen(handle, 'wb')
+        try:
+            write(temporary_file_handle)
+        finally:
+            temporary_file_handle.close()
+        os.rename(temporary_path, path)
@@ -0,0 +1,89 @@
+"""
+This module is the file access layer of the scanning and extraction scripts.
+
+Reading a question file with open(path).readlines() allocates a list of line strings for every
+file of the library, and reading it in blocks allocates a string per block plus their
+concatenation, even though the classifier and the parser only search the contents for a few
+markers. A QuestionFileReader reads each file with a single read into one string, and memory
+maps the rare large files, so the classifier and the parser search the raw bytes
+and only create strings for the regions they extract.
+
+Reading into one bytearray reused for all files was tried as well. On CPython 2.7 the
+io.FileIO object needed for readinto costs more than the single string it saves, so it
+was slower than os.read for the small files that make up the library.
+"""
+import mmap
+import os
+
+# Size of the first read of a file, which holds all of almost every question file
+READ_SIZE = 1 << 16
+
+# Files larger than this are memory mapped instead of read
+MMAP_THRESHOLD = 1 << 20
+
+
+class QuestionFileReader():
+    """
+    This class gives access to the raw bytes of question files. The contents returned by
+    read are only valid until the next call to read or close, and a reader must not be
+    shared between threads.
+
+    Sample usage:
+
+        reader = QuestionFileReader()
+
+        for path in paths:
+            contents, length = reader.read(path)
+            keyword = contents.find('KEYWORD', 0, length)
+
+        reader.close()
+
+    contents is a string, or an mmap for files larger than MMAP_THRESHOLD. Both support find,
+    rfind, slicing and regular expression searches.
+    """
+    def __init__(self):
+        self.mapping = None
+
+    def read(self, path):
+        """
+        Reads the file at path
+        @return
+            - tuple (contents, length) of the string or mmap holding the file and its size
+        """
+        self.close()
+
+        question_file = os.open(path, os.O_RDONLY)
+        try:
+            contents = os.read(question_file, READ_SIZE)
+
+            if len(contents) < READ_SIZE:
+                return contents, len(contents)
+
+            if os.fstat(question_file).st_size > MMAP_THRESHOLD:
+                self.mapping = mmap.mmap(question_file, 0, access=mmap.ACCESS_READ)
+                return self.mapping, len(self.mapping)
+
+            blocks = [contents]
+            while blocks[-1]:
+                blocks.append( os.read(question_file, MMAP_THRESHOLD) )
+            contents = ''.join(blocks)
+
+            return contents, len(contents)
+        finally:
+            os.close(question_file)
+
+    def close(self):
+        """
+        Releases the memory map of the last file read, if any
+        """
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+
+
+def to_str(contents, start, end):
+    """
+    Returns the region [start, end) of raw file contents as a python string
+    """
+    region = contents[start:end]
+    return region if isinstance(region, str) else str(region)
@@ -6,14 +6,55 @@ is found within the text
 @author Luigi Patruno
 @date 15 April 2015
 """
-import pandas as pd
+import argparse
+import os
 from time import time
 
-def main():
+from instrumentation import instrumentation
+from keyword_matcher import KeywordMatcher
+from table_store import TAG_INFO_LITERALS, read_table, write_table
+
+
+def find_keywords(question, keywords):
+    """
+    Returns python list of the keywords found in the question text by testing every keyword.
+    This is the original brute force search, kept as a reference for KeywordMatcher.
+    @params
+        - question: python string of question text
+        - keywords: python list of keyword strings
+    """
+    # To hold all keywords found
+    keywords_found_in_text = []
+
+    # Tokenize the question
+    question_tokens = question.split()     
+
+    # Convert to dict for faster searching
+    question_tokens = {token:0 for token in question_tokens}
+
+    for keyword in keywords:
+
+        keyword_tokens = keyword.split()
+        
+        question_contains_tokens = []
+        
+        for token in keyword_tokens:
+            if token in question_tokens:
+                question_contains_tokens.append(True)
+            else:
+                question_contains_tokens.append(False)
+
+        if all(vals == True for vals in question_contains_tokens):
+            keywords_found_in_text.append(keyword)
+
+    return keywords_found_in_text
+
+
+def main(data_directory='../data'):
     
-    # Read in question and tag info from csv files
-    question_info = pd.read_csv('../data/question_info_data.csv', index_col=0)
-    tag_info = pd.read_csv('../data/tag_info_data.csv', index_col=0)
+    # Read in question and tag info
+    question_info = read_table(os.path.join(data_directory, 'question_info_data'))
+    tag_info = read_table(os.path.join(data_directory, 'tag_info_data'), TAG_INFO_LITERALS)
 
 
     # Remove annoying NaN value found within the tag info
@@ -31,33 +72,14 @@ def main():
     
     t0 = time()
     print 'Searching for any keywords in all question texts...\n'
-    for question in question_info['question_text'].values:
-        
-        # To hold all keywords found
-        keywords_found_in_text = []
-    
-        # Tokenize the question
-        question_tokens = question.split()     
-
-        # Convert to dict for faster searching
-        question_tokens = {token:0 for token in question_tokens}
-
-        for keyword in tag_info['keyword'].values:
-
-            keyword_tokens = keyword.split()
-            
-            question_contains_tokens = []
-            
-            for token in keyword_tokens:
-                if token in question_tokens:
-                    question_contains_tokens.append(True)
-                else:
-                    question_contains_tokens.append(False)
-
-            if all(vals == True for vals in question_contains_tokens):
-                keywords_found_in_text.append(keyword)
-    
-        total_keywords_found_in_text.append(keywords_found_in_text)
+
+    # Compile the keyword vocabulary once for all questions
+    with instrumentation.section('keyword_compile', items=tag_info.shape[0]):
+        matcher = KeywordMatcher(tag_info['keyword'].values)
+
+    with instrumentation.section('keyword_matching', items=question_info.shape[0]):
+        for question in question_info['question_text'].values:
+            total_keywords_found_in_text.append( matcher.match(question) )
 
     t1 = time()
 
@@ -66,8 +88,12 @@ def main():
     
     print 'Persisting new column to file ...'
     question_info['keywords_in_text'] = total_keywords_found_in_text
-    question_info.to_csv('../data/question_info_data_2.csv')
-    print 'Data saved to file ../data/question_info_data_2.csv'
+    question_info_data = os.path.join(data_directory, 'question_info_data_2')
+    write_table(question_info, question_info_data)
+    print 'Data saved to file %s.npz' % question_info_data
     
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Find the keywords appearing in each question text.')
+    parser.add_argument('--data-dir', dest='data_directory', default='../data')
+    args = parser.parse_args()
+    main(args.data_directory)
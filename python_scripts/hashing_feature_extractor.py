@@ -0,0 +1,150 @@
+"""
+This module contains a feature extractor that hashes the LaTeX tokens and question text tokens of
+WebWorK questions into a fixed number of columns instead of looking them up in a vocabulary.
+
+The LaTeX models select the top LaTeX tokens of every keyword from tag_info_data_2 before they
+can featurize a single question, and their vocabulary grows with the library. Here each token is
+mapped to column crc32(namespace + token) mod 2 ** num_bits, so there is no vocabulary pass, the
+memory of the extractor does not depend on the number of distinct tokens, and any shard of the
+questions can be featurized on its own, e.g. in a pool of processes. Distinct tokens may share
+a column, which is rare for a large enough num_bits.
+"""
+import zlib
+from multiprocessing import Pool
+import numpy as np
+import scipy.sparse as sp
+
+from latex_token_counts import latex_tokens
+
+
+class HashingFeatureExtractor():
+    """
+    This class featurizes questions by their hashed LaTeX tokens, as tokenized by tokenize_latex,
+    and their hashed question text tokens.
+
+    Sample usage:
+
+        hfe = HashingFeatureExtractor(num_bits=18)
+
+        x = hfe.transform(question_info['question_text'], question_info['latex_expressions'])
+        x = hfe.transform_parallel(question_texts, latex_expressions, workers=4)
+
+        clf = OneVsRestClassifier(LinearSVC()).fit(x, y_train)
+    """
+    def __init__(self, num_bits=18, text=True, latex=True, binary=True, lowercase=True):
+        """
+        @params
+            - num_bits: the features have 2 ** num_bits columns
+            - text: if True, the tokens of the question text are hashed
+            - latex: if True, the LaTeX tokens are hashed
+            - binary: if True, the features are token indicators instead of token counts
+            - lowercase: if True, the question text is lowercased before it is split into tokens
+        """
+        self.num_bits = num_bits
+        self.num_features = 1 << num_bits
+        self.text = text
+        self.latex = latex
+        self.binary = binary
+        self.lowercase = lowercase
+
+    def _columns(self, tokens, namespace):
+        """
+        Returns the numpy array of the columns of a list of tokens hashed within namespace.
+        The namespaces keep a LaTeX token and the same word in the question text apart.
+        """
+        seed = zlib.crc32(namespace)
+        hashes = np.fromiter(map(zlib.crc32, tokens, [seed] * len(tokens)), dtype=np.int64, count=len(tokens))
+        return (hashes & (self.num_features - 1)).astype(np.int32)
+
+    def transform(self, question_texts, latex_expressions):
+        """
+        Returns the scipy.sparse CSR matrix of shape (number of questions, 2 ** num_bits) of the hashed tokens
+        @params
+            - question_texts: python list of question texts
+            - latex_expressions: python list of lists of LaTeX expressions of each question
+        """
+        rows = []
+        columns = []
+
+        for tokenize, namespace, values, enabled in [(self._text_tokens, 'text:', question_texts, self.text), \
+                                                     (self._latex_tokens, 'latex:', latex_expressions, self.latex)]:
+            if not enabled:
+                continue
+
+            tokens = []
+            lengths = []
+            for value in values:
+                question_tokens = tokenize(value)
+                tokens.extend(question_tokens)
+                lengths.append( len(question_tokens) )
+
+            rows.append( np.repeat(np.arange(len(lengths)), lengths) )
+            columns.append( self._columns(tokens, namespace) )
+
+        num_questions = len(question_texts) if self.text or not self.latex else len(latex_expressions)
+
+        if not rows:
+            return sp.csr_matrix( (num_questions, self.num_features) )
+
+        rows = np.concatenate(rows)
+        x = sp.csr_matrix( (np.ones(len(rows), dtype=np.float64), (rows, np.concatenate(columns))), \
+                           shape=(num_questions, self.num_features) )
+
+        if self.binary:
+            x.data[:] = 1
+
+        return x
+
+    def _text_tokens(self, question_text):
+        """
+        Returns python list of the tokens of a question text
+        """
+        if self.lowercase:
+            question_text = question_text.lower()
+        if isinstance(question_text, unicode):
+            question_text = question_text.encode('utf-8')
+        return question_text.split()
+
+    def _latex_tokens(self, list_of_latex):
+        """
+        Returns python list of the LaTeX tokens of a question, as byte strings
+        """
+        tokens = latex_tokens(list_of_latex)
+        # The expressions are joined before they are split, so the tokens are all unicode or all str
+        if tokens and isinstance(tokens[0], unicode):
+            tokens = [ token.encode('utf-8') for token in tokens ]
+        return tokens
+
+    def transform_parallel(self, question_texts, latex_expressions, workers=2, shard_size=10000):
+        """
+        Returns the same matrix as transform, featurizing shards of shard_size questions in a
+        pool of workers processes. The shards share no state, only the settings of the extractor.
+        """
+        question_texts = list(question_texts)
+        latex_expressions = list(latex_expressions)
+        num_questions = len(question_texts) if self.text or not self.latex else len(latex_expressions)
+
+        shards = [ (self, question_texts[first:first + shard_size], latex_expressions[first:first + shard_size]) \
+                   for first in range(0, num_questions, shard_size) ]
+
+        if workers <= 1 or len(shards) <= 1:
+            blocks = map(transform_shard, shards)
+        else:
+            pool = Pool(workers)
+            blocks = pool.map(transform_shard, shards, 1)
+            pool.close()
+            pool.join()
+
+        if not blocks:
+            return sp.csr_matrix( (0, self.num_features) )
+
+        return sp.vstack(blocks).tocsr()
+
+
+def transform_shard(shard):
+    """
+    Featurizes one shard of questions. Takes a single tuple (extractor, question_texts,
+    latex_expressions) so it can be mapped over a process pool.
+    """
+    extractor, question_texts, latex_expressions = shard
+    return extractor.transform(question_texts, latex_expressions)
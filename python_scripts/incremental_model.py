@@ -0,0 +1,153 @@
+"""
+This script trains a multi-label keyword classifier incrementally over a question_info table
+read in chunks, so that peak memory stays bounded by the chunk size instead of the corpus size.
+
+Each chunk is turned into a block of baseline features by BaselineFeatureExtractor.iter_blocks
+and fed to a MultiLabelSGD, one SGDClassifier per keyword trained with partial_fit. One row in
+every --test-every rows is held out, and the held out rows are evaluated in a second streaming
+pass from running tallies of the predictions.
+
+    python incremental_model.py --chunk-size 2000 --passes 3
+"""
+from __future__ import division
+import argparse
+import resource
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from time import time
+from sklearn.linear_model import SGDClassifier
+
+from baseline_feature_extractor import BaselineFeatureExtractor
+from evaluation import LabelTallies
+from table_store import TAG_INFO_LITERALS, iter_table_chunks, read_table
+
+
+class MultiLabelSGD():
+    """
+    This class trains one binary SGDClassifier per label with partial_fit, the incremental
+    counterpart of OneVsRestClassifier(LinearSVC()) (the default hinge loss is a linear SVM).
+
+    Sample usage:
+
+        clf = MultiLabelSGD(bfe.num_keywords)
+
+        for x_block, y_block, zero_count, feat_time in bfe.iter_blocks(chunks):
+            clf.partial_fit(x_block, y_block)
+
+        y_predict = clf.predict(x_test)
+    """
+    def __init__(self, num_labels, **sgd_params):
+        """
+        @params
+            - num_labels: number of columns of the label indicator matrices
+            - sgd_params: parameters of each SGDClassifier
+        """
+        self.num_labels = num_labels
+        self.estimators = [ SGDClassifier(**sgd_params) for j in range(num_labels) ]
+
+    def partial_fit(self, x_block, y_block):
+        """
+        Updates every per-label classifier with one block of samples
+        @params
+            - x_block: feature matrix of the block, dense or scipy.sparse
+            - y_block: label indicator matrix of the block, dense or scipy.sparse
+        """
+        y_block = sp.csc_matrix(y_block)
+        y = np.zeros(y_block.shape[0], dtype=np.int_)
+
+        for j, estimator in enumerate(self.estimators):
+            positives = y_block.indices[y_block.indptr[j]:y_block.indptr[j+1]]
+
+            y[:] = 0
+            y[positives] = 1
+
+            estimator.partial_fit(x_block, y, classes=[0, 1])
+
+        return self
+
+    def decision_function(self, x):
+        """
+        Returns the numpy array of the scores of every sample for every label
+        """
+        coef = np.vstack([ estimator.coef_ for estimator in self.estimators ])
+        intercept = np.hstack([ estimator.intercept_ for estimator in self.estimators ])
+
+        return np.asarray(x.dot(coef.T)) + intercept
+
+    def predict(self, x):
+        """
+        Returns the scipy.sparse CSR indicator matrix of the labels with a positive score
+        """
+        return sp.csr_matrix( (self.decision_function(x) > 0).astype(np.int_) )
+
+
+def split_chunks(chunks, test_every, test):
+    """
+    Yields the rows of each chunk held out for testing (one in every test_every rows of the
+    table) if test is True, otherwise the remaining rows
+    """
+    offset = 0
+
+    for chunk in chunks:
+        held_out = (np.arange(offset, offset + chunk.shape[0]) % test_every) == 0
+        offset += chunk.shape[0]
+
+        yield chunk[held_out == test]
+
+
+def main(question_info_data, tag_info_data, num_keywords, chunk_size, passes, test_every):
+
+    tag_info = read_table(tag_info_data, TAG_INFO_LITERALS)
+
+    order = np.argsort(-tag_info['count'].values, kind='mergesort')[:num_keywords]
+    bfe = BaselineFeatureExtractor(pd.DataFrame({'keyword' : tag_info['keyword'].values[order]}), sparse=True)
+
+    clf = MultiLabelSGD(bfe.num_keywords)
+    columns = ['keywords_in_text', 'keywords']
+
+    print 'Training on %s in chunks of %d questions with %d keywords...\n' % (question_info_data, chunk_size, bfe.num_keywords)
+
+    t0 = time()
+    num_train = 0
+    zero_count = 0
+
+    for i in range(passes):
+        chunks = split_chunks(iter_table_chunks(question_info_data, chunk_size, columns), test_every, test=False)
+
+        for x_block, y_block, block_zero_count, feat_time in bfe.iter_blocks(chunks):
+            if x_block.shape[0]:
+                clf.partial_fit(x_block, y_block)
+            if i == 0:
+                num_train += x_block.shape[0]
+                zero_count += block_zero_count
+
+        print 'Pass %d done. Time: %f' % (i+1, time()-t0)
+
+    t1 = time()
+
+    scores = LabelTallies(bfe.num_keywords)
+    chunks = split_chunks(iter_table_chunks(question_info_data, chunk_size, columns), test_every, test=True)
+
+    for x_block, y_block, block_zero_count, feat_time in bfe.iter_blocks(chunks):
+        if x_block.shape[0]:
+            scores.update(y_block, clf.predict(x_block))
+
+    t2 = time()
+
+    print '\nTrained on %d questions (%d without keywords skipped), tested on %d' % (num_train, zero_count, scores.num_samples)
+    print 'Training time: %f   Evaluation time: %f' % (t1-t0, t2-t1)
+    print 'Peak memory: %d MB' % (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024)
+    print pd.Series(scores.metrics())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train a keyword classifier incrementally over a question table read in chunks.')
+    parser.add_argument('--question-info', dest='question_info_data', default='../data/question_info_data_2')
+    parser.add_argument('--tag-info', dest='tag_info_data', default='../data/tag_info_data')
+    parser.add_argument('--num-keywords', type=int, default=200)
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    parser.add_argument('--passes', type=int, default=1)
+    parser.add_argument('--test-every', type=int, default=5, help='hold out one in every TEST_EVERY questions for testing')
+    args = parser.parse_args()
+    main(args.question_info_data, args.tag_info_data, args.num_keywords, args.chunk_size, args.passes, args.test_every)
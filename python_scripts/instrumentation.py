@@ -0,0 +1,184 @@
+"""
+This module is the common instrumentation layer of the pipeline scripts. Code is timed in named
+sections that record wall time, CPU time, call counts and the number of items (files, questions,
+samples) processed, and a run can optionally be profiled with cProfile. The results are written
+as a JSON report so they can be compared across library updates.
+
+Sample usage:
+
+    from instrumentation import instrumentation
+
+    with instrumentation.section('scan') as scan:
+        paths = list(iter_question_files(base_directory))
+        scan.items += len(paths)
+
+    instrumentation.save('../data/report.json')
+
+The report has one entry per section with its totals and throughput (items per second of
+wall time), the peak resident memory of the process and of its children, and the hottest
+functions of the profile when profiling is enabled. Sections only record the time spent in
+the process that runs them, so work done in the processes of a multiprocessing.Pool is only
+counted by the section around the map.
+"""
+from __future__ import division
+import cProfile
+import json
+import os
+import platform
+import pstats
+import resource
+import sys
+from contextlib import contextmanager
+from time import time
+
+
+class Section():
+    """
+    This class holds the running totals of one named section
+    """
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.items = 0
+
+    def report(self):
+        """
+        Returns python dict of the totals of the section
+        """
+        return {'calls' : self.calls, \
+                'wall_time' : self.wall_time, \
+                'cpu_time' : self.cpu_time, \
+                'items' : self.items, \
+                'items_per_sec' : self.items / self.wall_time if self.wall_time > 0 else None}
+
+
+def cpu_time():
+    """
+    Returns the user plus system CPU time of the process in seconds
+    """
+    times = os.times()
+    return times[0] + times[1]
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """
+    Returns the peak resident memory in MB of the process, or of its terminated children
+    """
+    # ru_maxrss is in kilobytes on Linux and in bytes on OS X
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(who).ru_maxrss / scale
+
+
+class Instrumentation():
+    """
+    This class collects the sections of a run and writes them to a JSON report.
+
+    Sample usage:
+
+        instrumentation = Instrumentation()
+        instrumentation.enable_profiling()
+
+        with instrumentation.section('fit'):
+            clf.fit(x_train, y_train)
+
+        instrumentation.save('report.json')
+
+    The scripts share the module level instance instrumentation.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Drops the sections and profile recorded so far, e.g. in a forked process
+        """
+        self.sections = {}
+        self.order = []
+        self.profiler = None
+        self.started = time()
+
+    @contextmanager
+    def section(self, name, items=0):
+        """
+        Context manager timing one call of the section name. It yields the Section, whose
+        items the caller can increase by the number of items processed.
+        """
+        if name not in self.sections:
+            self.sections[name] = Section(name)
+            self.order.append(name)
+
+        record = self.sections[name]
+        record.items += items
+
+        t0 = time()
+        c0 = cpu_time()
+        try:
+            yield record
+        finally:
+            record.calls += 1
+            record.wall_time += time() - t0
+            record.cpu_time += cpu_time() - c0
+
+    def enable_profiling(self):
+        """
+        Profiles everything run from now on with cProfile
+        """
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def hot_paths(self, n=25):
+        """
+        Returns python list of the n functions with the highest cumulative time in the profile
+        """
+        if self.profiler is None:
+            return []
+
+        self.profiler.disable()
+        stats = pstats.Stats(self.profiler)
+        self.profiler.enable()
+
+        functions = []
+        for (file_name, line, function), (primitive_calls, calls, total_time, cumulative_time, callers) in stats.stats.items():
+            functions.append({'function' : '%s:%d(%s)' % (file_name, line, function), \
+                              'calls' : calls, \
+                              'total_time' : total_time, \
+                              'cumulative_time' : cumulative_time})
+
+        functions.sort(key=lambda f: f['cumulative_time'], reverse=True)
+
+        return functions[:n]
+
+    def report(self):
+        """
+        Returns python dict of the report of the run so far
+        """
+        import numpy
+        import pandas
+        import scipy
+        import sklearn
+
+        return {'command' : ' '.join(sys.argv), \
+                'started' : self.started, \
+                'wall_time' : time() - self.started, \
+                'python' : platform.python_version(), \
+                'libraries' : {'numpy' : numpy.__version__, 'pandas' : pandas.__version__, \
+                               'scipy' : scipy.__version__, 'sklearn' : sklearn.__version__}, \
+                'sections' : [ dict(self.sections[name].report(), name=name) for name in self.order ], \
+                'peak_rss_mb' : peak_rss_mb(), \
+                'children_peak_rss_mb' : peak_rss_mb(resource.RUSAGE_CHILDREN), \
+                'hot_paths' : self.hot_paths()}
+
+    def save(self, path):
+        """
+        Writes the report to path as JSON
+        """
+        report_file_handle = open(path, mode='w')
+        json.dump(self.report(), report_file_handle, indent=2)
+        report_file_handle.close()
+
+
+# Shared by the pipeline scripts
+instrumentation = Instrumentation()
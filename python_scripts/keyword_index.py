@@ -0,0 +1,186 @@
+"""
+This module contains the keyword index of the tagged questions: which questions carry which keywords.
+
+Instead of a python list of full question file paths per keyword, every path is interned once
+into an integer question id, and the keyword -> question incidence is stored as a CSR matrix
+together with its question -> keyword transpose. Both are persisted as plain arrays in one .npz
+file, so questions like "which questions have keyword k", "how many questions have keyword k"
+or "which keywords occur together with k" are answered by array slices whose cost is
+proportional to the size of the answer, without parsing any repr'd lists.
+
+Sample usage:
+
+    index = KeywordIndex.load('../data/keyword_index.npz')
+
+    index.paths_with('derivative')         # file paths of the questions tagged derivative
+    index.count('derivative')              # number of questions tagged derivative
+    index.co_occurring('derivative', 10)   # [(keyword, number of shared questions), ...]
+    index.keywords_of(path)                # keywords of the question at path
+"""
+import numpy as np
+import scipy.sparse as sp
+
+from table_store import _decode_strings, _encode_strings
+
+
+class KeywordIndex():
+    """
+    This class holds the interned question paths, the keywords, and the keyword x question
+    incidence matrix of the tagged questions with its transpose.
+    """
+    def __init__(self, paths, keywords, keyword_questions, question_keywords=None):
+        """
+        @params
+            - paths: python list of question file paths, the path of question id i is paths[i]
+            - keywords: python list of keywords, the keyword of keyword id k is keywords[k]
+            - keyword_questions: scipy.sparse CSR matrix of shape (len(keywords), len(paths))
+                                 with a 1 where a question is tagged with a keyword
+            - question_keywords: its transpose as a CSR matrix, computed if not given
+        """
+        self.paths = paths
+        self.keywords = keywords
+        self.keyword_questions = keyword_questions
+        self.question_keywords = question_keywords if question_keywords is not None else keyword_questions.T.tocsr()
+
+        self.keyword_ids = dict( (keyword, k) for k, keyword in reversed(list(enumerate(keywords))) )
+        self.path_ids = None
+
+    @classmethod
+    def from_questions(cls, paths, keyword_lists, keywords=None):
+        """
+        Builds the index of questions given by their paths and lists of keywords
+        @params
+            - keywords: optional python list of keywords fixing the keyword ids, e.g. the rows of
+                        tag_info. By default keywords are numbered in order of first appearance.
+                        Keywords missing from the list are added after it.
+        """
+        keywords = list(keywords) if keywords is not None else []
+        vocabulary = dict( (keyword, k) for k, keyword in reversed(list(enumerate(keywords))) )
+
+        keyword_ids = []
+        indptr = [0]
+
+        for question_keywords in keyword_lists:
+            for keyword in question_keywords:
+                k = vocabulary.get(keyword)
+                if k is None:
+                    k = vocabulary[keyword] = len(keywords)
+                    keywords.append(keyword)
+                keyword_ids.append(k)
+            indptr.append( len(keyword_ids) )
+
+        question_keywords = sp.csr_matrix( (np.ones(len(keyword_ids), dtype=np.int8), np.array(keyword_ids, dtype=np.int32), \
+                                            np.array(indptr, dtype=np.int64)), shape=(len(indptr) - 1, len(keywords)) )
+
+        # A keyword listed twice for the same question counts once
+        question_keywords.sum_duplicates()
+        question_keywords.data[:] = 1
+
+        return cls(list(paths), keywords, question_keywords.T.tocsr(), question_keywords)
+
+    def save(self, path):
+        """
+        Persists the index to path as an .npz file of arrays
+        """
+        arrays = {'incidence_indices' : self.keyword_questions.indices.astype(np.int32), \
+                  'incidence_indptr' : self.keyword_questions.indptr.astype(np.int64), \
+                  'transpose_indices' : self.question_keywords.indices.astype(np.int32), \
+                  'transpose_indptr' : self.question_keywords.indptr.astype(np.int64)}
+
+        _encode_strings(arrays, 'paths_', self.paths)
+        _encode_strings(arrays, 'keywords_', self.keywords)
+
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads an index persisted with save
+        """
+        arrays = np.load(path)
+
+        paths = _decode_strings(arrays, 'paths_')
+        keywords = _decode_strings(arrays, 'keywords_')
+
+        indices = arrays['incidence_indices']
+        keyword_questions = sp.csr_matrix( (np.ones(len(indices), dtype=np.int8), indices, arrays['incidence_indptr']), \
+                                           shape=(len(keywords), len(paths)) )
+        question_keywords = sp.csr_matrix( (np.ones(len(indices), dtype=np.int8), arrays['transpose_indices'], arrays['transpose_indptr']), \
+                                           shape=(len(paths), len(keywords)) )
+        arrays.close()
+
+        return cls(paths, keywords, keyword_questions, question_keywords)
+
+    def question_id(self, path):
+        """
+        Returns the question id of the question at path
+        """
+        if self.path_ids is None:
+            self.path_ids = dict( (question_path, i) for i, question_path in enumerate(self.paths) )
+
+        return self.path_ids[path]
+
+    def questions_with(self, keyword):
+        """
+        Returns the numpy array of the sorted ids of the questions tagged with keyword
+        """
+        k = self.keyword_ids[keyword]
+        return self.keyword_questions.indices[self.keyword_questions.indptr[k]:self.keyword_questions.indptr[k+1]]
+
+    def paths_with(self, keyword):
+        """
+        Returns python list of the paths of the questions tagged with keyword
+        """
+        return [ self.paths[i] for i in self.questions_with(keyword) ]
+
+    def count(self, keyword):
+        """
+        Returns the number of questions tagged with keyword
+        """
+        k = self.keyword_ids[keyword]
+        return int(self.keyword_questions.indptr[k+1] - self.keyword_questions.indptr[k])
+
+    def keyword_counts(self):
+        """
+        Returns the numpy array of the number of questions tagged with each keyword, in the order of self.keywords
+        """
+        return np.diff(self.keyword_questions.indptr)
+
+    def keywords_of(self, path):
+        """
+        Returns python list of the keywords of the question at path
+        """
+        i = self.question_id(path)
+        ids = self.question_keywords.indices[self.question_keywords.indptr[i]:self.question_keywords.indptr[i+1]]
+        return [ self.keywords[k] for k in ids ]
+
+    def co_occurring(self, keyword, n=None):
+        """
+        Returns python list of (keyword, number of shared questions) of the keywords tagging the
+        same questions as keyword, most shared first
+        @params
+            - n: optional maximum number of keywords returned
+        """
+        k = self.keyword_ids[keyword]
+        questions = self.questions_with(keyword)
+
+        # The keyword ids of all the questions of keyword, concatenated
+        starts = self.question_keywords.indptr[questions]
+        lengths = self.question_keywords.indptr[questions + 1] - starts
+        positions = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+        ids, shared = np.unique(self.question_keywords.indices[positions], return_counts=True)
+
+        keep = ids != k
+        ids, shared = ids[keep], shared[keep]
+
+        order = np.lexsort( (ids, -shared) )[:n]
+
+        return [ (self.keywords[ids[p]], int(shared[p])) for p in order ]
+
+    def co_occurrence_matrix(self):
+        """
+        Returns the scipy.sparse CSR matrix of shape (len(keywords), len(keywords)) of the number
+        of questions shared by every pair of keywords, with the keyword counts on the diagonal
+        """
+        incidence = self.keyword_questions.astype(np.int64)
+        return incidence.dot(incidence.T).tocsr()
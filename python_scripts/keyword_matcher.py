@@ -0,0 +1,76 @@
+"""
+This module contains a keyword matcher that compiles the keyword vocabulary once so that each
+question can be searched for keywords in time proportional to its own number of tokens.
+"""
+
+class KeywordMatcher():
+    """
+    This class finds the keywords of a vocabulary that appear within a question text.
+
+    A keyword made up of several words is found if each individual word is found within the
+    text, exactly as in find_keywords_in_text. Instead of testing every keyword against every
+    question, each keyword is filed in an inverted index under its rarest token (the anchor).
+    A question only has to look up its own tokens in the index and check the remaining tokens
+    of the few candidate keywords filed under them.
+
+    Sample usage:
+
+        matcher = KeywordMatcher(tag_info['keyword'].values)
+
+        keywords_found_in_text = matcher.match(question_text)
+    """
+    def __init__(self, keywords):
+        """
+        @params
+            - keywords: python list of keyword strings, in the order results should be returned
+        """
+        self.keywords = list(keywords)
+
+        keyword_tokens = [ set(keyword.split()) for keyword in self.keywords ]
+
+        # Number of keywords each token appears in, used to choose the anchor tokens
+        token_frequency = {}
+        for tokens in keyword_tokens:
+            for token in tokens:
+                token_frequency[token] = token_frequency.get(token, 0) + 1
+
+        # Keywords without any tokens are trivially contained in every question
+        self.always_matched = []
+        self.index = {}
+
+        for position, tokens in enumerate(keyword_tokens):
+            if not tokens:
+                self.always_matched.append(position)
+                continue
+
+            anchor = min(tokens, key=lambda token: (token_frequency[token], token))
+            rest = tuple(token for token in tokens if token != anchor)
+            self.index.setdefault(anchor, []).append( (position, rest) )
+
+    def match_positions(self, question_text):
+        """
+        Returns the sorted positions in self.keywords of all keywords found in the question text
+        @params
+            - question_text: python string of question text
+        """
+        question_tokens = set(question_text.split())
+
+        positions = list(self.always_matched)
+
+        for token in question_tokens:
+            if token in self.index:
+                for position, rest in self.index[token]:
+                    if all(t in question_tokens for t in rest):
+                        positions.append(position)
+
+        positions.sort()
+
+        return positions
+
+    def match(self, question_text):
+        """
+        Returns python list of the keywords found in the question text, in vocabulary order
+        @params
+            - question_text: python string of question text
+        """
+        return [ self.keywords[position] for position in self.match_positions(question_text) ]
@@ -0,0 +1,136 @@
+"""
+This module scores all the labels of a fitted OneVsRestClassifier with a single matrix product.
+
+OneVsRestClassifier.predict loops over its per-label estimators in python and only returns
+hard 0/1 labels. Here the coef_ and intercept_ of every per-label linear estimator are
+extracted once into one weight matrix, so the scores of a batch of samples for all labels are
+
+    scores = x * weights.T + intercept
+
+and the labels can be ranked by score, e.g. to always suggest the top k keywords of a
+question instead of leaving it without any.
+"""
+import numpy as np
+import scipy.sparse as sp
+
+
+class LabelScorer():
+    """
+    This class holds the weight matrix of a fitted linear OneVsRestClassifier.
+
+    Sample usage:
+
+        scorer = LabelScorer.from_classifier(clf, keywords)
+
+        y_predict = scorer.predict(x_test)          # same as clf.predict(x_test)
+        scorer.top_k(x_test, 5)                     # [[(keyword, score), ...], ...]
+        scorer.top_k(x_test, 5, threshold=scorer.threshold, min_k=1)
+    """
+    def __init__(self, weights, intercept, labels=None, threshold=0.0):
+        """
+        @params
+            - weights: numpy array or scipy.sparse matrix of shape (num_labels, num_features)
+            - intercept: numpy array of shape (num_labels,)
+            - labels: optional python list of the label names, e.g. the keywords
+            - threshold: score above which predict sets a label
+        """
+        self.weights = weights
+        self.weights_t = weights.T.tocsr() if sp.issparse(weights) else np.ascontiguousarray(weights.T)
+        self.intercept = intercept
+        self.labels = labels
+        self.threshold = threshold
+
+    @classmethod
+    def from_classifier(cls, classifier, labels=None, sparse=False):
+        """
+        Extracts the weights of a fitted OneVsRestClassifier of linear estimators such as
+        LinearSVC or SGDClassifier. Labels that were never or always present in the training
+        set, for which the classifier keeps a constant predictor, are never or always predicted
+        as in OneVsRestClassifier.predict.
+        @params
+            - sparse: if True, the weight matrix is stored as a scipy.sparse CSR matrix, which
+                      pays off when most weights are zero, e.g. with an l1 penalty
+        """
+        num_features = None
+        for estimator in classifier.estimators_:
+            if hasattr(estimator, 'coef_'):
+                num_features = np.asarray(estimator.coef_).shape[-1]
+                break
+
+        if num_features is None:
+            raise ValueError('the classifier has no linear estimator')
+
+        weights = np.zeros((len(classifier.estimators_), num_features))
+        intercept = np.zeros(len(classifier.estimators_))
+
+        for j, estimator in enumerate(classifier.estimators_):
+            if hasattr(estimator, 'coef_'):
+                coef = estimator.coef_
+                weights[j] = coef.toarray().ravel() if sp.issparse(coef) else np.ravel(coef)
+                intercept[j] = np.ravel(estimator.intercept_)[0]
+            else:
+                # Constant predictor of a label never or always seen in training
+                intercept[j] = 1.0 if np.ravel(estimator.y_)[0] else -np.inf
+
+        if sparse:
+            weights = sp.csr_matrix(weights)
+
+        # OneVsRestClassifier.predict thresholds the scores at 0.5 instead of 0 when its first
+        # estimator is a constant predictor, so predict does the same
+        threshold = 0.0 if hasattr(classifier.estimators_[0], 'coef_') else 0.5
+
+        return cls(weights, intercept, labels, threshold)
+
+    def decision_function(self, x):
+        """
+        Returns the numpy array of shape (num_samples, num_labels) of the scores of every label
+        """
+        scores = x.dot(self.weights_t)
+        if sp.issparse(scores):
+            scores = scores.toarray()
+
+        return np.asarray(scores) + self.intercept
+
+    def predict(self, x):
+        """
+        Returns the scipy.sparse CSR indicator matrix of the labels scoring above the threshold
+        """
+        return sp.csr_matrix( (self.decision_function(x) > self.threshold).astype(np.int_) )
+
+    def top_k(self, x, k, threshold=None, min_k=0):
+        """
+        Returns python list with the ranked (label, score) suggestions of every sample
+        @params
+            - k: maximum number of suggestions per sample
+            - threshold: if given, only labels scoring above threshold are suggested...
+            - min_k: ...except that the best min_k labels are always suggested
+        """
+        scores = self.decision_function(x)
+        num_labels = scores.shape[1]
+        k = min(k, num_labels)
+
+        if k == 0:
+            return [ [] for i in range(scores.shape[0]) ]
+
+        # The k best labels of each sample, then ranked by score
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < num_labels else \
+               np.tile(np.arange(num_labels), (scores.shape[0], 1))
+        best_scores = scores[np.arange(scores.shape[0])[:, None], best]
+
+        order = np.argsort(-best_scores, axis=1, kind='mergesort')
+        best = best[np.arange(scores.shape[0])[:, None], order]
+        best_scores = best_scores[np.arange(scores.shape[0])[:, None], order]
+
+        suggestions = []
+
+        for labels, label_scores in zip(best.tolist(), best_scores.tolist()):
+            ranked = []
+            for rank, (j, score) in enumerate(zip(labels, label_scores)):
+                if score == -np.inf:
+                    break
+                if threshold is not None and score <= threshold and rank >= min_k:
+                    break
+                ranked.append( (self.labels[j] if self.labels is not None else j, score) )
+            suggestions.append(ranked)
+
+        return suggestions
@@ -0,0 +1,177 @@
+"""
+This module counts the LaTeX tokens used by the questions of each keyword in one batch.
+
+The LaTeX expressions of all questions are tokenized in a single pass into integer token ids,
+giving a sparse questions x tokens count matrix. Together with the sparse questions x keywords
+indicator matrix, the keyword x token count matrix is then a single sparse matrix product
+
+    keyword_token_counts = questions_keywords.T * questions_tokens
+"""
+import numpy as np
+import scipy.sparse as sp
+
+LATEX_DELIMITERS = ["\\(", "\\)", "\\[", "\\]"]
+
+
+def latex_tokens(list_of_latex):
+    """
+    Given a list of LaTeX expressions, returns the python list of their tokens, with the
+    LaTeX delimiters and all backslashes and forward slashes removed as in
+    top_latex_by_keyword.tokenize_latex. Tokens left empty are dropped.
+    """
+    latex = ' '.join(list_of_latex)
+
+    for delimiter in LATEX_DELIMITERS:
+        latex = latex.replace(delimiter, '')
+
+    # Removing characters never joins two tokens, so this is the same as
+    # splitting first and removing them from every token
+    if isinstance(latex, unicode):
+        latex = latex.translate({ord('\\') : None, ord('/') : None})
+    else:
+        latex = latex.translate(None, '\\/')
+
+    return latex.split()
+
+
+def question_token_matrix(latex_lists, tokens=None):
+    """
+    Tokenizes the LaTeX expressions of all questions and returns a tuple (counts, tokens)
+    where counts is a scipy.sparse CSR matrix with counts[i, j] the number of times
+    tokens[j] appears in the LaTeX of question i.
+    @params
+        - latex_lists: python list of lists of LaTeX expressions, one per question
+        - tokens: optional list of tokens to count. By default the vocabulary is every token seen,
+                  in order of first appearance
+    """
+    if tokens is None:
+        vocabulary = {}
+        add_tokens = True
+    else:
+        vocabulary = dict( (token, j) for j, token in reversed(list(enumerate(tokens))) )
+        add_tokens = False
+
+    token_ids = []
+    indptr = [0]
+
+    for list_of_latex in latex_lists:
+        for token in latex_tokens(list_of_latex):
+            if add_tokens:
+                token_ids.append( vocabulary.setdefault(token, len(vocabulary)) )
+            elif token in vocabulary:
+                token_ids.append( vocabulary[token] )
+        indptr.append( len(token_ids) )
+
+    if tokens is None:
+        tokens = [None] * len(vocabulary)
+        for token, j in vocabulary.iteritems():
+            tokens[j] = token
+
+    counts = sp.csr_matrix( (np.ones(len(token_ids), dtype=np.int64), np.array(token_ids, dtype=np.intp), np.array(indptr, dtype=np.intp)), \
+                            shape=(len(latex_lists), len(tokens)) )
+    counts.sum_duplicates()
+
+    return counts, tokens
+
+
+def question_keyword_matrix(keyword_lists):
+    """
+    Returns a tuple (indicator, keywords) where indicator is a scipy.sparse CSR matrix with
+    indicator[i, k] == 1 if question i has keywords[k]. Keywords are in order of first appearance.
+    @params
+        - keyword_lists: python list of lists of keywords, one per question
+    """
+    vocabulary = {}
+    keyword_ids = []
+    indptr = [0]
+
+    for keywords in keyword_lists:
+        for keyword in keywords:
+            k = vocabulary.setdefault(keyword, len(vocabulary))
+            # Skip keywords listed twice for the same question
+            if k not in keyword_ids[indptr[-1]:]:
+                keyword_ids.append(k)
+        indptr.append( len(keyword_ids) )
+
+    keywords = [None] * len(vocabulary)
+    for keyword, k in vocabulary.iteritems():
+        keywords[k] = keyword
+
+    indicator = sp.csr_matrix( (np.ones(len(keyword_ids), dtype=np.int64), np.array(keyword_ids, dtype=np.intp), np.array(indptr, dtype=np.intp)), \
+                               shape=(len(keyword_lists), len(keywords)) )
+
+    return indicator, keywords
+
+
+class KeywordLatexCounts():
+    """
+    This class holds the keyword x LaTeX token count matrix of a set of questions.
+
+    Sample usage:
+
+        klc = KeywordLatexCounts.from_questions(question_info['keywords'], question_info['latex_expressions'])
+
+        klc.top_n('derivative', 10)      # [(token, count), ...] most frequent first
+        klc.token_counts('derivative')   # {token: count}
+    """
+    def __init__(self, counts, keywords, tokens):
+        """
+        @params
+            - counts: scipy.sparse CSR matrix of shape (len(keywords), len(tokens))
+            - keywords: python list of keyword strings
+            - tokens: python list of LaTeX token strings
+        """
+        self.counts = counts
+        self.keywords = keywords
+        self.tokens = tokens
+        self.keyword_index = dict( (keyword, k) for k, keyword in enumerate(keywords) )
+
+    @classmethod
+    def from_questions(cls, keyword_lists, latex_lists):
+        """
+        Builds the counts from the keywords and LaTeX expressions of each question
+        """
+        question_keywords, keywords = question_keyword_matrix(keyword_lists)
+        question_tokens, tokens = question_token_matrix(latex_lists)
+
+        counts = (question_keywords.T.tocsr() * question_tokens).tocsr()
+
+        return cls(counts, keywords, tokens)
+
+    def _row(self, keyword):
+        k = self.keyword_index[keyword]
+        start, end = self.counts.indptr[k], self.counts.indptr[k+1]
+        return self.counts.indices[start:end], self.counts.data[start:end]
+
+    def token_counts(self, keyword):
+        """
+        Returns python dict of LaTeX token to the number of times it appears in questions with keyword
+        """
+        indices, data = self._row(keyword)
+        return dict( (self.tokens[j], count) for j, count in zip(indices.tolist(), data.tolist()) )
+
+    def top_n(self, keyword, n):
+        """
+        Returns python list of the n (token, count) pairs most frequent in questions with keyword
+        """
+        indices, data = self._row(keyword)
+        order = np.argsort(-data, kind='mergesort')[:n]
+        return [ (self.tokens[j], count) for j, count in zip(indices[order].tolist(), data[order].tolist()) ]
+
+    def save(self, path):
+        """
+        Persists the count matrix and its vocabularies to an .npz file
+        """
+        np.savez_compressed(path, data=self.counts.data, indices=self.counts.indices, indptr=self.counts.indptr, \
+                            shape=np.array(self.counts.shape), keywords=np.array(self.keywords), tokens=np.array(self.tokens))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads counts persisted with save
+        """
+        arrays = np.load(path)
+        counts = sp.csr_matrix( (arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(arrays['shape']) )
+        klc = cls(counts, arrays['keywords'].tolist(), arrays['tokens'].tolist())
+        arrays.close()
+        return klc
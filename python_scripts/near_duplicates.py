@@ -0,0 +1,236 @@
+"""
+This script clusters near-duplicate questions, so that training can run on one representative
+per cluster and the train and test split can keep every cluster on one side.
+
+The library holds many near-identical problems, such as the sibling files of one problem set
+that only differ in a number or a word. Comparing every pair of questions takes quadratic time,
+so each question is reduced to a MinHash signature of its shingles, the runs of shingle_size
+consecutive tokens of its question text and LaTeX tokens, with the numbers replaced by '#'. Two
+questions agree on each MinHash with probability equal to the Jaccard similarity of their
+shingle sets. The signatures are cut into num_bands bands, and questions sharing all hashes of
+a band are candidates, which are joined into one cluster if the share of their agreeing hashes
+is at least threshold. Every question is hashed and bucketed once per band, so the time is
+roughly linear in the number of questions.
+
+The clusters are written as the table question_clusters, in the row order of
+question_info_data_2, with the cluster_id of every question and whether it is the canonical
+question of its cluster, the first one in the table.
+
+    python near_duplicates.py --data-dir ../data --threshold 0.8
+"""
+from __future__ import division
+import argparse
+import os
+import re
+import zlib
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumentation
+from latex_token_counts import latex_tokens
+from table_store import read_table, write_table
+
+NUMBER = re.compile(r'\d+(\.\d+)?')
+
+
+def question_shingles(question_text, latex_expressions, shingle_size=4):
+    """
+    Returns the numpy array of the distinct hashes of the shingles of a question: the runs of
+    shingle_size consecutive tokens of its lowercased question text followed by its LaTeX tokens,
+    with every number replaced by '#'. Questions with fewer tokens have their whole token list
+    as their only shingle.
+    """
+    tokens = NUMBER.sub('#', question_text.lower()).split() + \
+             [ NUMBER.sub('#', token) for token in latex_tokens(latex_expressions) ]
+    tokens = [ token.encode('utf-8') if isinstance(token, unicode) else token for token in tokens ]
+
+    if not tokens:
+        return np.zeros(0, dtype=np.uint64)
+
+    shingles = [ ' '.join(tokens[i:i + shingle_size]) for i in range(max(len(tokens) - shingle_size + 1, 1)) ]
+
+    return np.unique( np.array(map(zlib.crc32, shingles), dtype=np.int64) & 0xffffffff ).astype(np.uint64)
+
+
+class MinHasher():
+    """
+    This class computes the MinHash signatures of sets of 32 bit shingle hashes, with num_hashes
+    multiply-shift hash functions drawn from seed.
+
+    Sample usage:
+
+        hasher = MinHasher(num_hashes=128)
+        signatures = hasher.signatures([ question_shingles(text, latex) for text, latex in questions ])
+    """
+    def __init__(self, num_hashes=128, seed=0):
+        """
+        @params
+            - num_hashes: the number of hash functions, the length of the signatures
+            - seed: seed of the hash functions, signatures are only comparable for the same seed
+        """
+        self.num_hashes = num_hashes
+        self.seed = seed
+
+        rng = np.random.RandomState(seed)
+        # Odd multipliers, the high 32 bits of (a * x + b) mod 2 ** 64 are the hash of x
+        self.a = rng.randint(0, 1 << 62, size=num_hashes).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.randint(0, 1 << 62, size=num_hashes).astype(np.uint64)
+
+    def signatures(self, shingle_sets, batch_size=250):
+        """
+        Returns the numpy array of shape (number of sets, num_hashes) of the MinHash signatures.
+        The signature of an empty set is all 0xffffffff.
+        @params
+            - shingle_sets: python list of numpy arrays of shingle hashes
+            - batch_size: number of sets hashed at once, bounding the memory to about
+                          batch_size * shingles per set * num_hashes * 8 bytes
+        """
+        signatures = np.empty( (len(shingle_sets), self.num_hashes), dtype=np.uint32 )
+        signatures.fill(0xffffffff)
+
+        for first in range(0, len(shingle_sets), batch_size):
+            batch = shingle_sets[first:first + batch_size]
+            lengths = np.array([ len(shingles) for shingles in batch ])
+            non_empty = np.flatnonzero(lengths)
+            if len(non_empty) == 0:
+                continue
+
+            shingles = np.concatenate([ batch[i] for i in non_empty ]).astype(np.uint64)
+            hashes = (np.multiply.outer(shingles, self.a) + self.b) >> np.uint64(32)
+
+            starts = np.concatenate( ([0], np.cumsum(lengths[non_empty])[:-1]) )
+            signatures[first + non_empty] = np.minimum.reduceat(hashes, starts, axis=0)
+
+        return signatures
+
+
+class UnionFind():
+    """
+    This class holds disjoint sets of the integers 0 .. n - 1, each named after its smallest member.
+    """
+    def __init__(self, n):
+        self.parent = range(n)
+
+    def find(self, i):
+        """
+        Returns the smallest member of the set of i
+        """
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        """
+        Joins the sets of i and j
+        """
+        i = self.find(i)
+        j = self.find(j)
+        if i < j:
+            self.parent[j] = i
+        elif j < i:
+            self.parent[i] = j
+
+    def labels(self):
+        """
+        Returns the numpy array of the set of every member, numbered 0, 1, ... in order of their smallest member
+        """
+        roots = np.array([ self.find(i) for i in range(len(self.parent)) ], dtype=np.int64)
+        return np.unique(roots, return_inverse=True)[1]
+
+
+def cluster_signatures(signatures, num_bands=16, threshold=0.8):
+    """
+    Returns the numpy array of the cluster id of every signature. Signatures sharing all hashes
+    of a band are joined if they agree on at least threshold of their hashes. Each band is
+    bucketed with one sort, and every member of a bucket is compared with the first member only.
+    @params
+        - signatures: numpy array of MinHash signatures as returned by MinHasher.signatures
+        - num_bands: number of bands, which must divide the number of hashes
+    """
+    num_signatures, num_hashes = signatures.shape
+    if num_hashes % num_bands:
+        raise ValueError('num_bands %d does not divide the %d hashes' % (num_bands, num_hashes))
+    rows = num_hashes // num_bands
+
+    clusters = UnionFind(num_signatures)
+
+    # Questions without any token are left alone rather than all joined
+    hashed = np.flatnonzero( (signatures != 0xffffffff).any(axis=1) )
+
+    for band in range(num_bands):
+        keys = np.ascontiguousarray(signatures[hashed, band * rows:(band + 1) * rows]).view( np.dtype((np.void, 4 * rows)) ).ravel()
+        buckets = np.unique(keys, return_inverse=True)[1]
+
+        order = np.argsort(buckets, kind='mergesort')
+        sorted_buckets = buckets[order]
+        firsts = order[ np.searchsorted(sorted_buckets, sorted_buckets) ]
+
+        members = hashed[order[order != firsts]]
+        heads = hashed[firsts[order != firsts]]
+        if len(members) == 0:
+            continue
+
+        similar = (signatures[members] == signatures[heads]).mean(axis=1) >= threshold
+
+        for i, j in zip(heads[similar], members[similar]):
+            clusters.union(i, j)
+
+    return clusters.labels()
+
+
+def near_duplicate_clusters(question_texts, latex_expressions, shingle_size=4, num_hashes=128, num_bands=16, threshold=0.8, seed=0):
+    """
+    Returns the tuple (cluster_ids, canonical) of numpy arrays of the cluster id of every question
+    and whether it is the first question of its cluster
+    """
+    shingle_sets = [ question_shingles(question_text, latex, shingle_size) \
+                     for question_text, latex in zip(question_texts, latex_expressions) ]
+
+    signatures = MinHasher(num_hashes, seed).signatures(shingle_sets)
+    cluster_ids = cluster_signatures(signatures, num_bands, threshold)
+
+    canonical = np.zeros(len(cluster_ids), dtype=bool)
+    canonical[ np.unique(cluster_ids, return_index=True)[1] ] = True
+
+    return cluster_ids, canonical
+
+
+def main(data_directory='../data', shingle_size=4, num_hashes=128, num_bands=16, threshold=0.8, seed=0):
+
+    question_info = read_table(os.path.join(data_directory, 'question_info_data_2'))
+
+    print 'Clustering %d questions with %d hashes in %d bands at similarity %f...\n' % \
+          (question_info.shape[0], num_hashes, num_bands, threshold)
+
+    with instrumentation.section('dedup', items=question_info.shape[0]):
+        cluster_ids, canonical = near_duplicate_clusters(question_info['question_text'].values, \
+                                                         question_info['latex_expressions'].values, \
+                                                         shingle_size, num_hashes, num_bands, threshold, seed)
+
+    sizes = np.bincount(cluster_ids)
+
+    print 'Clusters: %d   with near duplicates: %d   largest: %d' % (len(sizes), np.sum(sizes > 1), sizes.max() if len(sizes) else 0)
+    print 'Questions: %d   canonical: %d   near duplicates: %d\n' % (len(cluster_ids), canonical.sum(), len(cluster_ids) - canonical.sum())
+
+    clusters_df = pd.DataFrame({'question_file_path' : question_info['question_file_path'].values, \
+                                'cluster_id' : cluster_ids, \
+                                'canonical' : canonical}, \
+                               columns=['question_file_path', 'cluster_id', 'canonical'])
+
+    write_table(clusters_df, os.path.join(data_directory, 'question_clusters'))
+
+    print 'Clusters persisted to file: %s.npz' % os.path.join(data_directory, 'question_clusters')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cluster the near-duplicate questions.')
+    parser.add_argument('--data-dir', dest='data_directory', default='../data')
+    parser.add_argument('--shingle-size', type=int, default=4, help='number of consecutive tokens of a shingle')
+    parser.add_argument('--hashes', dest='num_hashes', type=int, default=128, help='length of the MinHash signatures')
+    parser.add_argument('--bands', dest='num_bands', type=int, default=16, help='number of bands of the signatures, must divide --hashes')
+    parser.add_argument('--threshold', type=float, default=0.8, help='estimated Jaccard similarity above which questions are joined')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    main(args.data_directory, args.shingle_size, args.num_hashes, args.num_bands, args.threshold, args.seed)
@@ -0,0 +1,280 @@
+"""
+This module contains a nearest neighbor tagger, which tags a question with the keywords of the
+most similar tagged questions instead of training a classifier per keyword.
+
+Questions are represented by the same keyword and LaTeX token indicators as the TaggingModel,
+weighted by inverse document frequency and normalized to unit length, so the similarity of two
+questions is the cosine of their feature vectors. Comparing a question with every tagged question
+costs time linear in the size of the library, so the tagged questions are indexed by random
+hyperplane signatures (SimHash): each of num_tables tables files every question under the signs
+of its projections on bits_per_table random hyperplanes. Two questions at an angle theta share a
+bucket of a table with probability (1 - theta / pi) ** bits_per_table, so a query is only compared
+with the questions of its own buckets, which are found by binary search in the sorted signatures.
+
+    python benchmark_neighbor_tagger.py --data-dir ../data
+"""
+from __future__ import division
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from baseline_feature_extractor import BaselineFeatureExtractor
+from keyword_matcher import KeywordMatcher
+from latex_token_counts import question_token_matrix
+from pg_parser import PGParser
+
+
+def normalize_rows(x):
+    """
+    Returns the scipy.sparse CSR matrix x with every non zero row scaled to unit length
+    """
+    x = sp.csr_matrix(x, dtype=np.float64)
+    norms = np.sqrt( np.bincount(np.repeat(np.arange(x.shape[0]), np.diff(x.indptr)), weights=x.data ** 2, \
+                                 minlength=x.shape[0]) )
+    norms[norms == 0] = 1
+    return sp.diags(1 / norms, 0).dot(x).tocsr()
+
+
+class SignatureIndex():
+    """
+    This class indexes unit length sparse vectors by random hyperplane signatures to find their
+    approximate nearest neighbors by cosine similarity.
+
+    Sample usage:
+
+        index = SignatureIndex(x.shape[1], num_tables=16, bits_per_table=10)
+        index.build(x)
+
+        neighbors = index.neighbor_matrix(x_new, 10)   # neighbors[i, j] = similarity of x_new[i] and x[j]
+    """
+    def __init__(self, num_features, num_tables=16, bits_per_table=10, seed=0):
+        """
+        @params
+            - num_tables: number of hash tables. More tables find more of the true neighbors
+            - bits_per_table: number of hyperplanes of each table. More bits make smaller buckets
+        """
+        if bits_per_table > 62:
+            raise ValueError('bits_per_table must be at most 62, got %d' % bits_per_table)
+
+        rng = np.random.RandomState(seed)
+
+        self.num_tables = num_tables
+        self.bits_per_table = bits_per_table
+        self.hyperplanes = rng.randn(num_features, num_tables * bits_per_table)
+        self.bit_values = np.left_shift(1, np.arange(bits_per_table, dtype=np.int64))
+
+    def signatures(self, x):
+        """
+        Returns the numpy array of shape (num_samples, num_tables) of the bucket of each sample in each table
+        """
+        projections = np.asarray( x.dot(self.hyperplanes) )
+        bits = (projections > 0).reshape(x.shape[0], self.num_tables, self.bits_per_table)
+        return bits.astype(np.int64).dot(self.bit_values)
+
+    def build(self, x):
+        """
+        Indexes the rows of the scipy.sparse matrix x
+        """
+        self.x = sp.csr_matrix(x)
+        signatures = self.signatures(self.x)
+
+        # For each table, the samples ordered by bucket and the sorted buckets
+        self.order = np.argsort(signatures, axis=0, kind='mergesort').T.copy()
+        self.buckets = np.vstack([ signatures[self.order[t], t] for t in range(self.num_tables) ])
+
+    def candidates(self, x):
+        """
+        Returns the tuple (queries, candidates) of numpy arrays of all distinct pairs of a row of x
+        and an indexed sample sharing one of its buckets
+        """
+        signatures = self.signatures(x)
+        num_samples = self.x.shape[0]
+
+        pairs = []
+        for t in range(self.num_tables):
+            start = np.searchsorted(self.buckets[t], signatures[:, t], side='left')
+            end = np.searchsorted(self.buckets[t], signatures[:, t], side='right')
+            lengths = end - start
+
+            # Positions start[i]..end[i] of every query i, concatenated
+            offsets = np.cumsum(lengths) - lengths
+            positions = np.repeat(start - offsets, lengths) + np.arange(lengths.sum())
+            queries = np.repeat(np.arange(x.shape[0], dtype=np.int64), lengths)
+
+            pairs.append( queries * num_samples + self.order[t][positions] )
+
+        pairs = np.unique( np.concatenate(pairs) )
+
+        return pairs // num_samples, pairs % num_samples
+
+    def neighbor_matrix(self, x, k, batch_size=1000):
+        """
+        Returns the scipy.sparse CSR matrix of shape (x.shape[0], number of indexed samples) holding
+        the positive cosine similarity of each row of x with its k most similar indexed samples
+        among the candidates sharing one of its buckets
+        @params
+            - batch_size: number of rows of x compared with their candidates at once
+        """
+        x = sp.csr_matrix(x)
+        blocks = []
+
+        for first in range(0, x.shape[0], batch_size):
+            block = x[first:first + batch_size]
+            queries, candidates = self.candidates(block)
+
+            similarities = np.asarray( block[queries].multiply(self.x[candidates]).sum(axis=1) ).ravel()
+            positive = similarities > 0
+            queries, candidates, similarities = queries[positive], candidates[positive], similarities[positive]
+
+            # The k most similar candidates of each query
+            order = np.lexsort( (-similarities, queries) )
+            queries, candidates, similarities = queries[order], candidates[order], similarities[order]
+
+            counts = np.bincount(queries, minlength=block.shape[0])
+            rank = np.arange(len(queries)) - np.repeat(np.cumsum(counts) - counts, counts)
+            nearest = rank < k
+
+            blocks.append( sp.csr_matrix( (similarities[nearest], (queries[nearest], candidates[nearest])), \
+                                          shape=(block.shape[0], self.x.shape[0]) ) )
+
+        if not blocks:
+            return sp.csr_matrix( (0, self.x.shape[0]) )
+
+        return sp.vstack(blocks).tocsr()
+
+
+class NeighborTagger():
+    """
+    This class tags WebWorK questions with the keywords carried by at least vote_threshold of
+    the similarity of their num_neighbors nearest tagged questions.
+
+    Sample usage:
+
+        tagger = NeighborTagger(keywords, latex_tokens, num_neighbors=10)
+        tagger.fit(train['question_text'], train['latex_expressions'], train['keywords'])
+
+        tagger.predict(question_texts, latex_expressions)       # CSR keyword label matrix
+        tagger.suggest(question_texts, latex_expressions, 5)    # [[(keyword, vote share), ...], ...]
+        tagger.tag_pg([open(path).read() for path in paths])    # [[keyword, ...], ...]
+    """
+    def __init__(self, keywords, latex_tokens, num_neighbors=10, vote_threshold=0.5, num_tables=16, bits_per_table=10, seed=0):
+        """
+        @params
+            - keywords: python list of the keywords used as features and labels
+            - latex_tokens: python list of the LaTeX tokens used as features
+            - num_neighbors: number of tagged questions voting for the keywords of a question
+            - vote_threshold: share of the similarity of the neighbors a keyword needs to be predicted
+        """
+        self.keywords = keywords
+        self.latex_tokens = latex_tokens
+        self.num_neighbors = num_neighbors
+        self.vote_threshold = vote_threshold
+        self.num_tables = num_tables
+        self.bits_per_table = bits_per_table
+        self.seed = seed
+
+        self.feature_extractor = BaselineFeatureExtractor(pd.DataFrame({'keyword' : keywords}), sparse=True)
+        self.keyword_matcher = KeywordMatcher(keywords)
+        self.parser = PGParser()
+
+        self.idf = None
+        self.index = None
+        self.labels = None
+
+    def indicators(self, question_texts, latex_expressions):
+        """
+        Returns the scipy.sparse CSR matrix of the keyword indicators followed by the LaTeX
+        token indicators of a batch of questions, as in TaggingModel.features
+        """
+        keywords_in_text = [ self.keyword_matcher.match(question_text) for question_text in question_texts ]
+        keyword_features = self.feature_extractor.encode(keywords_in_text)
+
+        latex_features, _ = question_token_matrix(latex_expressions, self.latex_tokens)
+        latex_features.data[:] = 1
+
+        return sp.hstack([keyword_features, latex_features]).tocsr()
+
+    def features(self, question_texts, latex_expressions):
+        """
+        Returns the scipy.sparse CSR matrix of the unit length, idf weighted features of a batch of questions
+        """
+        return normalize_rows( self.indicators(question_texts, latex_expressions).dot(sp.diags(self.idf, 0)) )
+
+    def fit(self, question_texts, latex_expressions, keyword_lists):
+        """
+        Indexes the tagged questions that have any features and any of the keywords
+        @params
+            - keyword_lists: python list of the lists of keywords each question is tagged with
+        """
+        x = self.indicators(question_texts, latex_expressions)
+        y = self.feature_extractor.encode(keyword_lists)
+
+        indexed = np.flatnonzero( (np.diff(x.indptr) > 0) & (np.diff(y.indptr) > 0) )
+        x = x[indexed]
+
+        # Smoothed inverse document frequency, as in scikit-learn's TfidfTransformer
+        document_frequency = np.bincount(x.indices, minlength=x.shape[1])
+        self.idf = np.log( (1 + x.shape[0]) / (1 + document_frequency) ) + 1
+
+        self.index = SignatureIndex(x.shape[1], self.num_tables, self.bits_per_table, self.seed)
+        self.index.build( normalize_rows(x.dot(sp.diags(self.idf, 0))) )
+
+        self.labels = sp.csr_matrix(y[indexed], dtype=np.float64)
+
+        return self
+
+    def scores(self, question_texts, latex_expressions):
+        """
+        Returns the scipy.sparse CSR matrix of the share of the similarity of the neighbors of
+        each question that votes for each keyword
+        """
+        neighbors = self.index.neighbor_matrix(self.features(question_texts, latex_expressions), self.num_neighbors)
+
+        total = np.asarray( neighbors.sum(axis=1) ).ravel()
+        total[total == 0] = 1
+
+        return sp.diags(1 / total, 0).dot( neighbors.dot(self.labels) ).tocsr()
+
+    def predict(self, question_texts, latex_expressions):
+        """
+        Returns the scipy.sparse CSR matrix of predicted keyword labels for a batch of questions
+        """
+        scores = self.scores(question_texts, latex_expressions)
+        # Shares equal to the threshold, such as a 1 of 2 tie, are predicted despite rounding
+        scores.data = (scores.data >= self.vote_threshold - 1e-9).astype(np.int_)
+        scores.eliminate_zeros()
+        scores.sort_indices()
+        return scores
+
+    def suggest(self, question_texts, latex_expressions, k):
+        """
+        Returns python list of the up to k keywords of each question with the highest vote
+        share, ranked, as (keyword, share) tuples
+        """
+        scores = self.scores(question_texts, latex_expressions)
+
+        suggestions = []
+        for i in range(scores.shape[0]):
+            row = slice(scores.indptr[i], scores.indptr[i+1])
+            ranked = sorted(zip(scores.data[row], scores.indices[row]), key=lambda (share, j): (-share, j))[:k]
+            suggestions.append([ (self.keywords[j], share) for share, j in ranked ])
+
+        return suggestions
+
+    def tag_questions(self, question_texts, latex_expressions):
+        """
+        Returns python list of the lists of predicted keywords of a batch of questions
+        """
+        y_predict = self.predict(question_texts, latex_expressions)
+
+        return [ [ self.keywords[k] for k in y_predict.indices[y_predict.indptr[i]:y_predict.indptr[i+1]] ] \
+                 for i in range(y_predict.shape[0]) ]
+
+    def tag_pg(self, question_file_contents):
+        """
+        Returns python list of the lists of predicted keywords of a batch of raw .pg files
+        """
+        questions = [ self.parser.parse(contents) for contents in question_file_contents ]
+
+        return self.tag_questions([ q['question_text'] for q in questions ], \
+                                  [ q['latex_expressions'] for q in questions ])
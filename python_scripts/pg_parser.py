@@ -0,0 +1,185 @@
+"""
+This module contains a single pass parser for WebWorK question (.pg) files.
+
+extract_question_tag_info used to scan each file several times: once for the keywords, once
+testing six substrings per line for the question text, and four more times over the text
+to pair up the LaTeX delimiters by position. The parser here makes a single pass of
+precompiled regular expressions over the file contents and returns the keywords, the
+question text and the LaTeX expressions together.
+"""
+import re
+
+from file_access import QuestionFileReader, to_str
+
+# The ## KEYWORDS(...) header line
+KEYWORDS_LINE = re.compile(r'^##.*KEYWORDS.*\n?', re.MULTILINE)
+
+# Lines delimiting the question text in the standard file format
+TEXT_MARKERS = re.compile(r'EOT|EOF|\$BR|BEGIN_TEXT|END_TEXT')
+
+# Lines delimiting the question text in the alternate file format, used by
+# questions without any of the standard markers
+ALTERNATE_TEXT_MARKERS = re.compile(r'TEXT|ANS')
+
+# LaTeX delimiters \( \) \[ \]
+LATEX_DELIMITERS = re.compile(r'\\[()\[\]]')
+LATEX_CLOSING = {')' : '(', ']' : '['}
+
+BR = '$BR'
+
+
+def parse_keywords(line):
+    """
+    Returns the python list of lower case keywords of a ## KEYWORDS(...) line
+    """
+    start = line.find('(')+1
+    end = line.find(')')
+    keyword_list = line[start:end].split(',')
+
+    for i,tag in enumerate(keyword_list):
+        keyword_list[i] = tag.replace("'",'').strip().lower()
+
+    return list(set(keyword_list))
+
+
+def latex_spans(question_text):
+    """
+    Returns the python list of LaTeX expressions embedded within the text, including their
+    delimiters. Each \\( is paired with its own \\) and each \\[ with its own \\], delimiters
+    nested inside an expression are kept within it, and an expression left unterminated
+    runs to the end of the text.
+    """
+    latex = []
+    open_delimiters = []
+    start = 0
+
+    for match in LATEX_DELIMITERS.finditer(question_text):
+        delimiter = match.group()[1]
+
+        if delimiter in LATEX_CLOSING:
+            if LATEX_CLOSING[delimiter] not in open_delimiters:
+                # Stray closing delimiter
+                continue
+
+            # Close the matching opening delimiter, and any left open inside it
+            while open_delimiters.pop() != LATEX_CLOSING[delimiter]:
+                pass
+
+            if not open_delimiters:
+                latex.append( question_text[start:match.end()] )
+        else:
+            if not open_delimiters:
+                start = match.start()
+            open_delimiters.append(delimiter)
+
+    if open_delimiters:
+        latex.append( question_text[start:] )
+
+    return latex
+
+
+class PGParser():
+    """
+    This class parses WebWorK question files in a single pass over their contents.
+
+    Sample usage:
+
+        parser = PGParser()
+
+        question = parser.parse_file(path)
+        if question['corrupted'] is None:
+            keywords = question['keywords']
+            question_text = question['question_text']
+            latex = question['latex_expressions']
+
+    A question is reported as corrupted when it has no ## KEYWORDS line or contains
+    binary data. Questions whose text is blank in the standard format are parsed again
+    with the alternate TEXT/ANS markers, reported with format 'alternate'.
+
+    parse_file reads the files with a QuestionFileReader, so a parser must not be shared
+    between threads.
+    """
+    def __init__(self):
+        self.reader = QuestionFileReader()
+
+    def parse(self, contents, length=None):
+        """
+        Parses the contents of a question file. The line based rules of the original
+        functions are applied with regular expressions over the whole contents, so no
+        list of lines is built, and strings are only created for the keywords line and
+        the question text.
+        @params
+            - contents: python string of question file contents, or the raw bytes of the
+                        file as returned by QuestionFileReader.read
+            - length: number of bytes of contents holding the file, by default all of them
+        @return
+            - python dict with keys 'keywords', 'question_text', 'latex_expressions',
+              'format' ('standard' or 'alternate') and 'corrupted' (None or a reason string)
+        """
+        if length is None:
+            length = len(contents)
+
+        keywords_line = None
+        for match in KEYWORDS_LINE.finditer(contents, 0, length):
+            keywords_line = match
+
+        if keywords_line is not None:
+            keywords_line = to_str(contents, keywords_line.start(), keywords_line.end())
+
+        question_format = 'standard'
+        question_text = self._text(contents, length, TEXT_MARKERS)
+
+        if not question_text.strip():
+            alternate_text = self._text(contents, length, ALTERNATE_TEXT_MARKERS)
+            if alternate_text.strip():
+                question_format = 'alternate'
+                question_text = alternate_text
+
+        corrupted = None
+        if contents.find('\0', 0, length) != -1:
+            corrupted = 'binary data'
+        elif keywords_line is None:
+            corrupted = 'no keywords line'
+
+        return {'keywords' : parse_keywords(keywords_line) if keywords_line is not None else [], \
+                'question_text' : question_text, \
+                'latex_expressions' : latex_spans(question_text), \
+                'format' : question_format, \
+                'corrupted' : corrupted }
+
+    def parse_file(self, path):
+        """
+        Reads and parses the question file at path, see parse
+        """
+        try:
+            contents, length = self.reader.read(path)
+            return self.parse(contents, length)
+        finally:
+            self.reader.close()
+
+    def _text(self, contents, length, markers):
+        """
+        Returns the question text, i.e. the lines strictly between the first and the last line
+        containing one of the markers, joined by spaces with $BR and newlines removed
+        """
+        first = markers.search(contents, 0, length)
+        if first is None:
+            return ''
+
+        last = first
+        for last in markers.finditer(contents, first.end(), length):
+            pass
+
+        # The text starts after the first marker line and ends before the last marker line
+        start = contents.find('\n', first.start(), length) + 1
+        end = contents.rfind('\n', 0, last.start()) + 1
+
+        if start == 0 or end <= start:
+            return ''
+
+        # Joining the lines with ' ' and removing the newlines puts a single space
+        # between consecutive lines
+        question_text = to_str(contents, start, end - 1).replace('\n', ' ')
+        question_text = question_text.replace(BR, '')
+
+        return question_text
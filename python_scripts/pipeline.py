@@ -0,0 +1,431 @@
+"""
+This script runs the whole data pipeline of the README in one go:
+
+    separate -> extract -> find keywords -> LaTeX tokens ------------> train -> tag untagged questions
+                                         -> near duplicates -> split -/
+
+The tagging model is trained on the training set of the split only, so the test set holds
+questions it has not seen, and no near duplicate of them.
+
+Each stage declares the files it reads and writes in the data directory. A stage is skipped
+when the fingerprint of its inputs (the contents of its input files, the source of its script
+and of the modules of this directory it imports, and its parameters) is the same as on its
+last successful run and its outputs still exist, so a rebuild only redoes the stages
+downstream of what changed. Stages whose inputs are ready run concurrently in forked
+processes, and the wall time and peak memory of each stage are reported at the end.
+
+    python pipeline.py --opl-dir ~/webwork-open-problem-library/OpenProblemLibrary --jobs 2
+"""
+from __future__ import division
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import traceback
+import types
+from time import time
+
+import extract_question_tag_info
+import find_keywords_in_text
+import near_duplicates
+import separate_tagged_untagged_content
+import split_train_test_data
+import tag_untagged_questions
+import tagging_model
+import top_latex_by_keyword
+from extraction_manifest import file_hash
+from instrumentation import instrumentation
+
+
+class Stage():
+    """
+    This class declares one stage of the pipeline.
+
+    Sample usage:
+
+        Stage('find', find_keywords_in_text, lambda: find_keywords_in_text.main(data_directory),
+              inputs=['question_info_data.csv', 'tag_info_data.csv'],
+              outputs=['question_info_data_2.npz', 'question_info_data_2.csv'],
+              after=['extract'])
+    """
+    def __init__(self, name, module, run, inputs, outputs, after, params=None, extra_fingerprint=None):
+        """
+        @params
+            - name: name of the stage
+            - module: the script module of the stage, whose source is part of the fingerprint
+            - run: function without arguments running the stage
+            - inputs: python list of the files read by the stage, relative to the data directory
+            - outputs: python list of the files written by the stage, relative to the data directory
+            - after: python list of the names of the stages producing the inputs
+            - params: optional python dict of the parameters of the stage
+            - extra_fingerprint: optional function returning a string fingerprint of inputs
+                                 outside the data directory
+        """
+        self.name = name
+        self.module = module
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.after = after
+        self.params = params or {}
+        self.extra_fingerprint = extra_fingerprint
+
+
+def directory_fingerprint(paths):
+    """
+    Returns the hex SHA-1 digest of the paths, sizes and modification times of files
+    """
+    sha1 = hashlib.sha1()
+
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            sha1.update('%s\0%d\0%f\n' % (path, stat.st_size, stat.st_mtime))
+        except OSError:
+            sha1.update('%s\0missing\n' % path)
+
+    return sha1.hexdigest()
+
+
+def question_files_fingerprint(paths_file):
+    """
+    Returns the fingerprint of the question files listed in paths_file
+    """
+    if not os.path.exists(paths_file):
+        return 'missing'
+
+    paths_file_handle = open(paths_file, mode='r')
+    paths = [ line.rstrip('\n') for line in paths_file_handle ]
+    paths_file_handle.close()
+
+    return directory_fingerprint(paths)
+
+
+def pipeline_stages(opl_directory, data_directory, workers=1, manifest=False, num_keywords=200, num_latex_tokens=500):
+    """
+    Returns the python list of the stages of the pipeline, in an order where every stage
+    comes after the stages it depends on
+    @params
+        - opl_directory: root directory of the Open Problem Library
+        - data_directory: directory of the tables written by the stages
+        - workers: number of workers of the separate, extract and tag stages
+        - manifest: if True, the separate and extract stages keep extraction manifests in the
+                    data directory to only re-read added or changed question files
+    """
+    data = lambda name: os.path.join(data_directory, name)
+    table = lambda name: [name + '.npz', name + '.csv']
+
+    # Tables are fingerprinted by their CSV export: the .npz zip members carry the time
+    # they were written, so a table rewritten with the same contents would look changed.
+    # write_table writes the .npz last, and read_table reads an edited CSV newer than the
+    # .npz instead, so the contents fingerprinted are the contents the stages read
+    table_input = lambda name: name + '.csv'
+
+    separate_manifest = data('separate_manifest.pkl') if manifest else None
+    extract_manifest = data('extract_manifest.pkl') if manifest else None
+
+    return [
+        Stage('separate', separate_tagged_untagged_content,
+              lambda: separate_tagged_untagged_content.main(separate_manifest, workers, opl_directory, data_directory),
+              inputs=[],
+              outputs=['tagged_paths.txt', 'untagged_paths.txt'],
+              after=[],
+              params={'opl_directory' : opl_directory},
+              extra_fingerprint=lambda: directory_fingerprint(separate_tagged_untagged_content.iter_question_files(opl_directory))),
+
+        Stage('extract', extract_question_tag_info,
+              lambda: extract_question_tag_info.main(workers, extract_manifest, data_directory),
+              inputs=['tagged_paths.txt'],
+              outputs=table('question_info_data') + table('tag_info_data') + ['keyword_index.npz'],
+              after=['separate'],
+              extra_fingerprint=lambda: question_files_fingerprint(data('tagged_paths.txt'))),
+
+        Stage('find', find_keywords_in_text,
+              lambda: find_keywords_in_text.main(data_directory),
+              inputs=[table_input('question_info_data'), table_input('tag_info_data')],
+              outputs=table('question_info_data_2'),
+              after=['extract']),
+
+        Stage('latex', top_latex_by_keyword,
+              lambda: top_latex_by_keyword.main(data_directory),
+              inputs=[table_input('question_info_data_2'), table_input('tag_info_data')],
+              outputs=table('tag_info_data_2') + ['keyword_latex_counts.npz'],
+              after=['find', 'extract']),
+
+        Stage('dedup', near_duplicates,
+              lambda: near_duplicates.main(data_directory),
+              inputs=[table_input('question_info_data_2')],
+              outputs=table('question_clusters'),
+              after=['find']),
+
+        Stage('split', split_train_test_data,
+              lambda: split_train_test_data.main(data_directory, group_clusters=True),
+              inputs=[table_input('question_info_data_2'), table_input('question_clusters')],
+              outputs=table('train_data') + table('test_data'),
+              after=['find', 'dedup'],
+              params={'group_clusters' : True}),
+
+        Stage('train', tagging_model,
+              lambda: tagging_model.main(data('train_data'), data('tag_info_data_2'), data('tagging_model.pkl'), \
+                                         num_keywords, num_latex_tokens),
+              inputs=[table_input('train_data'), table_input('tag_info_data_2')],
+              outputs=['tagging_model.pkl'],
+              after=['split', 'latex'],
+              params={'num_keywords' : num_keywords, 'num_latex_tokens' : num_latex_tokens}),
+
+        Stage('tag', tag_untagged_questions,
+              lambda: tag_untagged_questions.main(data('tagging_model.pkl'), data_directory, workers=workers),
+              inputs=['untagged_paths.txt', 'tagging_model.pkl'],
+              outputs=table('untagged_keywords'),
+              after=['separate', 'train'],
+              extra_fingerprint=lambda: question_files_fingerprint(data('untagged_paths.txt'))),
+    ]
+
+
+def source_file(module):
+    """
+    Returns the path of the source of a module loaded from a .py or .pyc file
+    """
+    source = module.__file__
+    if source.endswith('.pyc'):
+        source = source[:-1]
+    return source
+
+
+def local_modules(module):
+    """
+    Returns python list of module and of the modules of its own directory that it imports,
+    directly or through each other, sorted by name. Names imported with from ... import
+    count through the module that defines them.
+    """
+    directory = os.path.dirname(os.path.abspath(source_file(module)))
+
+    found = {}
+    pending = [module]
+
+    while pending:
+        current = pending.pop()
+        if current.__name__ in found:
+            continue
+        found[current.__name__] = current
+
+        for value in vars(current).values():
+            if not isinstance(value, types.ModuleType):
+                name = getattr(value, '__module__', None)
+                value = sys.modules.get(name) if isinstance(name, str) else None
+
+            if value is None or value.__name__ in found or not getattr(value, '__file__', None):
+                continue
+            if os.path.dirname(os.path.abspath(source_file(value))) == directory:
+                pending.append(value)
+
+    return [ found[name] for name in sorted(found) ]
+
+
+def stage_fingerprint(stage, data_directory):
+    """
+    Returns the hex SHA-1 digest of everything the outputs of a stage depend on: the source
+    of its script and of the local modules it imports, its parameters and the contents of
+    its input files
+    """
+    sha1 = hashlib.sha1()
+
+    for module in local_modules(stage.module):
+        sha1.update('%s\0%s\n' % (module.__name__, file_hash(source_file(module))))
+
+    sha1.update(json.dumps(stage.params, sort_keys=True))
+
+    for name in stage.inputs:
+        path = os.path.join(data_directory, name)
+        sha1.update('%s\0%s\n' % (name, file_hash(path) if os.path.exists(path) else 'missing'))
+
+    if stage.extra_fingerprint is not None:
+        sha1.update(stage.extra_fingerprint())
+
+    return sha1.hexdigest()
+
+
+def load_state(state_file):
+    """
+    Returns python dict of the fingerprints of the last successful run of each stage
+    """
+    if not os.path.exists(state_file):
+        return {}
+
+    state_file_handle = open(state_file, mode='r')
+    state = json.load(state_file_handle)
+    state_file_handle.close()
+
+    return state
+
+
+def save_state(state, state_file):
+    state_file_handle = open(state_file, mode='w')
+    json.dump(state, state_file_handle, indent=2, sort_keys=True)
+    state_file_handle.close()
+
+
+def start_stage(stage, report_file=None, profile=False):
+    """
+    Runs a stage in a forked process and returns its pid. The child exits with status 1
+    if the stage raises. If report_file is given, the child writes the instrumentation
+    report of the stage to it, profiled with cProfile if profile is True.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    pid = os.fork()
+    if pid:
+        return pid
+
+    instrumentation.reset()
+    if profile:
+        instrumentation.enable_profiling()
+
+    status = 0
+    try:
+        stage.run()
+        if report_file is not None:
+            instrumentation.save(report_file)
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(status)
+
+
+def run_pipeline(stages, data_directory, jobs=1, force=(), instrument=False, profile=False):
+    """
+    Runs the stages whose fingerprint changed, up to jobs stages at a time, each as soon as
+    the stages it depends on are done.
+    @params
+        - stages: python list of Stage, as returned by pipeline_stages
+        - data_directory: directory of the input and output files of the stages
+        - jobs: maximum number of stages running at the same time
+        - force: names of stages to run even if their fingerprint is unchanged
+        - instrument: if True, the instrumentation report of each stage that runs is
+                      included in its entry under 'instrumentation'
+        - profile: if True, the stages that run are profiled with cProfile
+    @return
+        - python list of dicts with the name, status ('run', 'cached', 'failed' or 'blocked'),
+          wall time and peak memory of each stage
+    """
+    if jobs < 1:
+        raise ValueError('jobs must be at least 1, got %d' % jobs)
+
+    state_file = os.path.join(data_directory, 'pipeline_state.json')
+    state = load_state(state_file)
+
+    report = dict( (stage.name, {'stage' : stage.name, 'status' : None, 'wall_time' : 0.0, 'peak_memory_mb' : 0.0}) \
+                   for stage in stages )
+    pending = list(stages)
+    running = {}
+
+    while pending or running:
+
+        # Start or skip every stage whose dependencies are done
+        for stage in list(pending):
+            statuses = [ report[name]['status'] for name in stage.after ]
+
+            if any( status in ('failed', 'blocked') for status in statuses ):
+                report[stage.name]['status'] = 'blocked'
+                pending.remove(stage)
+                continue
+
+            if not all( status in ('run', 'cached') for status in statuses ) or len(running) >= jobs:
+                continue
+
+            pending.remove(stage)
+            fingerprint = stage_fingerprint(stage, data_directory)
+            outputs_exist = all( os.path.exists(os.path.join(data_directory, name)) for name in stage.outputs )
+
+            if stage.name not in force and outputs_exist and state.get(stage.name) == fingerprint:
+                print 'Stage %s: unchanged, skipping\n' % stage.name
+                report[stage.name]['status'] = 'cached'
+                continue
+
+            print 'Stage %s: running\n' % stage.name
+
+            report_file = None
+            if instrument:
+                report_handle, report_file = tempfile.mkstemp(prefix='pipeline_%s_' % stage.name, suffix='.json')
+                os.close(report_handle)
+
+            running[start_stage(stage, report_file, profile)] = (stage, fingerprint, time(), report_file)
+
+        if not running:
+            continue
+
+        # Wait for any stage to finish, collecting its resource usage
+        pid, status, rusage = os.wait4(-1, 0)
+        stage, fingerprint, t0, report_file = running.pop(pid)
+
+        report[stage.name]['wall_time'] = time() - t0
+        # ru_maxrss is in kilobytes on Linux
+        report[stage.name]['peak_memory_mb'] = rusage.ru_maxrss / 1024
+
+        if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+            report[stage.name]['status'] = 'run'
+            state[stage.name] = fingerprint
+        else:
+            report[stage.name]['status'] = 'failed'
+            state.pop(stage.name, None)
+
+        if report_file is not None:
+            if os.path.getsize(report_file):
+                report_file_handle = open(report_file, mode='r')
+                report[stage.name]['instrumentation'] = json.load(report_file_handle)
+                report_file_handle.close()
+            os.remove(report_file)
+
+        save_state(state, state_file)
+
+    return [ report[stage.name] for stage in stages ]
+
+
+def main(opl_directory, data_directory, jobs, workers, manifest, force, num_keywords, num_latex_tokens, \
+         report_file=None, profile=False):
+
+    stages = pipeline_stages(opl_directory, data_directory, workers, manifest, num_keywords, num_latex_tokens)
+
+    t0 = time()
+    report = run_pipeline(stages, data_directory, jobs, force, report_file is not None, profile)
+    t1 = time()
+
+    print '\n%-10s %-8s %12s %16s' % ('stage', 'status', 'wall time', 'peak memory MB')
+    for row in report:
+        print '%-10s %-8s %12.3f %16.1f' % (row['stage'], row['status'], row['wall_time'], row['peak_memory_mb'])
+    print '\nTotal time: %f' % (t1-t0)
+
+    if report_file is not None:
+        report_file_handle = open(report_file, mode='w')
+        json.dump({'command' : ' '.join(sys.argv), 'started' : t0, 'wall_time' : t1-t0, 'stages' : report}, \
+                  report_file_handle, indent=2)
+        report_file_handle.close()
+        print 'Instrumentation report saved to file %s' % report_file
+
+    if any( row['status'] in ('failed', 'blocked') for row in report ):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the data pipeline, skipping the stages whose inputs are unchanged.')
+    parser.add_argument('--opl-dir', dest='opl_directory', default=separate_tagged_untagged_content.OPL_DIRECTORY)
+    parser.add_argument('--data-dir', dest='data_directory', default='../data')
+    parser.add_argument('--jobs', type=int, default=2, help='maximum number of stages running at the same time')
+    parser.add_argument('--workers', type=int, default=1, help='number of workers of the separate, extract and tag stages')
+    parser.add_argument('--manifest', action='store_true', help='keep extraction manifests to only re-read changed question files')
+    parser.add_argument('--force', nargs='*', default=[], help='stages to run even if their inputs are unchanged')
+    parser.add_argument('--num-keywords', type=int, default=200)
+    parser.add_argument('--num-latex-tokens', type=int, default=500)
+    parser.add_argument('--report', dest='report_file', default=None, help='JSON file to write the instrumentation report to')
+    parser.add_argument('--profile', action='store_true', help='profile the stages with cProfile and report their hot paths')
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    main(args.opl_directory, args.data_directory, args.jobs, args.workers, args.manifest, args.force, \
+         args.num_keywords, args.num_latex_tokens, args.report_file, args.profile)
@@ -7,70 +7,175 @@ These files will be used for easier access to tagged content for all subsequent
 @date April 14 2015
 """
 from __future__ import division
-import glob
+import argparse
 import os
+import threading
+from multiprocessing.pool import ThreadPool
 from time import time
 
-def get_tagged_untagged_files(base_directory, tagged_problems, untagged_problems):
+from extraction_manifest import ExtractionManifest
+from file_access import QuestionFileReader
+from instrumentation import instrumentation
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        # Backport of os.scandir for python 2
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# Default location of the Open Problem Library checkout
+OPL_DIRECTORY = '/Users/luigi/Desktop/webwork-open-problem-library/OpenProblemLibrary'
+
+def classify_question_file(file_path):
     """
-    Method to separate all tagged and untagged problems in the WebWorK library
+    Method to classify a WebWorK problem file as a tagged question, an untagged question or
+    a pointer to another file. The raw bytes of the file are searched for the markers without
+    creating any string, the first line containing either marker classifies the file.
     @return
-        tuple containg lists of file paths to tagged and untagged problems (tagged,untagged)
+        one of the strings 'tagged', 'untagged' or 'pointer'
     """
     NO_QUESTION = '# This file is just a pointer to the file'
-    FILE_POSTFIX = '.pg'
     KEYWORD = 'KEYWORD'
-    
-    subfiles = glob.glob(base_directory + '/*')
-    
-    for file_path in subfiles:
-        
-        if FILE_POSTFIX not in file_path:
-            # Recurse through the subdirectories
-            if os.path.isdir(file_path):
-                tagged_problems, untagged_problems = get_tagged_untagged_files(file_path, tagged_problems, untagged_problems)
+
+    reader = _thread_reader()
+
+    try:
+        contents, length = reader.read(file_path)
+
+        keyword = contents.find(KEYWORD, 0, length)
+
+        if keyword == -1:
+            # Remove file if it's a pointer to some other file
+            return 'pointer' if contents.find(NO_QUESTION, 0, length) != -1 else 'untagged'
+
+        # A pointer marker before the end of the first keyword line comes first, or is on the same line
+        line_end = contents.find('\n', keyword, length)
+        if line_end == -1:
+            line_end = length
+
+        return 'pointer' if contents.find(NO_QUESTION, 0, line_end) != -1 else 'tagged'
+    finally:
+        reader.close()
+
+
+# One QuestionFileReader per thread classifying files
+_readers = threading.local()
+
+
+def _thread_reader():
+    """
+    Returns the QuestionFileReader of the calling thread
+    """
+    if not hasattr(_readers, 'reader'):
+        _readers.reader = QuestionFileReader()
+    return _readers.reader
+
+
+def _list_directory(directory):
+    """
+    Returns an iterator of (path, is_directory) tuples for the entries of directory in
+    directory order, skipping hidden entries as glob does
+    """
+    if scandir is not None:
+        return ( (entry.path, entry.is_dir()) for entry in scandir(directory) if not entry.name.startswith('.') )
+
+    return ( (os.path.join(directory, name), os.path.isdir(os.path.join(directory, name))) \
+             for name in os.listdir(directory) if not name.startswith('.') )
+
+
+def iter_question_files(base_directory):
+    """
+    Generator yielding the paths of all WebWorK problem files below base_directory.
+    The tree is walked depth first in directory order with an explicit stack instead of
+    recursion, so the paths come out in the same order as the recursive glob walk.
+    """
+    FILE_POSTFIX = '.pg'
+
+    stack = [ _list_directory(base_directory) ]
+
+    while stack:
+        for file_path, is_directory in stack[-1]:
+            if is_directory:
+                # Descend into the subdirectory before the rest of this directory
+                stack.append( _list_directory(file_path) )
+                break
+            elif FILE_POSTFIX in os.path.basename(file_path):
+                yield file_path
         else:
-            # Flags to check if a file is a pointer to another file or if it is a tagged question
-            pointer_to_file = False
-            tagged_question = False
-            
-            # Exclude all files that are pointers to other files
-            problem_file_handle = open(file_path, mode='r')
-            contents = problem_file_handle.readlines()
-            problem_file_handle.close()
-    
-            # Parse lines of file to distinguish between pointers, tagged problems and untagged problems
-            for line in contents:
-                # Remove file if it's a pointer to some other file
-                if NO_QUESTION in line:
-                    pointer_to_file = True
-                    break;
-                # Set flag to true if question is tagged
-                if KEYWORD in line:
-                    tagged_question = True
-                    break;
-                    
-            if tagged_question: 
-                tagged_problems.append(file_path)
-            elif not pointer_to_file: 
-                untagged_problems.append(file_path)
+            stack.pop()
+
+
+def iter_classified_files(base_directory, manifest=None, workers=1):
+    """
+    Generator yielding (path, status) tuples for all WebWorK problem files below base_directory,
+    where status is one of 'tagged', 'untagged' or 'pointer'.
+    If an ExtractionManifest is given, only files added or changed since the manifest
+    was saved are read again. With workers > 1 the files are read in a pool of threads,
+    the results are still yielded in walk order.
+    """
+    def classify(file_path):
+        if manifest is None:
+            return file_path, classify_question_file(file_path)
+
+        entry = manifest.lookup(file_path)
+        if 'status' not in entry:
+            entry['status'] = classify_question_file(file_path)
+
+        return file_path, entry['status']
+
+    if workers > 1:
+        pool = ThreadPool(workers)
+        for classified in pool.imap(classify, iter_question_files(base_directory), 64):
+            yield classified
+        pool.close()
+        pool.join()
+    else:
+        for file_path in iter_question_files(base_directory):
+            yield classify(file_path)
+
+
+def get_tagged_untagged_files(base_directory, tagged_problems, untagged_problems, manifest=None, workers=1):
+    """
+    Method to separate all tagged and untagged problems in the WebWorK library
+    If an ExtractionManifest is given, only files added or changed since the manifest
+    was saved are read again.
+    @return
+        tuple containg lists of file paths to tagged and untagged problems (tagged,untagged)
+    """
+    for file_path, status in iter_classified_files(base_directory, manifest, workers):
+        if status == 'tagged': 
+            tagged_problems.append(file_path)
+        elif status == 'untagged': 
+            untagged_problems.append(file_path)
         
     # Return list of tagged and untagged problems file paths
     return tagged_problems, untagged_problems
     
 
-def main():
-    
-    base_directory = '/Users/luigi/Desktop/webwork-open-problem-library/OpenProblemLibrary'
+def main(manifest_file=None, workers=1, base_directory=OPL_DIRECTORY, data_directory='../data'):
     
     tagged_problems = []
     untagged_problems = []
 
+    manifest = None
+    if manifest_file is not None:
+        manifest = ExtractionManifest(manifest_file)
+
     print 'Separating WebWork questions by tagged/untagged...\n'
     
     t0 = time()
-    tagged_problems, untagged_problems = get_tagged_untagged_files(base_directory, tagged_problems, untagged_problems)
+    with instrumentation.section('scan') as scan:
+        tagged_problems, untagged_problems = get_tagged_untagged_files(base_directory, tagged_problems, untagged_problems, manifest, workers)
+        scan.items += len(tagged_problems) + len(untagged_problems)
     t1 = time()
+
+    if manifest is not None:
+        deleted = manifest.prune()
+        manifest.save()
+        print 'Manifest %s: %d unchanged, %d added or changed, %d deleted files\n' % (manifest_file, manifest.hits, manifest.misses, deleted)
     
     num_tagged = len(tagged_problems)
     num_untagged = len(untagged_problems)
@@ -84,14 +189,14 @@ def main():
     # Writing tagged and untagged file paths to different txt files for easy access
     print 'Writing tagged and untagged paths to file for easy access'
     
-    tagged_file = '../data/tagged_paths.txt'
+    tagged_file = os.path.join(data_directory, 'tagged_paths.txt')
     print 'Writing tagged content to %s' % tagged_file
     tagged_write_file = open(tagged_file, mode='w')
     for f in tagged_problems:
         tagged_write_file.write(f + '\n')
     tagged_write_file.close()
 
-    untagged_file = '../data/untagged_paths.txt'
+    untagged_file = os.path.join(data_directory, 'untagged_paths.txt')
     print 'Writing untagged content to %s \n' % untagged_file
     untagged_write_file = open(untagged_file, mode='w')
     for f in untagged_problems:
@@ -99,4 +204,10 @@ def main():
     untagged_write_file.close()
     
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Separate the WebWorK questions into tagged and untagged questions.')
+    parser.add_argument('--manifest', dest='manifest_file', default=None, help='manifest file used to only re-read added or changed files')
+    parser.add_argument('--workers', type=int, default=1, help='number of threads used to read the question files')
+    parser.add_argument('--opl-dir', dest='base_directory', default=OPL_DIRECTORY, help='root directory of the Open Problem Library')
+    parser.add_argument('--data-dir', dest='data_directory', default='../data')
+    args = parser.parse_args()
+    main(args.manifest_file, args.workers, args.base_directory, args.data_directory)
\ No newline at end of file
@@ -1,23 +1,80 @@
 """
 This script splits the question set into a train and test set for the sake of consistency across analysis on different days
 
+With --group-clusters the near-duplicate clusters of near_duplicates.py are kept on one side of the
+split, so that no test question has a near copy in the training set, and with --canonical-only
+only the canonical question of every cluster is kept.
+
 @author Luigi Patruno
 @date 17 April 2015
 """
+import argparse
+import os
 import numpy as np
 import pandas as pd
 from sklearn.cross_validation import train_test_split
 
-def main():
+from instrumentation import instrumentation
+from table_store import read_table, write_table
+
+def group_train_test_split(groups, test_size=0.2, seed=0):
+    """
+    Splits the rows into a train and test set keeping all rows of a group on the same side.
+    The groups are drawn in a seeded random order until the test set holds test_size of the rows.
+    Returns the tuple (train_index, test_index) of numpy arrays of row indices.
+    """
+    unique_groups, inverse, counts = np.unique(groups, return_inverse=True, return_counts=True)
+    order = np.random.RandomState(seed).permutation(len(unique_groups))
+    
+    in_test = np.zeros(len(unique_groups), dtype=bool)
+    in_test[ order[np.cumsum(counts[order]) - counts[order] < test_size * len(groups)] ] = True
+    
+    return np.flatnonzero(~in_test[inverse]), np.flatnonzero(in_test[inverse])
+
+
+def read_clusters(data_directory, question_info):
+    """
+    Returns pandas DataFrame of the near-duplicate clusters of the rows of question_info
+    """
+    clusters = read_table(os.path.join(data_directory, 'question_clusters'))
+    
+    if clusters.shape[0] != question_info.shape[0] or \
+       (clusters['question_file_path'].values != question_info['question_file_path'].values).any():
+        raise ValueError('question_clusters does not match question_info_data_2, rerun near_duplicates.py')
+    
+    return clusters
+
+
+def main(data_directory='../data', seed=0, group_clusters=False, canonical_only=False):
+    
+    question_info = read_table(os.path.join(data_directory, 'question_info_data_2'))
+    
+    if group_clusters or canonical_only:
+        clusters = read_clusters(data_directory, question_info)
+        if canonical_only:
+            keep = clusters['canonical'].values.astype(bool)
+            question_info = question_info[keep].reset_index(drop=True)
+            clusters = clusters[keep].reset_index(drop=True)
+            print 'Keeping the %d canonical questions of %d' % (keep.sum(), len(keep))
     
-    question_info = pd.read_csv('/home/vagrant/datacourse/MathQuestionTagging/data/question_info_data_2.csv', index_col=0)
-    train, test = train_test_split(question_info, test_size = 0.2)
+    with instrumentation.section('split', items=question_info.shape[0]):
+        if group_clusters:
+            train_index, test_index = group_train_test_split(clusters['cluster_id'].values, 0.2, seed)
+            train, test = question_info.iloc[train_index], question_info.iloc[test_index]
+        else:
+            train, test = train_test_split(question_info, test_size = 0.2, random_state = seed)
     
     train_df = pd.DataFrame(train, columns=question_info.columns)
     test_df = pd.DataFrame(test, columns=question_info.columns)
     
-    train_df.to_csv('/home/vagrant/datacourse/MathQuestionTagging/data/train_data.csv')
-    test_df.to_csv('/home/vagrant/datacourse/MathQuestionTagging/data/test_data.csv')
+    write_table(train_df, os.path.join(data_directory, 'train_data'))
+    write_table(test_df, os.path.join(data_directory, 'test_data'))
     
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Split the questions into a train and test set.')
+    parser.add_argument('--data-dir', dest='data_directory', default='../data')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the split, the same seed gives the same split')
+    parser.add_argument('--group-clusters', action='store_true', help='keep the near-duplicate clusters of near_duplicates.py on one side')
+    parser.add_argument('--canonical-only', action='store_true', help='only keep the canonical question of every near-duplicate cluster')
+    args = parser.parse_args()
+    main(args.data_directory, args.seed, args.group_clusters, args.canonical_only)
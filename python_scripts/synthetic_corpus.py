@@ -0,0 +1,165 @@
+"""
+This module generates a synthetic tree of WebWorK problem files laid out like the
+OpenProblemLibrary, so that the scanning and extraction scripts can be benchmarked
+without a local checkout of the library.
+
+The questions draw their keywords from a vocabulary of configurable size with a skewed
+frequency, like the library where a few keywords tag most questions, and their text
+mentions some of their keywords so that the keyword search and the classifiers have
+something to find. The same arguments always produce the same tree.
+"""
+import argparse
+import os
+import random
+
+KEYWORDS = ['derivative', 'chain rule', 'product rule', 'integration', 'integration by parts',
+            'substitution', 'limits', 'continuity', 'algebra', 'equations', 'inequalities',
+            'polynomials', 'factoring', 'logarithms', 'exponential', 'trigonometry',
+            'matrix', 'vector', 'eigenvalues', 'series', 'sequences', 'probability',
+            'statistics', 'differential equations', 'linear systems', 'functions']
+
+LATEX = ['x^{%d}', '\\frac{%d}{x}', '\\sqrt{x+%d}', '\\sin(%dx)', 'e^{%dx}', '\\int_0^{%d} f(x)\\, dx',
+         '\\lim_{x \\to %d} f(x)', '\\sum_{n=1}^{%d} a_n', '\\ln(%d x)', 'A = \\left[ %d \\right]']
+
+# Words combined into the extra keywords of larger vocabularies
+KEYWORD_WORDS = ['linear', 'quadratic', 'rational', 'implicit', 'partial', 'definite', 'improper',
+                 'geometric', 'arithmetic', 'conditional', 'normal', 'binomial', 'complex', 'polar',
+                 'parametric', 'related', 'optimization', 'area', 'volume', 'rates', 'fractions',
+                 'graphs', 'systems', 'functions', 'limits', 'series', 'integrals', 'derivatives']
+
+POINTER = '# This file is just a pointer to the file\n#\n# "Library/%s"\n#\n\nincludePGproblem("Library/%s");\n'
+
+
+def keyword_vocabulary(num_keywords):
+    """
+    Returns python list of num_keywords keywords: KEYWORDS followed by two word combinations
+    of KEYWORD_WORDS, numbered once those run out
+    """
+    vocabulary = list(KEYWORDS[:num_keywords])
+    seen = set(vocabulary)
+    i = 0
+
+    while len(vocabulary) < num_keywords:
+        first = KEYWORD_WORDS[i % len(KEYWORD_WORDS)]
+        second = KEYWORD_WORDS[(i // len(KEYWORD_WORDS) + 1 + i) % len(KEYWORD_WORDS)]
+        rounds = i // len(KEYWORD_WORDS) ** 2
+
+        keyword = '%s %s' % (first, second) if rounds == 0 else '%s %s %d' % (first, second, rounds)
+        if first != second and keyword not in seen:
+            vocabulary.append(keyword)
+            seen.add(keyword)
+        i += 1
+
+    return vocabulary
+
+
+def sample_keywords(rng, vocabulary, n):
+    """
+    Returns up to n distinct keywords of vocabulary, earlier keywords being much more likely
+    """
+    return list(set( vocabulary[int(len(vocabulary) * rng.random() ** 3)] for i in range(n) ))
+
+
+def question_file_contents(rng, tagged, vocabulary=KEYWORDS, mention_ratio=0.7):
+    """
+    Returns the contents of a random WebWorK question file
+    @params
+        - rng: random.Random instance
+        - tagged: if True, the file has a ## KEYWORDS line
+        - vocabulary: python list of the keywords questions are tagged with
+        - mention_ratio: probability that each keyword of the question is mentioned in its text
+    """
+    lines = ['## DESCRIPTION\n', '## Synthetic question\n', '## ENDDESCRIPTION\n', '\n']
+
+    keywords = sample_keywords(rng, vocabulary, rng.randint(1, 4))
+    if tagged:
+        lines.append("## KEYWORDS(%s)\n" % ','.join("'%s'" % k.title() for k in keywords))
+
+    lines.extend(['## DBsubject(Calculus)\n', '\n', 'DOCUMENT();\n', 'loadMacros("PGstandard.pl");\n',
+                  'TEXTBOOK_PROBLEM();\n', '\n', '$a = random(1, 9, 1);\n', '\n', 'BEGIN_TEXT\n'])
+
+    # Mention some of the keywords of the question, and an unrelated one
+    mentioned = [ k for k in keywords if rng.random() < mention_ratio ] + sample_keywords(rng, vocabulary, 1)
+    lines.append('This question is about %s.\n' % ' and '.join(mentioned))
+
+    for i in range(rng.randint(1, 4)):
+        latex = rng.choice(LATEX) % rng.randint(1, 9)
+        if rng.random() < 0.2:
+            lines.append('Evaluate the expression $BR \\[ %s \\] $BR\n' % latex)
+        else:
+            lines.append('Find \\( %s \\) when \\( x = $a \\).\n' % latex)
+
+    lines.extend(['\\{ ans_rule(20) \\}\n', 'END_TEXT\n', '\n', 'ANS(num_cmp($a));\n', '\n', 'ENDDOCUMENT();\n'])
+
+    return ''.join(lines)
+
+
+def generate_corpus(base_directory, num_files, files_per_directory=50, depth=3, tagged_ratio=0.8,
+                    pointer_ratio=0.05, seed=0, num_keywords=len(KEYWORDS), mention_ratio=0.7):
+    """
+    Writes num_files synthetic question files below base_directory and returns the
+    numbers of tagged, untagged and pointer files written.
+    @params
+        - base_directory: directory the tree is written to
+        - num_files: number of .pg files
+        - files_per_directory: number of .pg files in each leaf directory
+        - depth: number of directory levels between base_directory and the .pg files
+        - tagged_ratio: fraction of question files with a ## KEYWORDS line
+        - pointer_ratio: fraction of files that are pointers to other files
+        - seed: random seed, the same arguments always produce the same tree
+        - num_keywords: size of the keyword vocabulary, see keyword_vocabulary
+        - mention_ratio: probability that each keyword of a question is mentioned in its text
+    """
+    rng = random.Random(seed)
+    vocabulary = keyword_vocabulary(num_keywords)
+    counts = {'tagged' : 0, 'untagged' : 0, 'pointer' : 0}
+
+    for i in range(num_files):
+
+        # Spread the leaf directories over depth levels, with files_per_directory files each
+        directory_index = i // files_per_directory
+        components = []
+        for level in range(depth - 1):
+            components.append('dir%d' % (directory_index % 10))
+            directory_index //= 10
+        components.append('set%d' % directory_index)
+
+        directory = os.path.join(base_directory, *reversed(components))
+        if i % files_per_directory == 0 and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        r = rng.random()
+        if r < pointer_ratio:
+            status = 'pointer'
+            contents = POINTER % (i, i)
+        else:
+            status = 'tagged' if r < pointer_ratio + (1 - pointer_ratio) * tagged_ratio else 'untagged'
+            contents = question_file_contents(rng, status == 'tagged', vocabulary, mention_ratio)
+
+        counts[status] += 1
+
+        question_file_handle = open(os.path.join(directory, 'problem_%d.pg' % i), mode='w')
+        question_file_handle.write(contents)
+        question_file_handle.close()
+
+    return counts['tagged'], counts['untagged'], counts['pointer']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic WebWorK problem library.')
+    parser.add_argument('base_directory')
+    parser.add_argument('--num-files', type=int, default=10000)
+    parser.add_argument('--files-per-directory', type=int, default=50)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--tagged-ratio', type=float, default=0.8)
+    parser.add_argument('--pointer-ratio', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--num-keywords', type=int, default=len(KEYWORDS))
+    parser.add_argument('--mention-ratio', type=float, default=0.7)
+    args = parser.parse_args()
+
+    tagged, untagged, pointers = generate_corpus(args.base_directory, args.num_files, args.files_per_directory, \
+                                                 args.depth, args.tagged_ratio, args.pointer_ratio, args.seed, \
+                                                 args.num_keywords, args.mention_ratio)
+
+    print 'Wrote %d tagged, %d untagged and %d pointer files to %s' % (tagged, untagged, pointers, args.base_directory)
@@ -0,0 +1,254 @@
+"""
+This module persists the question_info and tag_info tables in a typed binary format.
+
+The CSV files written by the scripts store list and dict columns (keywords, latex_expressions,
+keywords_in_text, latex_tokens, ...) as python repr strings that every following script has
+to parse back with ast.literal_eval. Here each table is saved as a single .npz file where
+
+    - numeric columns are stored as numpy arrays
+    - string columns are stored as one utf-8 byte buffer plus an array of offsets
+    - list columns are stored as an array of list offsets plus a string column of the items
+    - dict columns are stored as an array of dict offsets plus a string column of the keys
+      and a numeric array of the values
+
+The arrays are zip compressed, which also makes the files several times smaller than the CSVs,
+and the lists and dicts come back as they were saved, without any parsing.
+
+Sample usage:
+
+    write_table(question_df, '../data/question_info_data')      # .npz and .csv export
+    question_info = read_table('../data/question_info_data')     # prefers the .npz, unless the .csv is newer
+"""
+import ast
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Columns holding python lists or dicts, which are parsed with ast.literal_eval when
+# a table has to be read back from its CSV export
+QUESTION_INFO_LITERALS = ['keywords', 'latex_expressions', 'keywords_in_text', 'y_pred']
+TAG_INFO_LITERALS = ['question_file_path', 'latex_tokens']
+
+
+def _encode_strings(arrays, prefix, values):
+    """
+    Stores a sequence of strings (or None) as a byte buffer, offsets and a null mask
+    """
+    encoded = []
+    nulls = np.zeros(len(values), dtype=np.bool_)
+
+    for i, value in enumerate(values):
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            nulls[i] = True
+            encoded.append('')
+        elif isinstance(value, unicode):
+            encoded.append( value.encode('utf-8') )
+        else:
+            encoded.append( str(value) )
+
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([ len(e) for e in encoded ], out=offsets[1:])
+
+    buffer = ''.join(encoded)
+    arrays[prefix + 'bytes'] = np.frombuffer(buffer, dtype=np.uint8) if buffer else np.zeros(0, dtype=np.uint8)
+    arrays[prefix + 'offsets'] = offsets
+    arrays[prefix + 'nulls'] = nulls
+
+
+def _decode_strings(arrays, prefix):
+    """
+    Inverse of _encode_strings, returns a python list of strings (None for nulls)
+    """
+    buffer = arrays[prefix + 'bytes'].tostring()
+    offsets = arrays[prefix + 'offsets'].tolist()
+    nulls = arrays[prefix + 'nulls']
+
+    strings = [ buffer[offsets[i]:offsets[i+1]] for i in range(len(offsets) - 1) ]
+
+    for i in np.flatnonzero(nulls):
+        strings[i] = None
+
+    return strings
+
+
+def _split(items, offsets):
+    """
+    Splits a flat python list into a list of lists at offsets
+    """
+    offsets = offsets.tolist()
+    return [ items[offsets[i]:offsets[i+1]] for i in range(len(offsets) - 1) ]
+
+
+def _column_kind(values):
+    """
+    Returns the storage kind of an object column: 'list', 'dict' or 'str'
+    """
+    for value in values:
+        if isinstance(value, (list, tuple)):
+            return 'list'
+        if isinstance(value, dict):
+            return 'dict'
+        if isinstance(value, basestring):
+            return 'str'
+
+    return 'str'
+
+
+def save_table(df, path):
+    """
+    Saves a pandas DataFrame to path as an .npz file, keeping list and dict columns as they are
+    @params
+        - df: pandas DataFrame with numeric, string, list of strings or dict of string to number columns
+        - path: file path, conventionally ending in .npz
+    """
+    arrays = {}
+    schema = {'columns' : [], 'index_name' : df.index.name}
+
+    columns = [('__index__', df.index.values)] + [ (column, df[column].values) for column in df.columns ]
+
+    for i, (column, values) in enumerate(columns):
+        prefix = 'c%d_' % i
+
+        if values.dtype.kind in 'biuf':
+            kind = 'numeric'
+            arrays[prefix + 'values'] = values
+        else:
+            kind = _column_kind(values)
+
+            if kind == 'str':
+                _encode_strings(arrays, prefix, values)
+            elif kind == 'list':
+                lengths = [ len(value) for value in values ]
+                arrays[prefix + 'offsets'] = np.concatenate( ([0], np.cumsum(lengths)) ).astype(np.int64)
+                _encode_strings(arrays, prefix + 'items_', [ item for value in values for item in value ])
+            else:
+                lengths = [ len(value) for value in values ]
+                arrays[prefix + 'offsets'] = np.concatenate( ([0], np.cumsum(lengths)) ).astype(np.int64)
+                _encode_strings(arrays, prefix + 'keys_', [ key for value in values for key in value ])
+                arrays[prefix + 'values'] = np.array([ v for value in values for v in value.itervalues() ])
+
+        schema['columns'].append( {'name' : column, 'kind' : kind} )
+
+    arrays['schema'] = np.frombuffer(json.dumps(schema), dtype=np.uint8)
+
+    np.savez_compressed(path, **arrays)
+
+
+def load_table(path):
+    """
+    Loads a pandas DataFrame saved with save_table
+    @params
+        - path: path of the .npz file
+    """
+    arrays = np.load(path)
+    schema = json.loads( arrays['schema'].tostring() )
+
+    data = []
+
+    for i, column in enumerate(schema['columns']):
+        prefix = 'c%d_' % i
+        kind = column['kind']
+
+        if kind == 'numeric':
+            values = arrays[prefix + 'values']
+        elif kind == 'str':
+            values = _decode_strings(arrays, prefix)
+        elif kind == 'list':
+            values = _split( _decode_strings(arrays, prefix + 'items_'), arrays[prefix + 'offsets'] )
+        else:
+            keys = _split( _decode_strings(arrays, prefix + 'keys_'), arrays[prefix + 'offsets'] )
+            counts = _split( arrays[prefix + 'values'].tolist(), arrays[prefix + 'offsets'] )
+            values = [ dict(zip(k, c)) for k, c in zip(keys, counts) ]
+
+        data.append( (str(column['name']), values) )
+
+    arrays.close()
+
+    index = pd.Index(data[0][1], name=schema['index_name'])
+
+    df = pd.DataFrame(index=index)
+    for (column, values), column_schema in zip(data[1:], schema['columns'][1:]):
+        if column_schema['kind'] == 'numeric':
+            df[column] = values
+        else:
+            df[column] = pd.Series(values, index=index, dtype=object)
+
+    return df
+
+
+def write_table(df, base_path):
+    """
+    Persists a DataFrame as base_path.npz, plus a base_path.csv export. The export is written
+    first, so that the .npz is not older than it.
+    """
+    df.to_csv(base_path + '.csv')
+    save_table(df, base_path + '.npz')
+
+
+def table_file(base_path):
+    """
+    Returns the path of the file read_table reads the table at base_path from: the .npz file,
+    unless there is none or the .csv export was modified after it, e.g. edited by hand
+    """
+    npz_path = base_path + '.npz'
+    csv_path = base_path + '.csv'
+
+    if not os.path.exists(npz_path):
+        return csv_path
+    if os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(npz_path):
+        return csv_path
+
+    return npz_path
+
+
+def read_table(base_path, literal_columns=QUESTION_INFO_LITERALS):
+    """
+    Reads the table persisted at base_path from the file given by table_file. A table read
+    from base_path.csv has the literal_columns present in it parsed back into python lists
+    or dicts.
+    @params
+        - base_path: path of the table without the .npz/.csv extension
+        - literal_columns: columns of the CSV holding python list or dict reprs
+    """
+    path = table_file(base_path)
+
+    if path.endswith('.npz'):
+        return load_table(path)
+
+    if os.path.exists(base_path + '.npz'):
+        print 'Reading %s, which is newer than %s.npz' % (path, base_path)
+
+    df = pd.read_csv(path, index_col=0)
+
+    return _parse_literals(df, literal_columns)
+
+
+def iter_table_chunks(base_path, chunk_size, columns=None, literal_columns=QUESTION_INFO_LITERALS):
+    """
+    Yields the table persisted at base_path as pandas DataFrames of at most chunk_size rows,
+    so that tables larger than memory can be processed. The chunks are read from the CSV
+    export, since the compressed .npz columns can only be loaded whole.
+    @params
+        - base_path: path of the table without the .npz/.csv extension
+        - chunk_size: number of rows per chunk
+        - columns: optional list of the columns to keep
+        - literal_columns: columns of the CSV holding python list or dict reprs
+    """
+    for df in pd.read_csv(base_path + '.csv', index_col=0, chunksize=chunk_size):
+        if columns is not None:
+            df = df[columns].copy()
+
+        yield _parse_literals(df, literal_columns)
+
+
+def _parse_literals(df, literal_columns):
+    """
+    Parses the literal_columns present in a table read from CSV back into python lists or dicts
+    """
+    for column in literal_columns:
+        if column in df.columns:
+            values = [ ast.literal_eval(value) if isinstance(value, str) else value for value in df[column].values ]
+            df[column] = pd.Series(values, index=df.index, dtype=object)
+
+    return df
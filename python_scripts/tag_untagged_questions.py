@@ -0,0 +1,246 @@
+"""
+This script tags the untagged questions listed in untagged_paths.txt with a persisted TaggingModel.
+
+The paths are read in batches of --batch-size questions, which are parsed with the PGParser,
+featurized and predicted in a pool of worker processes that each load the model once. The
+keywords of every batch are appended to a JSON lines file as soon as the batch is tagged, in
+the order of the paths, and a checkpoint file next to it records how many batches and bytes of
+the output are complete. An interrupted run resumes after the last checkpointed batch. The
+checkpoint is only used when the paths file, the model and the options are the same as when
+it was written, otherwise tagging starts over. Once every batch is tagged, the results are
+also written as a table named after the output file, by default untagged_keywords.
+
+    python tag_untagged_questions.py --workers 4 --batch-size 256
+"""
+import argparse
+import hashlib
+import json
+import os
+from itertools import imap
+from multiprocessing import Pool
+from time import time
+import pandas as pd
+
+from extraction_manifest import file_hash
+from instrumentation import instrumentation
+from table_store import write_table
+from tagging_model import TaggingModel
+
+# Loaded once in each worker process by load_worker_model
+worker_model = None
+
+
+def load_worker_model(model_file):
+    """
+    Initializer of the worker processes, loading the model they tag with
+    """
+    global worker_model
+    worker_model = TaggingModel.load(model_file)
+
+
+def tag_batch(task):
+    """
+    Parses and tags one batch of question files with the model of the worker.
+    Takes a single tuple (paths, top_k, min_k) so it can be mapped over a process pool.
+    @return
+        - python list of one dict per path with its 'question_file_path' and 'keywords',
+          plus their 'scores' if top_k is positive, or an 'error' if it could not be parsed
+    """
+    paths, top_k, min_k = task
+
+    records = []
+    question_texts = []
+    latex_expressions = []
+    parsed = []
+
+    for path in paths:
+        record = {'question_file_path' : path}
+        records.append(record)
+
+        try:
+            question = worker_model.parser.parse_file(path)
+        except (IOError, OSError) as e:
+            record['error'] = str(e)
+            continue
+
+        # Untagged questions have no keywords line, only binary files are left out
+        if question['corrupted'] == 'binary data':
+            record['error'] = question['corrupted']
+            continue
+
+        question_texts.append( question['question_text'] )
+        latex_expressions.append( question['latex_expressions'] )
+        parsed.append(record)
+
+    if not parsed:
+        return records
+
+    if top_k > 0:
+        suggestions = worker_model.suggest(question_texts, latex_expressions, top_k, worker_model.scorer.threshold, min_k)
+        for record, ranked in zip(parsed, suggestions):
+            record['keywords'] = [ keyword for keyword, score in ranked ]
+            record['scores'] = [ score for keyword, score in ranked ]
+    else:
+        for record, keywords in zip(parsed, worker_model.tag_questions(question_texts, latex_expressions)):
+            record['keywords'] = keywords
+
+    return records
+
+
+def iter_batches(paths_file, batch_size, skip=0):
+    """
+    Yields python lists of up to batch_size paths read from paths_file, after the first skip batches
+    """
+    paths_file_handle = open(paths_file, mode='r')
+
+    batch = []
+    batch_number = 0
+
+    for line in paths_file_handle:
+        path = line.rstrip('\n')
+        if not path:
+            continue
+
+        batch.append(path)
+        if len(batch) == batch_size:
+            if batch_number >= skip:
+                yield batch
+            batch = []
+            batch_number += 1
+
+    if batch and batch_number >= skip:
+        yield batch
+
+    paths_file_handle.close()
+
+
+def run_fingerprint(paths_file, model_file, batch_size, top_k, min_k):
+    """
+    Returns the hex SHA-1 digest of everything the output depends on
+    """
+    sha1 = hashlib.sha1()
+    sha1.update(file_hash(paths_file))
+    sha1.update(file_hash(model_file))
+    sha1.update(json.dumps({'batch_size' : batch_size, 'top_k' : top_k, 'min_k' : min_k}, sort_keys=True))
+    return sha1.hexdigest()
+
+
+def load_checkpoint(checkpoint_file, fingerprint):
+    """
+    Returns python dict of the checkpoint of an earlier run with the same fingerprint, None if there is none
+    """
+    if not os.path.exists(checkpoint_file):
+        return None
+
+    checkpoint_file_handle = open(checkpoint_file, mode='r')
+    checkpoint = json.load(checkpoint_file_handle)
+    checkpoint_file_handle.close()
+
+    return checkpoint if checkpoint.get('fingerprint') == fingerprint else None
+
+
+def save_checkpoint(checkpoint, checkpoint_file):
+    """
+    Replaces the checkpoint file atomically, so an interruption leaves the previous checkpoint intact
+    """
+    temporary_file = checkpoint_file + '.tmp'
+    checkpoint_file_handle = open(temporary_file, mode='w')
+    json.dump(checkpoint, checkpoint_file_handle)
+    checkpoint_file_handle.flush()
+    os.fsync(checkpoint_file_handle.fileno())
+    checkpoint_file_handle.close()
+    os.rename(temporary_file, checkpoint_file)
+
+
+def read_results(output_file):
+    """
+    Returns pandas DataFrame of the tagged questions of a JSON lines output file
+    """
+    rows = []
+    for line in open(output_file, mode='r'):
+        record = json.loads(line)
+        if 'error' not in record:
+            rows.append( {'question_file_path' : record['question_file_path'], 'keywords' : record['keywords']} )
+
+    return pd.DataFrame(rows, columns=['question_file_path', 'keywords'])
+
+
+def main(model_file, data_directory='../data', output_file=None, workers=1, batch_size=256, top_k=0, min_k=0):
+
+    paths_file = os.path.join(data_directory, 'untagged_paths.txt')
+    if output_file is None:
+        output_file = os.path.join(data_directory, 'untagged_keywords.jsonl')
+    checkpoint_file = output_file + '.checkpoint'
+
+    fingerprint = run_fingerprint(paths_file, model_file, batch_size, top_k, min_k)
+    checkpoint = load_checkpoint(checkpoint_file, fingerprint)
+
+    if checkpoint is None or not os.path.exists(output_file):
+        checkpoint = {'fingerprint' : fingerprint, 'batches' : 0, 'questions' : 0, 'output_bytes' : 0}
+    else:
+        print 'Resuming after %d batches (%d questions) from checkpoint %s\n' % \
+              (checkpoint['batches'], checkpoint['questions'], checkpoint_file)
+
+    # Drop whatever was written after the last checkpoint
+    output_file_handle = open(output_file, mode='a+b')
+    output_file_handle.truncate(checkpoint['output_bytes'])
+    output_file_handle.seek(0, os.SEEK_END)
+
+    tasks = ( (paths, top_k, min_k) for paths in iter_batches(paths_file, batch_size, checkpoint['batches']) )
+
+    print 'Tagging untagged questions of %s with %d worker(s) in batches of %d...\n' % (paths_file, workers, batch_size)
+
+    pool = None
+    if workers > 1:
+        pool = Pool(workers, initializer=load_worker_model, initargs=(model_file,))
+        results = pool.imap(tag_batch, tasks)
+    else:
+        load_worker_model(model_file)
+        results = imap(tag_batch, tasks)
+
+    questions = 0
+    errors = 0
+    untagged = 0
+
+    t0 = time()
+    try:
+        with instrumentation.section('tag') as tag:
+            for records in results:
+                for record in records:
+                    output_file_handle.write(json.dumps(record) + '\n')
+                    errors += 'error' in record
+                    untagged += 'keywords' in record and not record['keywords']
+                output_file_handle.flush()
+                os.fsync(output_file_handle.fileno())
+
+                questions += len(records)
+                tag.items += len(records)
+
+                checkpoint['batches'] += 1
+                checkpoint['questions'] += len(records)
+                checkpoint['output_bytes'] = output_file_handle.tell()
+                save_checkpoint(checkpoint, checkpoint_file)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        output_file_handle.close()
+    t1 = time()
+
+    print 'Tagged %d questions in %f sec, %d left without keywords, %d could not be parsed' % (questions, t1-t0, untagged, errors)
+    print 'Total tagged: %d questions in %s' % (checkpoint['questions'], output_file)
+
+    write_table(read_results(output_file), os.path.splitext(output_file)[0])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tag the untagged questions with a persisted tagging model.')
+    parser.add_argument('--model', dest='model_file', default='../data/tagging_model.pkl')
+    parser.add_argument('--data-dir', dest='data_directory', default='../data')
+    parser.add_argument('--output', dest='output_file', default=None, help='JSON lines file of the results, by default untagged_keywords.jsonl in the data directory')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes tagging batches in parallel')
+    parser.add_argument('--batch-size', type=int, default=256, help='number of questions featurized and predicted at once')
+    parser.add_argument('--top-k', type=int, default=0, help='tag with up to this many ranked keywords and their scores')
+    parser.add_argument('--min-k', type=int, default=0, help='with --top-k, always suggest at least this many keywords')
+    args = parser.parse_args()
+    main(args.model_file, args.data_directory, args.output_file, args.workers, args.batch_size, args.top_k, args.min_k)
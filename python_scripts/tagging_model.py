@@ -0,0 +1,228 @@
+"""
+This module contains the persisted tagging model: a fitted OneVsRestClassifier(LinearSVC())
+together with the keyword vocabulary of its BaselineFeatureExtractor and the LaTeX token
+vocabulary of its features, so that new WebWorK questions can be tagged without re-running
+the extraction pipeline.
+
+Training from the pipeline's tables:
+
+    python tagging_model.py --num-keywords 200 --num-latex-tokens 500
+"""
+import argparse
+import cPickle as pickle
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from time import time
+from sklearn.multiclass import OneVsRestClassifier
+from sklearn.svm import LinearSVC
+
+from baseline_feature_extractor import BaselineFeatureExtractor
+from instrumentation import instrumentation
+from keyword_matcher import KeywordMatcher
+from label_scorer import LabelScorer
+from latex_token_counts import question_token_matrix
+from pg_parser import PGParser
+from table_store import TAG_INFO_LITERALS, read_table
+
+MODEL_VERSION = 1
+
+
+class TaggingModel():
+    """
+    This class predicts keywords for WebWorK questions from the keywords found in their text
+    and the LaTeX tokens of their expressions.
+
+    Sample usage:
+
+        model = TaggingModel.load('../data/tagging_model.pkl')
+
+        model.tag_pg([open(path).read() for path in paths])     # [[keyword, ...], ...]
+        model.tag_questions(question_texts, latex_expressions)
+        model.suggest_pg(contents, 5, min_k=1)                  # [[(keyword, score), ...], ...]
+
+    All the labels are scored at once by a LabelScorer holding the weights of the classifier.
+    """
+    def __init__(self, classifier, keywords, latex_tokens):
+        """
+        @params
+            - classifier: fitted OneVsRestClassifier over the features of self.features
+            - keywords: python list of the keywords used as features and labels, sorted by count
+            - latex_tokens: python list of the LaTeX tokens used as features
+        """
+        self.classifier = classifier
+        self.keywords = keywords
+        self.latex_tokens = latex_tokens
+
+        self.feature_extractor = BaselineFeatureExtractor(pd.DataFrame({'keyword' : keywords}), sparse=True)
+        self.keyword_matcher = KeywordMatcher(keywords)
+        self.parser = PGParser()
+        self.scorer = LabelScorer.from_classifier(classifier, keywords) if classifier is not None else None
+
+    def features(self, keywords_in_text, latex_expressions):
+        """
+        Returns the scipy.sparse CSR feature matrix of a batch of questions: the keyword
+        indicators followed by the LaTeX token indicators
+        @params
+            - keywords_in_text: python list of lists of keywords found in each question text
+            - latex_expressions: python list of lists of LaTeX expressions of each question
+        """
+        keyword_features = self.feature_extractor.encode(keywords_in_text)
+
+        latex_features, _ = question_token_matrix(latex_expressions, self.latex_tokens)
+        latex_features.data[:] = 1
+
+        return sp.hstack([keyword_features, latex_features]).tocsr()
+
+    def question_features(self, question_texts, latex_expressions):
+        """
+        Returns the scipy.sparse CSR feature matrix of a batch of question texts
+        """
+        keywords_in_text = [ self.keyword_matcher.match(question_text) for question_text in question_texts ]
+
+        return self.features(keywords_in_text, latex_expressions)
+
+    def predict(self, question_texts, latex_expressions):
+        """
+        Returns the scipy.sparse CSR matrix of predicted keyword labels for a batch of questions
+        """
+        return self.scorer.predict( self.question_features(question_texts, latex_expressions) )
+
+    def suggest(self, question_texts, latex_expressions, k, threshold=None, min_k=0):
+        """
+        Returns python list of the ranked (keyword, score) suggestions of a batch of questions
+        @params
+            - k: maximum number of keywords suggested per question
+            - threshold: if given, only keywords scoring above threshold are suggested...
+            - min_k: ...except that the best min_k keywords are always suggested
+        """
+        return self.scorer.top_k(self.question_features(question_texts, latex_expressions), k, threshold, min_k)
+
+    def tag_questions(self, question_texts, latex_expressions):
+        """
+        Returns python list of the lists of predicted keywords of a batch of questions
+        @params
+            - question_texts: python list of question texts
+            - latex_expressions: python list of lists of LaTeX expressions of each question
+        """
+        y_predict = self.predict(question_texts, latex_expressions)
+
+        return [ [ self.keywords[k] for k in y_predict.indices[y_predict.indptr[i]:y_predict.indptr[i+1]] ] \
+                 for i in range(y_predict.shape[0]) ]
+
+    def tag_pg(self, question_file_contents):
+        """
+        Returns python list of the lists of predicted keywords of a batch of raw .pg files
+        @params
+            - question_file_contents: python list of the contents of question files
+        """
+        questions = [ self.parser.parse(contents) for contents in question_file_contents ]
+
+        return self.tag_questions([ q['question_text'] for q in questions ], \
+                                  [ q['latex_expressions'] for q in questions ])
+
+    def suggest_pg(self, question_file_contents, k, threshold=None, min_k=0):
+        """
+        Returns python list of the ranked (keyword, score) suggestions of a batch of raw .pg files
+        """
+        questions = [ self.parser.parse(contents) for contents in question_file_contents ]
+
+        return self.suggest([ q['question_text'] for q in questions ], \
+                            [ q['latex_expressions'] for q in questions ], k, threshold, min_k)
+
+    def save(self, path):
+        """
+        Persists the fitted classifier and its vocabularies to path
+        """
+        model_file_handle = open(path, mode='wb')
+        pickle.dump({'version' : MODEL_VERSION, \
+                     'classifier' : self.classifier, \
+                     'keywords' : self.keywords, \
+                     'latex_tokens' : self.latex_tokens}, model_file_handle, pickle.HIGHEST_PROTOCOL)
+        model_file_handle.close()
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a model persisted with save
+        """
+        model_file_handle = open(path, mode='rb')
+        artifact = pickle.load(model_file_handle)
+        model_file_handle.close()
+
+        if artifact['version'] != MODEL_VERSION:
+            raise ValueError('%s holds a version %d tagging model, expected version %d' % (path, artifact['version'], MODEL_VERSION))
+
+        return cls(artifact['classifier'], artifact['keywords'], artifact['latex_tokens'])
+
+
+def select_vocabularies(question_info, tag_info, num_keywords=200, num_latex_tokens=500):
+    """
+    Returns the tuple (keywords, latex_tokens) of the python lists of the top num_keywords
+    keywords by count and the num_latex_tokens LaTeX tokens used by the most questions
+    """
+    order = np.argsort(-tag_info['count'].values, kind='mergesort')[:num_keywords]
+    keywords = tag_info['keyword'].values[order].tolist()
+
+    # LaTeX tokens used by the most questions
+    with instrumentation.section('latex_tokenization', items=question_info.shape[0]):
+        question_tokens, tokens = question_token_matrix(question_info['latex_expressions'].values)
+    document_frequency = np.diff(question_tokens.tocsc().indptr)
+    latex_tokens = [ tokens[j] for j in np.argsort(-document_frequency, kind='mergesort')[:num_latex_tokens] ]
+
+    return keywords, latex_tokens
+
+
+def train_tagging_model(question_info, tag_info, num_keywords=200, num_latex_tokens=500):
+    """
+    Trains a TaggingModel on the top num_keywords keywords and the num_latex_tokens LaTeX tokens
+    used by the most questions. Questions without any of the keywords are left out.
+    @params
+        - question_info: pandas DataFrame with question_text, keywords_in_text, latex_expressions
+                         and keywords columns
+        - tag_info: pandas DataFrame of keywords with their counts
+    """
+    keywords, latex_tokens = select_vocabularies(question_info, tag_info, num_keywords, num_latex_tokens)
+
+    model = TaggingModel(None, keywords, latex_tokens)
+
+    with instrumentation.section('featurize', items=question_info.shape[0]):
+        y_train = model.feature_extractor.encode(question_info['keywords'].values)
+        labelled = np.flatnonzero( np.diff(y_train.indptr) )
+
+        x_train = model.features(question_info['keywords_in_text'].values[labelled], question_info['latex_expressions'].values[labelled])
+
+    with instrumentation.section('fit', items=x_train.shape[0]):
+        model.classifier = OneVsRestClassifier(LinearSVC()).fit(x_train, y_train[labelled])
+        model.scorer = LabelScorer.from_classifier(model.classifier, keywords)
+
+    return model
+
+
+def main(question_info_data, tag_info_data, model_file, num_keywords, num_latex_tokens):
+
+    question_info = read_table(question_info_data)
+    tag_info = read_table(tag_info_data, TAG_INFO_LITERALS)
+
+    print 'Training tagging model with %d keywords and %d LaTeX tokens on %d questions...\n' % \
+          (num_keywords, num_latex_tokens, question_info.shape[0])
+
+    t0 = time()
+    model = train_tagging_model(question_info, tag_info, num_keywords, num_latex_tokens)
+    t1 = time()
+
+    model.save(model_file)
+
+    print 'Training complete. Time: %f' % (t1-t0)
+    print 'Model saved to file %s' % model_file
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train and persist a tagging model.')
+    parser.add_argument('--question-info', dest='question_info_data', default='../data/question_info_data_2')
+    parser.add_argument('--tag-info', dest='tag_info_data', default='../data/tag_info_data')
+    parser.add_argument('--output', dest='model_file', default='../data/tagging_model.pkl')
+    parser.add_argument('--num-keywords', type=int, default=200)
+    parser.add_argument('--num-latex-tokens', type=int, default=500)
+    args = parser.parse_args()
+    main(args.question_info_data, args.tag_info_data, args.model_file, args.num_keywords, args.num_latex_tokens)
@@ -0,0 +1,192 @@
+"""
+This script is a long running tagging service. It loads a persisted TaggingModel once and
+then tags WebWorK questions sent as JSON lines on stdin, writing one JSON line per request
+to stdout:
+
+    {"id": 1, "contents": "## DESCRIPTION ... BEGIN_TEXT ... END_TEXT ..."}
+    {"id": 2, "path": "/path/to/question.pg"}
+    {"command": "stats"}
+
+    {"id": 1, "keywords": ["derivative", "chain rule"], "latency_ms": 1.9}
+
+With --top-k the best scoring keywords are suggested instead, ranked and with their scores,
+so that questions the classifier assigns no keyword still get --min-k suggestions:
+
+    {"id": 1, "keywords": ["derivative", "chain rule"], "scores": [1.3, 0.4], "latency_ms": 2.0}
+
+A request that cannot be read or tagged gets a response with its id and an 'error' instead,
+and the server goes on with the next one:
+
+    {"id": 2, "error": "[Errno 2] No such file or directory: u'/nonexistent'"}
+
+Requests arriving while a batch is being tagged are grouped into the next batch, up to
+--batch-size requests or --max-wait-ms after the first one. Latency percentiles are
+reported on stderr for the stats command and on shutdown.
+
+    python tagging_server.py --model ../data/tagging_model.pkl
+"""
+from __future__ import division
+import argparse
+import json
+import sys
+import threading
+from Queue import Queue, Empty
+from time import time
+import numpy as np
+
+from tagging_model import TaggingModel
+
+
+def read_requests(input_stream, requests):
+    """
+    Reads JSON lines from input_stream into the requests queue with their arrival time.
+    A None marks the end of the input.
+    """
+    for line in iter(input_stream.readline, ''):
+        if line.strip():
+            requests.put( (time(), line) )
+    requests.put(None)
+
+
+def next_batch(requests, batch_size, max_wait):
+    """
+    Blocks for the next request, then collects up to batch_size requests arriving within
+    max_wait seconds. Returns the python list of (arrival time, line) and whether the input ended.
+    """
+    first = requests.get()
+    if first is None:
+        return [], True
+
+    batch = [first]
+    deadline = time() + max_wait
+
+    while len(batch) < batch_size:
+        try:
+            request = requests.get(timeout=max(0, deadline - time()))
+        except Empty:
+            break
+        if request is None:
+            return batch, True
+        batch.append(request)
+
+    return batch, False
+
+
+def latency_stats(latencies):
+    """
+    Returns python dict of the request count and p50/p99 latency in milliseconds
+    """
+    if not latencies:
+        return {'requests' : 0}
+
+    p50, p99 = np.percentile(latencies, [50, 99])
+
+    return {'requests' : len(latencies), 'p50_ms' : p50 * 1000, 'p99_ms' : p99 * 1000}
+
+
+def tag_contents(model, contents, top_k=0, min_k=0):
+    """
+    Returns python list of the response fields of the contents of each question file, its
+    'keywords' and, if top_k is positive, their 'scores'
+    """
+    if top_k > 0:
+        return [ {'keywords' : [ keyword for keyword, score in suggestions ], \
+                  'scores' : [ score for keyword, score in suggestions ]} \
+                 for suggestions in model.suggest_pg(contents, top_k, model.scorer.threshold, min_k) ]
+
+    return [ {'keywords' : keywords} for keywords in model.tag_pg(contents) ]
+
+
+def serve(model, input_stream, output_stream, batch_size=32, max_wait_ms=5, top_k=0, min_k=0):
+    """
+    Tags the requests read from input_stream until it ends
+    @params
+        - top_k: if positive, respond with up to top_k ranked keywords scoring above the
+                 threshold of the classifier, and at least min_k, with their scores
+    """
+    requests = Queue()
+    reader = threading.Thread(target=read_requests, args=(input_stream, requests))
+    reader.daemon = True
+    reader.start()
+
+    latencies = []
+    finished = False
+
+    while not finished:
+        batch, finished = next_batch(requests, batch_size, max_wait_ms / 1000)
+
+        responses = [None] * len(batch)
+        to_tag = []
+        contents = []
+
+        for i, (arrival, line) in enumerate(batch):
+            request = {}
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    request = {}
+                    raise ValueError('request is not a JSON object')
+
+                if request.get('command') == 'stats':
+                    responses[i] = latency_stats(latencies)
+                    responses[i]['id'] = request.get('id')
+                    sys.stderr.write('%s\n' % json.dumps(responses[i]))
+                elif 'path' in request:
+                    question_file_handle = open(request['path'], mode='r')
+                    contents.append( question_file_handle.read() )
+                    question_file_handle.close()
+                    to_tag.append( (i, request) )
+                else:
+                    if not isinstance(request.get('contents'), basestring):
+                        raise ValueError('request has no string path or contents')
+                    contents.append( request['contents'].encode('utf-8') )
+                    to_tag.append( (i, request) )
+            except Exception as e:
+                responses[i] = {'id' : request.get('id'), 'error' : str(e)}
+
+        if contents:
+            try:
+                tagged = tag_contents(model, contents, top_k, min_k)
+            except Exception:
+                # Tag the requests one by one so that only the failing ones get an error
+                tagged = []
+                for question_contents in contents:
+                    try:
+                        tagged.extend( tag_contents(model, [question_contents], top_k, min_k) )
+                    except Exception as e:
+                        tagged.append( {'error' : str(e)} )
+
+            for (i, request), fields in zip(to_tag, tagged):
+                responses[i] = {'id' : request.get('id')}
+                responses[i].update(fields)
+
+        for (arrival, line), response in zip(batch, responses):
+            latency = time() - arrival
+            if 'keywords' in response:
+                latencies.append(latency)
+                response['latency_ms'] = latency * 1000
+            output_stream.write(json.dumps(response) + '\n')
+
+        output_stream.flush()
+
+    sys.stderr.write('%s\n' % json.dumps(latency_stats(latencies)))
+
+
+def main(model_file, batch_size, max_wait_ms, top_k, min_k):
+
+    t0 = time()
+    model = TaggingModel.load(model_file)
+    sys.stderr.write('Loaded tagging model %s with %d keywords in %f sec\n' % (model_file, len(model.keywords), time()-t0))
+
+    serve(model, sys.stdin, sys.stdout, batch_size, max_wait_ms, top_k, min_k)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tag WebWorK questions sent as JSON lines on stdin.')
+    parser.add_argument('--model', dest='model_file', default='../data/tagging_model.pkl')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5)
+    parser.add_argument('--top-k', type=int, default=0, help='respond with up to this many ranked keywords and their scores')
+    parser.add_argument('--min-k', type=int, default=0, help='with --top-k, always suggest at least this many keywords')
+    args = parser.parse_args()
+    main(args.model_file, args.batch_size, args.max_wait_ms, args.top_k, args.min_k)
@@ -1,14 +1,19 @@
 """
 This script extracts the LaTeX tokens from each question and organizes these by keyword.
 These tokens will be used as features for the multi-label classifiers.
-New information is persisted as a pandas dataframe in file ../data/tag_info_data_2.csv
+New information is persisted as a pandas dataframe in file ../data/tag_info_data_2.npz
 
 @author Luigi Patruno
 @date 15 April 2015
 """
+import argparse
+import os
 import pandas as pd
 from time import time
-import ast
+
+from instrumentation import instrumentation
+from latex_token_counts import KeywordLatexCounts
+from table_store import TAG_INFO_LITERALS, read_table, write_table
 
 def remove_latex_symbols(list_of_latex):
     """
@@ -48,49 +53,22 @@ def tokenize_latex( list_of_latex ):
     return latex_count
     
     
-def main():
+def main(data_directory='../data'):
     
-    question_info = pd.read_csv('../data/question_info_data_2.csv', index_col=0)
-    tag_info = pd.read_csv('../data/tag_info_data.csv', index_col=0)
+    question_info = read_table(os.path.join(data_directory, 'question_info_data_2'))
+    tag_info = read_table(os.path.join(data_directory, 'tag_info_data'), TAG_INFO_LITERALS)
     
-    # Loop over each question, extracting the LaTeX tokens and adding to a dynamically growing
-    # structure keeping track of the LaTeX tokens that appear for each keyword and the
-    # count of times each token appears
-    # This is a more efficient way than looping over each of the keywords in the keyword_info structure
-    # since it eliminates checking the same LaTeX expressions multiple times
+    # Tokenize the LaTeX of all questions into one sparse questions x tokens count matrix and
+    # multiply it by the questions x keywords indicator matrix to count the LaTeX tokens
+    # that appear for each keyword in a single sparse matrix product
 
     t0 = time()
 
     print 'Extracting LaTeX tokens for all keywords and questions...\n'
 
-    # Dict structure to hold latex tokens for all keywords
-    keyword_latex_count = {}
-
-    for i in range( question_info.shape[0] ):
-        
-        question = question_info['question_text'][i]
-    
-        latex = ast.literal_eval( question_info['latex_expressions'][i] )
-        latex_tokens = tokenize_latex( latex )
-    
-        keywords = ast.literal_eval( question_info['keywords'][i] )
-    
-        for keyword in keywords:
-            # If keyword has been encountered previously, append LaTeX token counts
-            # Otherwise, set the value to the latex_tokens dict
-            if keyword in keyword_latex_count:
-            
-                for token in latex_tokens:
-                    # If this token has been encountered, increment count
-                    # Otherwise, set the count to the count from the latex_tokens dict
-                    # Also don't count an empty string
-                    if token != '':
-                        if token in keyword_latex_count[keyword]:
-                            keyword_latex_count[keyword][token] += latex_tokens[token]
-                        else:
-                            keyword_latex_count[keyword][token] = latex_tokens[token]
-            else:
-                keyword_latex_count[keyword] = latex_tokens
+    with instrumentation.section('latex_tokenization', items=question_info.shape[0]):
+        keyword_latex_counts = KeywordLatexCounts.from_questions(question_info['keywords'].values, \
+                                                                 question_info['latex_expressions'].values)
 
     t1 = time()
 
@@ -99,23 +77,26 @@ def main():
     
     # Create new DataFrame of results, merge existing tables on the keyword column,
     # and persist this new DataFrame for  subsequent use
-    tags = []
-    tokens = []
-
-    for tag in keyword_latex_count.keys():
-        tags.append( tag )
-        tokens.append( keyword_latex_count[tag] )
+    tags = keyword_latex_counts.keywords
+    tokens = [ keyword_latex_counts.token_counts(tag) for tag in tags ]
     
     tag_latex_info = pd.DataFrame({ 'keyword' : tags,\
                                     'latex_tokens' : tokens })
     
     merged_info = pd.merge(tag_info, tag_latex_info, on='keyword')
     
-    merged_info.to_csv('../data/tag_info_data_2.csv')
+    tag_info_data = os.path.join(data_directory, 'tag_info_data_2')
+    keyword_latex_counts_file = os.path.join(data_directory, 'keyword_latex_counts.npz')
     
-    print 'Saving new information to file ../data/tag_info_data_2.csv'
+    write_table(merged_info, tag_info_data)
+    keyword_latex_counts.save(keyword_latex_counts_file)
+    
+    print 'Saving new information to file %s.npz' % tag_info_data
+    print 'Saving keyword x LaTeX token counts to file %s' % keyword_latex_counts_file
     
 
 if __name__ == '__main__':
-    main() 
-
+    parser = argparse.ArgumentParser(description='Count the LaTeX tokens of the questions of each keyword.')
+    parser.add_argument('--data-dir', dest='data_directory', default='../data')
+    args = parser.parse_args()
+    main(args.data_directory)